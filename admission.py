@@ -0,0 +1,142 @@
+"""
+Adaptive admission control for DB-bound requests.
+
+With ``DB_ADAPTIVE_CONCURRENCY`` enabled, the instrumentation middleware
+admits at most ``limit`` requests at a time. A request that finds the limit
+reached waits up to ``DB_ADMISSION_QUEUE_MS`` for a slot and is then
+answered with 503 and ``Retry-After``, rather than queuing behind the
+thread and connection pools until ``DB_POOL_TIMEOUT``.
+
+The limit follows the connection pool wait that admitted requests observe:
+
+* when the p90 wait over a window exceeds ``DB_POOL_WAIT_TARGET_MS``, the
+  limit is cut by a quarter, but never below ``DB_ADMISSION_MIN``;
+* when the window was saturated and the p90 wait stayed under half the
+  target, the limit grows by one, up to ``DB_WORKER_THREADS``.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# Observations per adjustment, and the longest a window may stay open
+WINDOW_REQUESTS = 20
+WINDOW_SECONDS = 1.0
+
+
+class AdmissionController:
+    """Concurrency limit for one worker process, adjusted from observed pool waits."""
+
+    def __init__(self, enabled: bool, max_limit: int, min_limit: int, target_wait_ms: float, queue_ms: float):
+        self.enabled = enabled
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.target_wait = target_wait_ms / 1000
+        self.queue_timeout = queue_ms / 1000
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._window: List[float] = []
+        self._window_started = time.monotonic()
+        self._saturated = False
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting up to the queue timeout; False means shed the request."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        self._saturated = True
+        if self.queue_timeout > 0:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, self.queue_timeout)
+                self.admitted += 1
+                return True
+            except asyncio.TimeoutError:
+                # ``_wake`` may have handed over the slot just as the wait timed out
+                if waiter.done() and not waiter.cancelled():
+                    self.admitted += 1
+                    return True
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.shed += 1
+        return False
+
+    def release(self, pool_wait: float) -> None:
+        """Free a slot and record the pool wait the finished request observed."""
+        self.in_flight -= 1
+        self._observe(pool_wait)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # the slot passes straight to the waiter
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _observe(self, pool_wait: float) -> None:
+        self._window.append(pool_wait)
+        if len(self._window) < WINDOW_REQUESTS and time.monotonic() - self._window_started < WINDOW_SECONDS:
+            return
+        waits = sorted(self._window)
+        p90 = waits[min(len(waits) - 1, int(len(waits) * 0.9))]
+        previous = self.limit
+        if p90 > self.target_wait:
+            self.limit = max(self.min_limit, int(self.limit * 0.75))
+        elif self._saturated and p90 < self.target_wait / 2:
+            self.limit = min(self.max_limit, self.limit + 1)
+        if self.limit != previous:
+            logger.info("admission limit %d -> %d (p90 pool wait %.1f ms)", previous, self.limit, p90 * 1000)
+        self._window = []
+        self._window_started = time.monotonic()
+        self._saturated = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "limit": self.limit,
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "target_wait_ms": self.target_wait * 1000,
+            "queue_ms": self.queue_timeout * 1000,
+        }
+
+    def render(self) -> str:
+        """Prometheus text for the ``/metrics`` endpoint."""
+        lines: List[str] = []
+        for field, kind, help_text in (
+            ("limit", "gauge", "Requests admitted at once"),
+            ("in_flight", "gauge", "Requests currently admitted"),
+            ("queued", "gauge", "Requests waiting for admission"),
+            ("shed", "counter", "Requests answered with 503 because the limit was reached"),
+        ):
+            name = f"ratecard_admission_{field}" + ("_total" if kind == "counter" else "")
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {self.stats()[field]:g}")
+        return "\n".join(lines) + "\n"
+
+
+admission = AdmissionController(
+    enabled=settings.db_adaptive_concurrency,
+    max_limit=settings.db_worker_threads,
+    min_limit=settings.db_admission_min,
+    target_wait_ms=settings.db_pool_wait_target_ms,
+    queue_ms=settings.db_admission_queue_ms,
+)
@@ -0,0 +1,67 @@
+"""
+Alembic environment.
+
+Migrations connect to the same database as the API: the URL comes from
+``database._effective_database_url`` (``DATABASE_URL`` or the ``PG*``
+variables), not from ``sqlalchemy.url`` in alembic.ini. Autogenerate
+compares against ``models.Base.metadata``.
+
+Each revision runs in its own transaction, so a revision can step out of it
+with ``op.get_context().autocommit_block()`` for ``CREATE INDEX CONCURRENTLY``.
+"""
+import importlib
+import sys
+from logging.config import fileConfig
+from pathlib import Path
+
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+# The application modules use package-relative imports, so import them
+# through the package directory rather than from the repository root
+_package_dir = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(_package_dir.parent))
+database = importlib.import_module(f"{_package_dir.name}.database")
+models = importlib.import_module(f"{_package_dir.name}.models")
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = models.Base.metadata
+
+
+def run_migrations_offline() -> None:
+    """Emit the migration SQL to stdout (``alembic upgrade head --sql``)."""
+    context.configure(
+        url=database._effective_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        compare_type=True,
+        transaction_per_migration=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    url = database._effective_database_url()
+    connect_args = database._build_connect_args(url)
+    # one short-lived connection, not the API's pool
+    connectable = create_engine(url, poolclass=pool.NullPool, connect_args=connect_args)
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            compare_type=True,
+            transaction_per_migration=True,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
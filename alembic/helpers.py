@@ -0,0 +1,23 @@
+"""
+Helpers shared by the revisions in ``versions/``.
+
+Revisions import this module through the package directory, the way env.py
+imports the application modules.
+"""
+from typing import Sequence
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def drop_invalid_indexes(names: Sequence[str]) -> None:
+    """Drop indexes among ``names`` that an interrupted concurrent build left INVALID (Postgres only)."""
+    invalid = op.get_bind().execute(
+        sa.text(
+            "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE NOT i.indisvalid AND c.relname IN :names"
+        ).bindparams(sa.bindparam("names", expanding=True)),
+        {"names": list(names)},
+    ).scalars().all()
+    for name in invalid:
+        op.drop_index(name, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,308 @@
+"""initial schema
+
+Tables, keys and constraints as declared in models.py. Secondary indexes are
+built by the next revision. A database created by the old startup
+``create_all`` already has these tables: ``alembic stamp 0001`` it, then
+``alembic upgrade head``.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Postgres enum types created along with the tables
+ENUM_TYPES = (
+    "userrole", "projectstatus", "projectpriority", "taskstatus", "notificationtype", "notificationseverity",
+    "quotestatus", "quoteitemtype",
+)
+
+
+def upgrade() -> None:
+    op.create_table('labour_rates',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('labour_type', sa.String(length=100), nullable=False),
+    sa.Column('cost_per_person', sa.Float(), nullable=False),
+    sa.Column('hours', sa.Float(), nullable=True),
+    sa.Column('state_code', sa.String(length=10), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('materials',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sales_part_no', sa.String(length=100), nullable=False),
+    sa.Column('description', sa.Text(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=True),
+    sa.Column('state_code', sa.String(length=10), nullable=False),
+    sa.Column('qty', sa.Integer(), nullable=True),
+    sa.Column('unit_cost', sa.Float(), nullable=False),
+    sa.Column('image_url', sa.String(length=500), nullable=True),
+    sa.Column('sor_code', sa.String(length=30), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sales_part_no')
+    )
+    op.create_table('rate_card_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    sa.Column('reason', sa.String(length=200), nullable=True),
+    sa.Column('material_count', sa.Integer(), nullable=False),
+    sa.Column('equipment_count', sa.Integer(), nullable=False),
+    sa.Column('labour_rate_count', sa.Integer(), nullable=False),
+    sa.Column('payload_bytes', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('system_config',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('value', sa.Text(), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key')
+    )
+    op.create_table('users',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('username', sa.String(length=50), nullable=False),
+    sa.Column('email', sa.String(length=100), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.Column('role', sa.Enum('ADMIN', 'USER', name='userrole'), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    op.create_table('audit_logs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=True),
+    sa.Column('action', sa.String(length=100), nullable=False),
+    sa.Column('entity_type', sa.String(length=50), nullable=False),
+    sa.Column('entity_id', sa.String(), nullable=False),
+    sa.Column('old_values', sa.Text(), nullable=True),
+    sa.Column('new_values', sa.Text(), nullable=True),
+    sa.Column('ip_address', sa.String(length=45), nullable=True),
+    sa.Column('user_agent', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('price_change_logs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('entity_type', sa.String(length=50), nullable=False),
+    sa.Column('entity_id', sa.String(), nullable=False),
+    sa.Column('entity_name', sa.String(length=200), nullable=False),
+    sa.Column('old_price', sa.Float(), nullable=False),
+    sa.Column('new_price', sa.Float(), nullable=False),
+    sa.Column('changed_by', sa.String(), nullable=True),
+    sa.Column('change_reason', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['changed_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('projects',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('sor_code', sa.String(length=100), nullable=True),
+    sa.Column('sor_description', sa.Text(), nullable=True),
+    sa.Column('sor_type', sa.String(length=100), nullable=True),
+    sa.Column('manager_id', sa.String(), nullable=False),
+    sa.Column('category', sa.String(length=100), nullable=True),
+    sa.Column('status', sa.Enum('PLANNING', 'IN_PROGRESS', 'COMPLETED', 'ON_HOLD', 'CANCELLED', name='projectstatus'), nullable=True),
+    sa.Column('priority', sa.Enum('LOW', 'MEDIUM', 'HIGH', 'URGENT', name='projectpriority'), nullable=True),
+    sa.Column('budget', sa.Float(), nullable=True),
+    sa.Column('actual_cost', sa.Float(), nullable=True),
+    sa.Column('progress', sa.Integer(), nullable=True),
+    sa.Column('start_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('end_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('region', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['manager_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('quotes',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('quote_number', sa.String(length=50), nullable=False),
+    sa.Column('client_name', sa.String(length=200), nullable=False),
+    sa.Column('client_email', sa.String(length=100), nullable=True),
+    sa.Column('client_phone', sa.String(length=20), nullable=True),
+    sa.Column('client_address', sa.Text(), nullable=True),
+    sa.Column('project_name', sa.String(length=200), nullable=False),
+    sa.Column('project_description', sa.Text(), nullable=True),
+    sa.Column('sor_code', sa.String(length=100), nullable=True),
+    sa.Column('sor_description', sa.Text(), nullable=True),
+    sa.Column('region', sa.String(length=50), nullable=True),
+    sa.Column('status', sa.Enum('DRAFT', 'SENT', 'ACCEPTED', 'REJECTED', 'EXPIRED', name='quotestatus'), nullable=True),
+    sa.Column('subtotal', sa.Float(), nullable=True),
+    sa.Column('tax_rate', sa.Float(), nullable=True),
+    sa.Column('tax_amount', sa.Float(), nullable=True),
+    sa.Column('total_amount', sa.Float(), nullable=True),
+    sa.Column('valid_until', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_by', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('quote_number')
+    )
+    op.create_table('notifications',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('user_id', sa.String(), nullable=False),
+    sa.Column('type', sa.Enum('TASK', 'PROJECT', 'SYSTEM', 'BUDGET', 'DEADLINE', 'PRICE_CHANGE', 'LABOR_OVERRUN', 'BUDGET_OVERRUN', 'OVERDUE', 'MATERIAL_SHORTAGE', 'EQUIPMENT_MAINTENANCE', 'QUALITY_ISSUE', 'SAFETY_ALERT', 'WEATHER_ALERT', 'CUSTOM', name='notificationtype'), nullable=False),
+    sa.Column('severity', sa.Enum('LOW', 'MEDIUM', 'HIGH', 'CRITICAL', name='notificationseverity'), nullable=True),
+    sa.Column('title', sa.String(length=200), nullable=False),
+    sa.Column('message', sa.Text(), nullable=False),
+    sa.Column('is_read', sa.Boolean(), nullable=True),
+    sa.Column('related_project_id', sa.String(), nullable=True),
+    sa.Column('related_entity_id', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['related_project_id'], ['projects.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('project_external_costs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('project_id', sa.String(), nullable=False),
+    sa.Column('cost_type', sa.String(length=50), nullable=False),
+    sa.Column('description', sa.String(length=200), nullable=True),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('percentage', sa.Float(), nullable=True),
+    sa.Column('is_enabled', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('project_labor',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('project_id', sa.String(), nullable=False),
+    sa.Column('labour_rate_id', sa.Integer(), nullable=False),
+    sa.Column('persons', sa.Integer(), nullable=False),
+    sa.Column('hours', sa.Integer(), nullable=False),
+    sa.Column('state_code', sa.String(length=10), nullable=False),
+    sa.Column('unit_rate', sa.Float(), nullable=False),
+    sa.Column('total_cost', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['labour_rate_id'], ['labour_rates.id'], ),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('project_materials',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('project_id', sa.String(), nullable=False),
+    sa.Column('material_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.Column('total_price', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['material_id'], ['materials.id'], ),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('project_tasks',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('project_id', sa.String(), nullable=False),
+    sa.Column('name', sa.String(length=200), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('status', sa.Enum('PENDING', 'IN_PROGRESS', 'COMPLETED', 'CANCELLED', name='taskstatus'), nullable=True),
+    sa.Column('due_date', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('project_totals',
+    sa.Column('project_id', sa.String(), nullable=False),
+    sa.Column('total_materials', sa.Float(), nullable=False),
+    sa.Column('total_equipment', sa.Float(), nullable=False),
+    sa.Column('total_labor', sa.Float(), nullable=False),
+    sa.Column('total_external', sa.Float(), nullable=False),
+    sa.Column('grand_total', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('project_id')
+    )
+    op.create_table('quote_items',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('quote_id', sa.String(), nullable=False),
+    sa.Column('item_type', sa.Enum('MATERIAL', 'EQUIPMENT', 'LABOR', 'TASK', 'EXTERNAL', name='quoteitemtype'), nullable=False),
+    sa.Column('item_name', sa.String(length=200), nullable=False),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=True),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.Column('total_price', sa.Float(), nullable=False),
+    sa.Column('sort_order', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['quote_id'], ['quotes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('equipments',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.String(), nullable=True),
+    sa.Column('sales_part_no', sa.String(length=50), nullable=True),
+    sa.Column('equipment_name', sa.Text(), nullable=True),
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('state_code', sa.String(length=100), nullable=True),
+    sa.Column('price', sa.Float(), nullable=False),
+    sa.Column('price_incl_tax', sa.Float(), nullable=False),
+    sa.Column('sor_code', sa.String(length=30), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['task_id'], ['project_tasks.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('project_equipment',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('project_id', sa.String(), nullable=False),
+    sa.Column('equipment_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.Column('total_price', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.ForeignKeyConstraint(['equipment_id'], ['equipments.id'], ),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('project_equipment')
+    op.drop_table('equipments')
+    op.drop_table('quote_items')
+    op.drop_table('project_totals')
+    op.drop_table('project_tasks')
+    op.drop_table('project_materials')
+    op.drop_table('project_labor')
+    op.drop_table('project_external_costs')
+    op.drop_table('notifications')
+    op.drop_table('quotes')
+    op.drop_table('projects')
+    op.drop_table('price_change_logs')
+    op.drop_table('audit_logs')
+    op.drop_table('users')
+    op.drop_table('system_config')
+    op.drop_table('rate_card_snapshots')
+    op.drop_table('materials')
+    op.drop_table('labour_rates')
+    if op.get_bind().dialect.name == "postgresql":
+        for name in ENUM_TYPES:
+            op.execute(f"DROP TYPE IF EXISTS {name}")
@@ -0,0 +1,82 @@
+"""secondary indexes
+
+Every non-unique index declared in models.py: the catalog filters, the foreign
+keys the detail loaders join on and the composite indexes behind the
+newest-first list and keyset-paginated endpoints.
+
+On Postgres they are built with ``CREATE INDEX CONCURRENTLY`` outside the
+revision transaction, so the tables stay writable while a populated database
+is upgraded. ``IF NOT EXISTS`` skips indexes the old startup code already
+created; an INVALID index left behind by an interrupted concurrent build is
+dropped and rebuilt.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 09:10:00.000000
+
+"""
+import importlib
+from pathlib import Path
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# alembic/helpers.py, imported through the package directory like env.py does
+helpers = importlib.import_module(f"{Path(__file__).resolve().parents[2].name}.alembic.helpers")
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns)
+INDEXES = (
+    ("ix_labour_rates_id", "labour_rates", ["id"]),
+    ("ix_labour_rates_state_code", "labour_rates", ["state_code"]),
+    ("ix_materials_id", "materials", ["id"]),
+    ("ix_materials_sor_code", "materials", ["sor_code"]),
+    ("ix_materials_state_code", "materials", ["state_code"]),
+    ("ix_equipments_id", "equipments", ["id"]),
+    ("ix_equipments_sor_code", "equipments", ["sor_code"]),
+    ("ix_rate_card_snapshots_created_at", "rate_card_snapshots", ["created_at"]),
+    ("ix_audit_logs_created_at_id", "audit_logs", ["created_at", "id"]),
+    ("ix_audit_logs_user_id_created_at_id", "audit_logs", ["user_id", "created_at", "id"]),
+    ("ix_price_change_logs_changed_by", "price_change_logs", ["changed_by"]),
+    ("ix_price_change_logs_created_at", "price_change_logs", ["created_at"]),
+    ("ix_price_change_logs_entity_type_created_at", "price_change_logs", ["entity_type", "created_at"]),
+    ("ix_projects_created_at_id", "projects", ["created_at", "id"]),
+    ("ix_projects_manager_id", "projects", ["manager_id"]),
+    ("ix_quotes_created_at_id", "quotes", ["created_at", "id"]),
+    ("ix_quotes_created_by", "quotes", ["created_by"]),
+    ("ix_notifications_is_read_created_at", "notifications", ["is_read", "created_at"]),
+    ("ix_notifications_related_project_id", "notifications", ["related_project_id"]),
+    ("ix_notifications_user_id_created_at_id", "notifications", ["user_id", "created_at", "id"]),
+    ("ix_project_materials_material_id", "project_materials", ["material_id"]),
+    ("ix_project_materials_project_id", "project_materials", ["project_id"]),
+    ("ix_project_equipment_equipment_id", "project_equipment", ["equipment_id"]),
+    ("ix_project_equipment_project_id", "project_equipment", ["project_id"]),
+    ("ix_project_labor_labour_rate_id", "project_labor", ["labour_rate_id"]),
+    ("ix_project_labor_project_id", "project_labor", ["project_id"]),
+    ("ix_project_tasks_project_id", "project_tasks", ["project_id"]),
+    ("ix_project_external_costs_project_id", "project_external_costs", ["project_id"]),
+    ("ix_quote_items_quote_id", "quote_items", ["quote_id"]),
+)
+
+
+def upgrade() -> None:
+    postgres = op.get_bind().dialect.name == "postgresql"
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        if postgres and not op.get_context().as_sql:
+            helpers.drop_invalid_indexes([name for name, _, _ in INDEXES])
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
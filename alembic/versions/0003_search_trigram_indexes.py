@@ -0,0 +1,50 @@
+"""catalog search trigram indexes
+
+The pg_trgm extension and the GIN trigram indexes the Postgres catalog search
+ranks with (see search_index.py), built concurrently. Other backends search
+an in-process index instead, so this revision is a no-op there.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 09:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, column)
+TRGM_INDEXES = (
+    ("ix_materials_description_trgm", "materials", "description"),
+    ("ix_materials_sales_part_no_trgm", "materials", "sales_part_no"),
+    ("ix_materials_name_trgm", "materials", "name"),
+    ("ix_equipments_equipment_name_trgm", "equipments", "equipment_name"),
+    ("ix_equipments_sales_part_no_trgm", "equipments", "sales_part_no"),
+    ("ix_equipments_category_trgm", "equipments", "category"),
+)
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    with op.get_context().autocommit_block():
+        for name, table, column in TRGM_INDEXES:
+            op.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(TRGM_INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,61 @@
+"""dashboard stat counters
+
+The ``stat_counters`` table that stat_counters.py keeps current on every
+write, filled from the existing rows. Enum columns are stored by name, so
+status keys are the lower-cased name (which is the enum value).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 11:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (scope, table, key expression, total expression, where clause)
+BACKFILL = (
+    ("project_status", "projects", "lower(CAST(status AS VARCHAR))", "0.0", None),
+    ("project_amounts", "projects", "'budget'", "sum(budget)", None),
+    ("project_amounts", "projects", "'actual_cost'", "sum(actual_cost)", None),
+    ("quote_status", "quotes", "lower(CAST(status AS VARCHAR))", "0.0", None),
+    ("material_state", "materials", "state_code", "sum(unit_cost)", None),
+    ("equipment_category", "equipments", "category", "sum(price)", None),
+    ("labour_rates", "labour_rates", "''", "0.0", None),
+    ("notifications_unread", "notifications", "user_id", "0.0", "is_read IS NOT TRUE"),
+    ("notifications_unread", "notifications", "''", "0.0", "is_read IS NOT TRUE"),
+)
+
+
+def upgrade() -> None:
+    op.create_table('stat_counters',
+    sa.Column('scope', sa.String(length=50), nullable=False),
+    sa.Column('key', sa.String(length=200), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('total', sa.Float(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('scope', 'key')
+    )
+    for scope, table, key, total, where in BACKFILL:
+        # the project_amounts rows are sums, not row counts
+        count = "0" if scope == "project_amounts" else "count(*)"
+        op.execute(
+            f"INSERT INTO stat_counters (scope, key, count, total) "
+            f"SELECT '{scope}', COALESCE({key}, ''), {count}, COALESCE({total}, 0.0) FROM {table}"
+            + (f" WHERE {where}" if where else "")
+            + f" GROUP BY COALESCE({key}, '')"
+        )
+    # empty groups carry nothing; the rows are created by the first write
+    op.execute("DELETE FROM stat_counters WHERE count = 0 AND total = 0")
+
+
+def downgrade() -> None:
+    op.drop_table('stat_counters')
@@ -0,0 +1,54 @@
+"""notification inbox index
+
+The ``(user_id, is_read, created_at, id)`` index behind a user's unread
+notifications: the unread list and its keyset pages, and the batches of
+mark-all-read. Built concurrently on Postgres, like the indexes of 0002,
+after dropping a copy an interrupted build left INVALID.
+
+It also drops ``(is_read, created_at)`` from 0002: every unread query is
+per user and uses the new index, so that one only slowed down writes.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 12:40:00.000000
+
+"""
+import importlib
+from pathlib import Path
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# alembic/helpers.py, imported through the package directory like env.py does
+helpers = importlib.import_module(f"{Path(__file__).resolve().parents[2].name}.alembic.helpers")
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX = "ix_notifications_user_id_is_read_created_at_id"
+# superseded by INDEX
+OLD_INDEX = "ix_notifications_is_read_created_at"
+
+
+def upgrade() -> None:
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        if op.get_bind().dialect.name == "postgresql" and not op.get_context().as_sql:
+            helpers.drop_invalid_indexes([INDEX])
+        op.create_index(INDEX, "notifications", ["user_id", "is_read", "created_at", "id"], unique=False,
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.drop_index(OLD_INDEX, table_name="notifications", if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        if op.get_bind().dialect.name == "postgresql" and not op.get_context().as_sql:
+            helpers.drop_invalid_indexes([OLD_INDEX])
+        op.create_index(OLD_INDEX, "notifications", ["is_read", "created_at"], unique=False,
+                        if_not_exists=True, postgresql_concurrently=True)
+        op.drop_index(INDEX, table_name="notifications", if_exists=True, postgresql_concurrently=True)
@@ -0,0 +1,48 @@
+"""notification dedupe key
+
+``notifications.dedupe_key`` and the unique ``(user_id, dedupe_key)`` index
+the alert engine (alerts.py) relies on to raise each alert once. Existing
+notifications keep a NULL key, which the index does not constrain. The
+index is built concurrently on Postgres, after dropping a copy an
+interrupted build left INVALID; ``if_not_exists`` would otherwise keep the
+unusable copy.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 13:30:00.000000
+
+"""
+import importlib
+from pathlib import Path
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# alembic/helpers.py, imported through the package directory like env.py does
+helpers = importlib.import_module(f"{Path(__file__).resolve().parents[2].name}.alembic.helpers")
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEX = "uq_notifications_user_id_dedupe_key"
+
+
+def upgrade() -> None:
+    op.add_column('notifications', sa.Column('dedupe_key', sa.String(length=200), nullable=True))
+    # CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        if op.get_bind().dialect.name == "postgresql" and not op.get_context().as_sql:
+            helpers.drop_invalid_indexes([INDEX])
+        op.create_index(INDEX, "notifications", ["user_id", "dedupe_key"], unique=True,
+                        if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(INDEX, table_name="notifications", if_exists=True, postgresql_concurrently=True)
+    op.drop_column('notifications', 'dedupe_key')
@@ -0,0 +1,88 @@
+"""keyset created_at not null
+
+The keyset-paginated lists order by ``(created_at, id)``. A row with a NULL
+``created_at`` compares as neither before nor after a cursor, so it dropped
+out of every page after the first. The column has always defaulted to now();
+rows written without it are backfilled (from ``updated_at`` where the table
+has one) and the column becomes NOT NULL.
+
+On Postgres every step runs in an autocommit block and commits on its own:
+inside the migration's transaction the ACCESS EXCLUSIVE lock of ADD CONSTRAINT
+would be held through the backfill and the scans. A ``CHECK ... NOT VALID``
+constraint goes on first (a brief lock, and new rows are checked from then on),
+the backfill runs in committed batches, VALIDATE scans the table under a SHARE
+UPDATE EXCLUSIVE lock only, and SET NOT NULL uses the validated constraint
+instead of its own full-table scan under ACCESS EXCLUSIVE. The steps are
+idempotent, so an interrupted upgrade can be rerun.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> column the backfill prefers over the migration time
+TABLES = {
+    "projects": "updated_at",
+    "quotes": "updated_at",
+    "notifications": None,
+    "audit_logs": None,
+    "price_change_logs": None,
+}
+# Rows the Postgres backfill updates per committed statement
+BACKFILL_BATCH_SIZE = 10000
+
+
+def _backfill_sql(table: str, fallback: Union[str, None], where: str = "created_at IS NULL") -> str:
+    value = f"COALESCE({fallback}, CURRENT_TIMESTAMP)" if fallback else "CURRENT_TIMESTAMP"
+    return f"UPDATE {table} SET created_at = {value} WHERE {where}"
+
+
+def _backfill_batched(table: str, fallback: Union[str, None]) -> None:
+    """Backfill ``table`` in autocommit batches, so row locks last one batch."""
+    if op.get_context().as_sql:
+        # no row counts to loop on when emitting a script
+        op.execute(_backfill_sql(table, fallback))
+        return
+    batch = _backfill_sql(
+        table, fallback, f"ctid IN (SELECT ctid FROM {table} WHERE created_at IS NULL LIMIT {BACKFILL_BATCH_SIZE})"
+    )
+    while op.get_bind().execute(sa.text(batch)).rowcount:
+        pass
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        for table, fallback in TABLES.items():
+            op.execute(_backfill_sql(table, fallback))
+            with op.batch_alter_table(table) as batch:
+                batch.alter_column("created_at", existing_type=sa.DateTime(timezone=True), nullable=False)
+        return
+
+    with op.get_context().autocommit_block():
+        for table, fallback in TABLES.items():
+            check = f"ck_{table}_created_at_not_null"
+            op.execute(f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {check}")
+            op.execute(f"ALTER TABLE {table} ADD CONSTRAINT {check} CHECK (created_at IS NOT NULL) NOT VALID")
+            _backfill_batched(table, fallback)
+            op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {check}")
+            op.alter_column(table, "created_at", existing_type=sa.DateTime(timezone=True), nullable=False,
+                            existing_server_default=sa.text("now()"))
+            op.execute(f"ALTER TABLE {table} DROP CONSTRAINT {check}")
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch:
+            batch.alter_column("created_at", existing_type=sa.DateTime(timezone=True), nullable=True)
@@ -97,6 +97,7 @@ export const API_ENDPOINTS = {
   // Notifications
   NOTIFICATIONS: '/notifications',
   UNREAD_NOTIFICATIONS: '/notifications/unread',
+  NOTIFICATION_STREAM: '/notifications/stream',
   MARK_READ: (id) => `/notifications/${id}/read`,
   MARK_ALL_READ: '/notifications/read-all',
   
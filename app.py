@@ -1,17 +1,20 @@
 # fastapi-backend/app.py
 from __future__ import annotations
-from typing import List
+from typing import List, Optional
 
-from fastapi import FastAPI, Depends, Request, Response, HTTPException
+from fastapi import FastAPI, Depends, Request, Response, HTTPException, Query
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from sqlalchemy import text, func
 from sqlalchemy.orm import Session
-from . import crud_new as crud
+from . import crud
 from . import schemas
-from .database import get_db, test_connection
+from .database import get_db, run_startup_check
 from . import models
+from .catalog_cache import catalog_cache
+from .instrumentation import install_instrumentation
+from .pagination import InvalidCursor, page_response
 
 # -----------------------------------------------------------------------------
 # Create app FIRST
@@ -34,14 +37,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+install_instrumentation(app)
 
 # -----------------------------------------------------------------------------
 # Startup DB check
 # -----------------------------------------------------------------------------
 @app.on_event("startup")
 def _check_db() -> None:
-    err = test_connection()
-    print("DB connection OK" if not err else f"DB connection FAILED: {err}")
+    run_startup_check()
 
 # -----------------------------------------------------------------------------
 # Health & misc
@@ -66,6 +69,10 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     print("VALIDATION ERROR on", request.url.path, ":", exc.errors())
     return JSONResponse(status_code=422, content={"detail": exc.errors()})
 
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
 # -----------------------------------------------------------------------------
 # Material endpoints
 # -----------------------------------------------------------------------------
@@ -78,6 +85,10 @@ def read_materials(skip: int = 0, limit: int = 100, db: Session = Depends(get_db
     materials = crud.get_materials(db, skip=skip, limit=limit)
     return materials
 
+@app.get("/materials/page/", response_model=schemas.MaterialPage)
+def read_materials_page(cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+    return page_response(*crud.get_materials_page(db, cursor=cursor, limit=limit))
+
 @app.get("/materials/{material_id}", response_model=schemas.MaterialResponse)
 def read_material(material_id: int, db: Session = Depends(get_db)):
     db_material = crud.get_material(db, material_id=material_id)
@@ -115,6 +126,10 @@ def read_equipment(skip: int = 0, limit: int = 100, db: Session = Depends(get_db
     equipment = crud.get_equipment_list(db, skip=skip, limit=limit)
     return equipment
 
+@app.get("/equipment/page/", response_model=schemas.EquipmentPage)
+def read_equipment_page(cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+    return page_response(*crud.get_equipment_page(db, cursor=cursor, limit=limit))
+
 @app.get("/equipment/{equipment_id}", response_model=schemas.EquipmentResponse)
 def read_equipment_item(equipment_id: int, db: Session = Depends(get_db)):
     db_equipment = crud.get_equipment(db, equipment_id=equipment_id)
@@ -152,6 +167,10 @@ def read_labour_rates(skip: int = 0, limit: int = 100, db: Session = Depends(get
     labour_rates = crud.get_labour_rates(db, skip=skip, limit=limit)
     return labour_rates
 
+@app.get("/labour-rates/page/", response_model=schemas.LabourRatePage)
+def read_labour_rates_page(cursor: Optional[str] = None, limit: int = Query(100, ge=1, le=1000), db: Session = Depends(get_db)):
+    return page_response(*crud.get_labour_rates_page(db, cursor=cursor, limit=limit))
+
 @app.get("/labour-rates/state/{state_code}", response_model=List[schemas.LabourRateResponse])
 def read_labour_rates_by_state(state_code: str, db: Session = Depends(get_db)):
     labour_rates = crud.get_labour_rates_by_state(db, state_code=state_code)
@@ -188,3 +207,7 @@ def get_material_statistics(db: Session = Depends(get_db)):
 @app.get("/statistics/equipment/")
 def get_equipment_statistics(db: Session = Depends(get_db)):
     return crud.get_equipment_statistics(db)
+
+@app.get("/statistics/catalog-cache/")
+def get_catalog_cache_statistics():
+    return catalog_cache.stats()
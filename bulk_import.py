@@ -0,0 +1,240 @@
+"""
+Streaming catalog import.
+
+An uploaded CSV or NDJSON file is parsed incrementally, validated in batches
+against the entity's Create schema and loaded batch by batch: rows go into a
+temporary staging table (``COPY FROM STDIN`` on Postgres, executemany
+elsewhere) and are merged into the target with set-based UPDATEs and one
+INSERT ... WHERE NOT EXISTS keyed on the entity's natural key. An update only
+sets the columns the row actually carried (the CSV header, the NDJSON
+object's keys), so catalog values the file leaves out survive. Price changes
+found by diffing the staged rows against the catalog are logged to
+``price_change_logs`` before the merge, and an import that changed prices
+ends with a new rate card snapshot. Memory use is bounded by the batch size,
+not the file size. A failed batch is rolled back
+and reported; the remaining batches still load.
+"""
+import codecs
+import csv
+import io
+import json
+import time
+from typing import IO, Any, Dict, FrozenSet, Iterator, List, Optional, Tuple, Type
+
+from pydantic import ValidationError
+from sqlalchemy import Column, Integer, MetaData, Table, and_, exists, insert, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .catalog_cache import catalog_cache
+from .dashboard_stats import dashboard_stats_cache
+from .stat_counters import apply_deltas, staged_deltas
+from .config import settings
+from .price_changes import log_price_changes, staged_price_changes
+from .rate_snapshots import create_snapshot
+
+BULK_IMPORT_BATCH_SIZE = settings.bulk_import_batch_size
+# Validation messages kept per batch; the failed count is always exact
+MAX_ERRORS_PER_BATCH = 20
+# Staging column numbering the distinct column sets within a batch
+IMPORT_GROUP = "import_group"
+
+# A validated row: the columns the input supplied, and every column with defaults filled in
+ImportRow = Tuple[FrozenSet[str], Dict[str, Any]]
+
+
+class ImportEntity:
+    def __init__(self, model: Type[models.Base], schema: Type[schemas.BaseSchema], key: Tuple[str, ...]):
+        self.model = model
+        self.schema = schema
+        self.key = key
+        self.columns = list(schema.__fields__)
+
+
+IMPORT_ENTITIES: Dict[str, ImportEntity] = {
+    "materials": ImportEntity(models.Material, schemas.MaterialCreate, ("sales_part_no",)),
+    "equipment": ImportEntity(models.Equipment, schemas.EquipmentCreate, ("sales_part_no",)),
+    "labour_rates": ImportEntity(models.LabourRate, schemas.LabourRateCreate, ("labour_type", "state_code")),
+}
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in (content_type or ""):
+        return "ndjson"
+    return "csv"
+
+
+def iter_records(stream: IO[bytes], file_format: str) -> Iterator[Tuple[int, Any]]:
+    """Yield ``(line_number, record)`` pairs; malformed NDJSON lines yield the exception."""
+    text = codecs.getreader("utf-8-sig")(stream)
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, {k: (v if v != "" else None) for k, v in record.items() if k}
+        return
+    for line_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_number, json.loads(line)
+        except ValueError as exc:
+            yield line_number, exc
+
+
+def iter_batches(records: Iterator[Tuple[int, Any]], size: int) -> Iterator[List[Tuple[int, Any]]]:
+    batch: List[Tuple[int, Any]] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _validate(entity: ImportEntity, batch: List[Tuple[int, Any]]) -> Tuple[List[ImportRow], int, List[str]]:
+    """Valid rows (deduplicated on the key, last one wins), failed count and error messages."""
+    rows: Dict[Tuple, ImportRow] = {}
+    failed = 0
+    errors: List[str] = []
+    for line_number, record in batch:
+        try:
+            if isinstance(record, Exception):
+                raise ValueError(f"invalid JSON: {record}")
+            if not isinstance(record, dict):
+                raise ValueError("expected an object")
+            parsed = entity.schema(**record)
+        except (ValidationError, ValueError, TypeError) as exc:
+            failed += 1
+            if len(errors) < MAX_ERRORS_PER_BATCH:
+                errors.append(f"line {line_number}: {exc}".replace("\n", "; "))
+            continue
+        present = frozenset(parsed.model_dump(exclude_unset=True))
+        row = parsed.model_dump()
+        row = {column: getattr(row[column], "value", row[column]) for column in entity.columns}
+        rows[tuple(row[k] for k in entity.key)] = (present, row)
+    return list(rows.values()), failed, errors
+
+
+def _staging_table(entity: ImportEntity) -> Table:
+    target = entity.model.__table__
+    return Table(
+        f"{target.name}_import_stage",
+        MetaData(),
+        *(Column(name, target.c[name].type) for name in entity.columns),
+        Column(IMPORT_GROUP, Integer),
+        prefixes=["TEMPORARY"],
+    )
+
+
+def _copy_rows(conn: Connection, stage: Table, columns: List[str], rows: List[Dict[str, Any]]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["\\N" if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+    cursor = conn.connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {stage.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    finally:
+        cursor.close()
+
+
+def _merge_batch(db: Session, entity: ImportEntity, rows: List[ImportRow],
+                 changed_by: Optional[str] = None) -> Tuple[int, int, int]:
+    """Stage ``rows`` and merge them into the target; returns (inserted, updated, price changes)."""
+    conn = db.connection()
+    target = entity.model.__table__
+    stage = _staging_table(entity)
+    groups: Dict[FrozenSet[str], int] = {}
+    staged = [{**row, IMPORT_GROUP: groups.setdefault(present, len(groups))} for present, row in rows]
+    # a failed batch can leave the table behind where DDL is not transactional (pysqlite)
+    stage.drop(conn, checkfirst=True)
+    stage.create(conn)
+    if conn.dialect.name == "postgresql":
+        _copy_rows(conn, stage, entity.columns + [IMPORT_GROUP], staged)
+    else:
+        conn.execute(insert(stage), staged)
+    price_changes = log_price_changes(
+        conn, staged_price_changes(conn, entity.model, stage, entity.key, changed_by, "bulk import")
+    )
+    # the dashboard counters move by the staged rows, like a flush, instead of a recount
+    counter_deltas = staged_deltas(conn, entity.model, stage, entity.key)
+    matches = and_(*(target.c[k] == stage.c[k] for k in entity.key))
+    updated = 0
+    for present, group in groups.items():
+        # the price column is required by every schema, so each group sets at least that
+        values = {c: stage.c[c] for c in entity.columns if c in present and c not in entity.key}
+        updated += conn.execute(
+            update(target).where(matches, stage.c[IMPORT_GROUP] == group).values(values)
+        ).rowcount
+    inserted = conn.execute(
+        insert(target).from_select(
+            entity.columns,
+            select(*(stage.c[c] for c in entity.columns)).where(~exists().where(matches)),
+        )
+    ).rowcount
+    if counter_deltas:
+        apply_deltas(conn, counter_deltas)
+    stage.drop(conn)
+    return inserted, updated, price_changes
+
+
+def import_stream(db: Session, entity_type: str, stream: IO[bytes], file_format: str,
+                  batch_size: int = BULK_IMPORT_BATCH_SIZE, changed_by: Optional[str] = None) -> Dict[str, Any]:
+    """Import ``stream`` into ``entity_type``, committing once per batch."""
+    return import_records(db, entity_type, iter_records(stream, file_format), batch_size=batch_size, changed_by=changed_by)
+
+
+def import_records(db: Session, entity_type: str, records: Iterator[Tuple[int, Any]],
+                   batch_size: int = BULK_IMPORT_BATCH_SIZE, changed_by: Optional[str] = None) -> Dict[str, Any]:
+    """Import ``(line_number, record)`` pairs into ``entity_type``, committing once per batch."""
+    entity = IMPORT_ENTITIES[entity_type]
+    started = time.perf_counter()
+    batches: List[Dict[str, Any]] = []
+    for number, batch in enumerate(iter_batches(records, batch_size), start=1):
+        rows, failed, errors = _validate(entity, batch)
+        inserted = updated = price_changes = 0
+        if rows:
+            try:
+                inserted, updated, price_changes = _merge_batch(db, entity, rows, changed_by)
+                db.commit()
+            except Exception as exc:
+                db.rollback()
+                failed += len(rows)
+                errors.append(f"batch {number} not loaded: {exc}".replace("\n", "; "))
+        batches.append({
+            "batch": number,
+            "rows": len(batch),
+            "inserted": inserted,
+            "updated": updated,
+            "price_changes": price_changes,
+            "failed": failed,
+            "errors": errors,
+        })
+    catalog_cache.invalidate(entity.model)
+    dashboard_stats_cache.invalidate()
+    price_change_count = sum(b["price_changes"] for b in batches)
+    snapshot = create_snapshot(db, f"{entity_type} bulk import") if price_change_count else None
+
+    elapsed = time.perf_counter() - started
+    total_rows = sum(b["rows"] for b in batches)
+    inserted = sum(b["inserted"] for b in batches)
+    updated = sum(b["updated"] for b in batches)
+    failed = sum(b["failed"] for b in batches)
+    return {
+        "success": failed == 0,
+        "message": f"Imported {inserted + updated} of {total_rows} {entity_type} rows in {len(batches)} batches",
+        "imported_count": inserted + updated,
+        "failed_count": failed,
+        "errors": [error for b in batches for error in b["errors"]][:100],
+        "inserted_count": inserted,
+        "updated_count": updated,
+        "price_change_count": price_change_count,
+        "snapshot_id": snapshot.id if snapshot is not None else None,
+        "batches": batches,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(total_rows / elapsed) if elapsed > 0 else 0,
+    }
@@ -0,0 +1,257 @@
+"""
+Process-local cache of the rate card catalog (materials, equipment, labour rates).
+
+Each table is loaded in a single query into compact read-only tuples and
+indexed by id, sales_part_no, state_code and sor_code. The crud write paths
+patch the cache in place; a TTL forces a reload so that several workers
+sharing a database converge after another worker writes.
+"""
+import threading
+import time
+from collections import namedtuple
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+
+CATALOG_CACHE_TTL_SECONDS = settings.catalog_cache_ttl_seconds
+CATALOG_CACHE_MAX_ROWS = settings.catalog_cache_max_rows
+
+# Secondary indexes kept for each cached model (only columns the model has)
+_UNIQUE_KEYS = ("sales_part_no",)
+_GROUP_KEYS = ("state_code", "sor_code")
+
+
+class _Section:
+    """All cached rows of one table plus their lookup indexes."""
+
+    def __init__(self, model: Type[models.Base]):
+        self.model = model
+        self.columns = [c.name for c in model.__table__.columns]
+        self.row_type = namedtuple(f"Cached{model.__name__}", self.columns)
+        self.unique_keys = [k for k in _UNIQUE_KEYS if k in self.columns]
+        self.group_keys = [k for k in _GROUP_KEYS if k in self.columns]
+        self.loaded_at: Optional[float] = None
+        self.oversized = False
+        self.version = 0
+        self.by_id: Dict[Any, Tuple] = {}
+        self._rows: Optional[Tuple[Tuple, ...]] = None  # by_id values as of ``version``
+        self.unique: Dict[str, Dict[Any, Tuple]] = {}
+        self.groups: Dict[str, Dict[Any, List[Tuple]]] = {}
+
+    def is_fresh(self, ttl: int) -> bool:
+        return self.loaded_at is not None and (time.monotonic() - self.loaded_at) < ttl
+
+    def load(self, rows: List[Tuple]) -> None:
+        self.by_id = {row.id: row for row in rows}
+        self._reindex()
+        self.loaded_at = time.monotonic()
+        self.version += 1
+        self._rows = None
+
+    def clear(self) -> None:
+        self.loaded_at = None
+        self.by_id = {}
+        self.unique = {}
+        self.groups = {}
+        self._rows = None
+
+    def rows(self) -> Tuple[Tuple, ...]:
+        """All rows, copied once per version and shared until the next change."""
+        if self._rows is None:
+            self._rows = tuple(self.by_id.values())
+        return self._rows
+
+    def _reindex(self) -> None:
+        self.unique = {k: {} for k in self.unique_keys}
+        self.groups = {k: {} for k in self.group_keys}
+        for row in self.by_id.values():
+            self._index(row)
+
+    def _index(self, row: Tuple) -> None:
+        for key in self.unique_keys:
+            value = getattr(row, key)
+            if value is not None:
+                self.unique[key][value] = row
+        for key in self.group_keys:
+            value = getattr(row, key)
+            if value is not None:
+                self.groups[key].setdefault(value, []).append(row)
+
+    def _unindex(self, row: Tuple) -> None:
+        for key in self.unique_keys:
+            value = getattr(row, key)
+            if self.unique[key].get(value) is row:
+                del self.unique[key][value]
+        for key in self.group_keys:
+            bucket = self.groups[key].get(getattr(row, key))
+            if bucket is not None:
+                bucket[:] = [r for r in bucket if r is not row]
+                if not bucket:
+                    del self.groups[key][getattr(row, key)]
+
+    def upsert(self, row: Tuple) -> None:
+        previous = self.by_id.get(row.id)
+        if previous is not None:
+            self._unindex(previous)
+        self.by_id[row.id] = row
+        self._index(row)
+        self.version += 1
+        self._rows = None
+
+    def discard(self, row_id: Any) -> None:
+        previous = self.by_id.pop(row_id, None)
+        if previous is not None:
+            self._unindex(previous)
+            self.version += 1
+            self._rows = None
+
+
+class CatalogCache:
+    """Keyed, TTL-bounded cache of the Material, Equipment and LabourRate tables.
+
+    A table larger than ``max_rows`` is never held in memory; lookups against
+    it fall through to the database and are counted as misses.
+    """
+
+    def __init__(self, ttl_seconds: int = CATALOG_CACHE_TTL_SECONDS, max_rows: int = CATALOG_CACHE_MAX_ROWS):
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._sections: Dict[Type[models.Base], _Section] = {
+            model: _Section(model) for model in (models.Material, models.Equipment, models.LabourRate)
+        }
+
+    # ----------------------------- loading -----------------------------
+    def _section(self, db: Session, model: Type[models.Base]) -> Optional[_Section]:
+        section = self._sections[model]
+        if section.is_fresh(self.ttl_seconds):
+            return None if section.oversized else section
+        with self._lock:
+            if not section.is_fresh(self.ttl_seconds):
+                table = model.__table__
+                rows = db.execute(select(*table.columns).limit(self.max_rows + 1)).all()
+                section.oversized = len(rows) > self.max_rows
+                section.load([] if section.oversized else [section.row_type._make(r) for r in rows])
+                self.reloads += 1
+        return None if section.oversized else section
+
+    def _fetch(self, db: Session, model: Type[models.Base], *criteria: Any) -> List[Tuple]:
+        """Read rows of an uncached table as the same tuples the cache holds."""
+        section = self._sections[model]
+        table = model.__table__
+        return [section.row_type._make(r) for r in db.execute(select(*table.columns).where(*criteria)).all()]
+
+    def _count(self, found: bool) -> None:
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    # ----------------------------- reads -----------------------------
+    # Every read returns the cached row tuples, also when an oversized table is
+    # read from the database, so callers never see ORM objects from here.
+    def get_by_id(self, db: Session, model: Type[models.Base], row_id: Any) -> Optional[Tuple]:
+        section = self._section(db, model)
+        if section is None:
+            self.misses += 1
+            return next(iter(self._fetch(db, model, model.__table__.c.id == row_id)), None)
+        row = section.by_id.get(row_id)
+        self._count(row is not None)
+        return row
+
+    def get_by_key(self, db: Session, model: Type[models.Base], key: str, value: Any) -> Optional[Tuple]:
+        section = self._section(db, model)
+        if section is None:
+            self.misses += 1
+            return next(iter(self._fetch(db, model, model.__table__.c[key] == value)), None)
+        row = section.unique[key].get(value)
+        self._count(row is not None)
+        return row
+
+    def get_group(self, db: Session, model: Type[models.Base], key: str, value: Any) -> List[Tuple]:
+        section = self._section(db, model)
+        if section is None:
+            self.misses += 1
+            return self._fetch(db, model, model.__table__.c[key] == value)
+        rows = section.groups[key].get(value, [])
+        self._count(bool(rows))
+        return list(rows)
+
+    def all_rows(self, db: Session, model: Type[models.Base]) -> List[Tuple]:
+        section = self._section(db, model)
+        if section is None:
+            self.misses += 1
+            return self._fetch(db, model)
+        self.hits += 1
+        return list(section.rows())
+
+    def version(self, db: Session, model: Type[models.Base]) -> Optional[int]:
+        """Version of a cached table, bumped on every change; None if it is too large to cache.
+
+        Lets callers that derive structures from the rows check for changes
+        without copying them.
+        """
+        section = self._section(db, model)
+        return None if section is None else section.version
+
+    def snapshot(self, db: Session, model: Type[models.Base]) -> Optional[Tuple[int, Tuple[Tuple, ...]]]:
+        """Return ``(version, rows)`` for a cached table, or None if it is too large to cache.
+
+        ``rows`` is shared between callers until the table changes; do not mutate it.
+        """
+        section = self._section(db, model)
+        if section is None:
+            return None
+        with self._lock:
+            return section.version, section.rows()
+
+    # ----------------------------- writes -----------------------------
+    def upsert(self, obj: models.Base) -> None:
+        section = self._sections.get(type(obj))
+        if section is None or section.loaded_at is None or section.oversized:
+            return
+        with self._lock:
+            section.upsert(section.row_type(*(getattr(obj, c) for c in section.columns)))
+
+    def discard(self, model: Type[models.Base], row_id: Any) -> None:
+        section = self._sections.get(model)
+        if section is None or section.loaded_at is None:
+            return
+        with self._lock:
+            section.discard(row_id)
+
+    def invalidate(self, model: Optional[Type[models.Base]] = None) -> None:
+        with self._lock:
+            for section_model, section in self._sections.items():
+                if model is None or section_model is model:
+                    section.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "reloads": self.reloads,
+            "ttl_seconds": self.ttl_seconds,
+            "max_rows": self.max_rows,
+            "tables": {
+                model.__tablename__: {
+                    "rows": len(section.by_id),
+                    "oversized": section.oversized,
+                    "age_seconds": round(time.monotonic() - section.loaded_at, 1) if section.loaded_at else None,
+                }
+                for model, section in self._sections.items()
+            },
+        }
+
+
+# Shared instance used by crud and the API layer
+catalog_cache = CatalogCache()
@@ -1,7 +1,42 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
-from typing import List, Optional
+from sqlalchemy.orm import Session, defer
+from sqlalchemy import and_, or_, func, select, update
+from datetime import datetime
+from typing import Any, List, Optional, Tuple, Type
+import uuid
 from . import models, schemas
+from .catalog_cache import catalog_cache
+from .alerts import run_once as run_alerts_once
+from .bulk_import import import_records
+from .dashboard_stats import get_dashboard_snapshot
+from .config import settings
+from .stat_counters import UNREAD_USERS, adjust_unread, reconcile as reconcile_stat_counters, unread_count
+from .load_profiles import with_profile
+from .pagination import keyset_paginate
+from . import price_changes  # noqa: F401  registers the price change after_flush hook
+from . import notification_stream  # noqa: F401  registers the notification publishing hooks
+from .project_totals import TOTAL_COLUMNS, compute_project_totals, refresh_project_totals, totals_select
+from .search_index import SEARCH_FIELDS, search_catalog
+from .rate_snapshots import create_snapshot, resolve_snapshot
+
+# ----------------------------- USERS -----------------------------
+def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[models.User]:
+    return db.query(models.User).order_by(models.User.created_at, models.User.id).offset(skip).limit(limit).all()
+
+def get_user(db: Session, user_id: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.id == user_id).first()
+
+def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.email == email).first()
+
+def get_user_by_username(db: Session, username: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.username == username).first()
+
+def create_user(db: Session, user: schemas.UserCreate, password_hash: str) -> models.User:
+    db_user = models.User(**user.dict(exclude={"password"}), password_hash=password_hash)
+    db.add(db_user)
+    db.commit()
+    db.refresh(db_user)
+    return db_user
 
 # ----------------------------- MATERIALS -----------------------------
 def create_material(db: Session, material: schemas.MaterialCreate) -> models.Material:
@@ -9,48 +44,62 @@ def create_material(db: Session, material: schemas.MaterialCreate) -> models.Mat
     db.add(db_material)
     db.commit()
     db.refresh(db_material)
+    catalog_cache.upsert(db_material)
     return db_material
 
-def get_material(db: Session, material_id: int) -> Optional[models.Material]:
+def _load_material(db: Session, material_id: int) -> Optional[models.Material]:
     return db.query(models.Material).filter(models.Material.id == material_id).first()
 
-def get_materials(db: Session, skip: int = 0, limit: int = 100) -> List[models.Material]:
-    return db.query(models.Material).offset(skip).limit(limit).all()
+def get_material(db: Session, material_id: int) -> Optional[models.Material]:
+    return catalog_cache.get_by_id(db, models.Material, material_id)
+
+def get_material_by_part_no(db: Session, sales_part_no: str) -> Optional[models.Material]:
+    return catalog_cache.get_by_key(db, models.Material, "sales_part_no", sales_part_no)
+
+def get_materials_by_sor_code(db: Session, sor_code: str) -> List[models.Material]:
+    return catalog_cache.get_group(db, models.Material, "sor_code", sor_code)
+
+def get_materials(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> List[models.Material]:
+    if search:
+        return search_materials(db, schemas.MaterialSearch(search_term=search, skip=skip, limit=limit))
+    return db.query(models.Material).order_by(models.Material.id).offset(skip).limit(limit).all()
+
+def get_materials_page(db: Session, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[models.Material], Optional[str]]:
+    return keyset_paginate(db.query(models.Material), [models.Material.id], cursor, limit)
 
 def search_materials(db: Session, search: schemas.MaterialSearch) -> List[models.Material]:
-    query = db.query(models.Material)
-    if search.search_term:
-        search_term = f"%{search.search_term}%"
-        query = query.filter(
-            or_(
-                models.Material.id.ilike(search_term),
-                models.Material.description.ilike(search_term),
-                models.Material.sales_part_no.ilike(search_term)
-            )
-        )
+    filters = []
     if search.state_code:
-        query = query.filter(models.Material.state_code == search.state_code)
+        filters.append(models.Material.state_code == search.state_code)
     if search.min_price is not None:
-        query = query.filter(models.Material.unit_cost >= search.min_price)
+        filters.append(models.Material.unit_cost >= search.min_price)
     if search.max_price is not None:
-        query = query.filter(models.Material.unit_cost <= search.max_price)
-    return query.all()
+        filters.append(models.Material.unit_cost <= search.max_price)
+
+    def matches(row) -> bool:
+        return ((not search.state_code or row.state_code == search.state_code)
+                and (search.min_price is None or row.unit_cost >= search.min_price)
+                and (search.max_price is None or row.unit_cost <= search.max_price))
+
+    return search_catalog(db, models.Material, search.search_term, filters, matches, skip=search.skip, limit=search.limit)
 
 def update_material(db: Session, material_id: int, material: schemas.MaterialUpdate) -> Optional[models.Material]:
-    db_material = get_material(db, material_id)
+    db_material = _load_material(db, material_id)
     if db_material:
         update_data = material.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_material, field, value)
         db.commit()
         db.refresh(db_material)
+        catalog_cache.upsert(db_material)
     return db_material
 
 def delete_material(db: Session, material_id: int) -> bool:
-    db_material = get_material(db, material_id)
+    db_material = _load_material(db, material_id)
     if db_material:
         db.delete(db_material)
         db.commit()
+        catalog_cache.discard(models.Material, material_id)
         return True
     return False
 
@@ -60,50 +109,65 @@ def create_equipment(db: Session, equipment: schemas.EquipmentCreate) -> models.
     db.add(db_equipment)
     db.commit()
     db.refresh(db_equipment)
+    catalog_cache.upsert(db_equipment)
     return db_equipment
 
-def get_equipment(db: Session, equipment_id: int) -> Optional[models.Equipment]:
+def _load_equipment(db: Session, equipment_id: int) -> Optional[models.Equipment]:
     return db.query(models.Equipment).filter(models.Equipment.id == equipment_id).first()
 
-def get_equipment_list(db: Session, skip: int = 0, limit: int = 100) -> List[models.Equipment]:
-    return db.query(models.Equipment).offset(skip).limit(limit).all()
+def get_equipment(db: Session, equipment_id: int) -> Optional[models.Equipment]:
+    return catalog_cache.get_by_id(db, models.Equipment, equipment_id)
+
+def get_equipment_by_part_no(db: Session, sales_part_no: str) -> Optional[models.Equipment]:
+    return catalog_cache.get_by_key(db, models.Equipment, "sales_part_no", sales_part_no)
+
+def get_equipment_by_sor_code(db: Session, sor_code: str) -> List[models.Equipment]:
+    return catalog_cache.get_group(db, models.Equipment, "sor_code", sor_code)
+
+def get_equipment_list(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None) -> List[models.Equipment]:
+    if search:
+        return search_equipment(db, schemas.EquipmentSearch(search_term=search, skip=skip, limit=limit))
+    return db.query(models.Equipment).order_by(models.Equipment.id).offset(skip).limit(limit).all()
+
+def get_equipment_page(db: Session, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[models.Equipment], Optional[str]]:
+    return keyset_paginate(db.query(models.Equipment), [models.Equipment.id], cursor, limit)
 
 def search_equipment(db: Session, search: schemas.EquipmentSearch) -> List[models.Equipment]:
-    query = db.query(models.Equipment)
-    if search.search_term:
-        search_term = f"%{search.search_term}%"
-        query = query.filter(
-            or_(
-                models.Equipment.id.ilike(search_term),
-                models.Equipment.equipment_name.ilike(search_term),
-                models.Equipment.category.ilike(search_term)
-            )
-        )
+    filters = []
     if search.category:
-        query = query.filter(models.Equipment.category == search.category)
+        filters.append(models.Equipment.category == search.category)
     if search.state_code:
-        query = query.filter(models.Equipment.state_code == search.state_code)
+        filters.append(models.Equipment.state_code == search.state_code)
     if search.min_price is not None:
-        query = query.filter(models.Equipment.price >= search.min_price)
+        filters.append(models.Equipment.price >= search.min_price)
     if search.max_price is not None:
-        query = query.filter(models.Equipment.price <= search.max_price)
-    return query.all()
+        filters.append(models.Equipment.price <= search.max_price)
+
+    def matches(row) -> bool:
+        return ((not search.category or row.category == search.category)
+                and (not search.state_code or row.state_code == search.state_code)
+                and (search.min_price is None or row.price >= search.min_price)
+                and (search.max_price is None or row.price <= search.max_price))
+
+    return search_catalog(db, models.Equipment, search.search_term, filters, matches, skip=search.skip, limit=search.limit)
 
 def update_equipment(db: Session, equipment_id: int, equipment: schemas.EquipmentUpdate) -> Optional[models.Equipment]:
-    db_equipment = get_equipment(db, equipment_id)
+    db_equipment = _load_equipment(db, equipment_id)
     if db_equipment:
         update_data = equipment.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_equipment, field, value)
         db.commit()
         db.refresh(db_equipment)
+        catalog_cache.upsert(db_equipment)
     return db_equipment
 
 def delete_equipment(db: Session, equipment_id: int) -> bool:
-    db_equipment = get_equipment(db, equipment_id)
+    db_equipment = _load_equipment(db, equipment_id)
     if db_equipment:
         db.delete(db_equipment)
         db.commit()
+        catalog_cache.discard(models.Equipment, equipment_id)
         return True
     return False
 
@@ -113,32 +177,51 @@ def create_labour_rate(db: Session, labour_rate: schemas.LabourRateCreate) -> mo
     db.add(db_labour_rate)
     db.commit()
     db.refresh(db_labour_rate)
+    catalog_cache.upsert(db_labour_rate)
     return db_labour_rate
 
-def get_labour_rate(db: Session, labour_rate_id: int) -> Optional[models.LabourRate]:
+def _load_labour_rate(db: Session, labour_rate_id: int) -> Optional[models.LabourRate]:
     return db.query(models.LabourRate).filter(models.LabourRate.id == labour_rate_id).first()
 
-def get_labour_rates(db: Session, skip: int = 0, limit: int = 100) -> List[models.LabourRate]:
-    return db.query(models.LabourRate).offset(skip).limit(limit).all()
+def get_labour_rate(db: Session, labour_rate_id: int) -> Optional[models.LabourRate]:
+    return catalog_cache.get_by_id(db, models.LabourRate, labour_rate_id)
+
+def get_labour_rates(db: Session, skip: int = 0, limit: int = 100, state_code: Optional[str] = None) -> List[models.LabourRate]:
+    query = db.query(models.LabourRate)
+    if state_code:
+        query = query.filter(models.LabourRate.state_code == getattr(state_code, "value", state_code))
+    return query.order_by(models.LabourRate.id).offset(skip).limit(limit).all()
+
+def get_labour_rates_page(db: Session, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[models.LabourRate], Optional[str]]:
+    return keyset_paginate(db.query(models.LabourRate), [models.LabourRate.id], cursor, limit)
 
 def get_labour_rates_by_state(db: Session, state_code: str) -> List[models.LabourRate]:
-    return db.query(models.LabourRate).filter(models.LabourRate.state_code == state_code).all()
+    return catalog_cache.get_group(db, models.LabourRate, "state_code", state_code)
+
+def get_effective_rate(db: Session, labour_type: str, state_code: str) -> Optional[float]:
+    """Cost of one person for the rate's hours, as the calculator prices a labour line."""
+    for rate in get_labour_rates_by_state(db, getattr(state_code, "value", state_code)):
+        if rate.labour_type == labour_type:
+            return rate.cost_per_person * (rate.hours or 1)
+    return None
 
 def update_labour_rate(db: Session, labour_rate_id: int, labour_rate: schemas.LabourRateUpdate) -> Optional[models.LabourRate]:
-    db_labour_rate = get_labour_rate(db, labour_rate_id)
+    db_labour_rate = _load_labour_rate(db, labour_rate_id)
     if db_labour_rate:
         update_data = labour_rate.dict(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_labour_rate, field, value)
         db.commit()
         db.refresh(db_labour_rate)
+        catalog_cache.upsert(db_labour_rate)
     return db_labour_rate
 
 def delete_labour_rate(db: Session, labour_rate_id: int) -> bool:
-    db_labour_rate = get_labour_rate(db, labour_rate_id)
+    db_labour_rate = _load_labour_rate(db, labour_rate_id)
     if db_labour_rate:
         db.delete(db_labour_rate)
         db.commit()
+        catalog_cache.discard(models.LabourRate, labour_rate_id)
         return True
     return False
 
@@ -153,11 +236,33 @@ def create_notification(db: Session, notification: schemas.NotificationCreate) -
 def get_notification(db: Session, notification_id: str) -> Optional[models.Notification]:
     return db.query(models.Notification).filter(models.Notification.id == notification_id).first()
 
-def get_notifications(db: Session, skip: int = 0, limit: int = 100) -> List[models.Notification]:
-    return db.query(models.Notification).order_by(models.Notification.created_at.desc()).offset(skip).limit(limit).all()
+def get_notifications(db: Session, user_id: Optional[str] = None, skip: int = 0, limit: int = 100) -> List[models.Notification]:
+    query = with_profile(db.query(models.Notification), models.Notification, "list")
+    if user_id:
+        query = query.filter(models.Notification.user_id == user_id)
+    return query.order_by(models.Notification.created_at.desc(), models.Notification.id.desc()).offset(skip).limit(limit).all()
+
+def get_notifications_page(db: Session, user_id: Optional[str] = None, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[models.Notification], Optional[str]]:
+    query = with_profile(db.query(models.Notification), models.Notification, "list")
+    if user_id:
+        query = query.filter(models.Notification.user_id == user_id)
+    return keyset_paginate(query, [models.Notification.created_at, models.Notification.id], cursor, limit, descending=True)
 
-def get_unread_notifications(db: Session) -> List[models.Notification]:
-    return db.query(models.Notification).filter(models.Notification.is_read == False).order_by(models.Notification.created_at.desc()).all()
+# Rows marked read per transaction by mark_all_notifications_read
+NOTIFICATION_MARK_READ_BATCH_SIZE = settings.notification_mark_read_batch_size
+
+def _unread_notifications_query(db: Session, user_id: str):
+    # served by ix_notifications_user_id_is_read_created_at_id
+    return with_profile(db.query(models.Notification), models.Notification, "list").filter(
+        models.Notification.user_id == user_id, models.Notification.is_read == False
+    )
+
+def get_unread_notifications(db: Session, user_id: str, limit: int = 100) -> List[models.Notification]:
+    return _unread_notifications_query(db, user_id).order_by(models.Notification.created_at.desc(), models.Notification.id.desc()).limit(limit).all()
+
+def get_unread_notifications_page(db: Session, user_id: str, cursor: Optional[str] = None, limit: int = 100) -> Tuple[List[models.Notification], Optional[str]]:
+    query = _unread_notifications_query(db, user_id)
+    return keyset_paginate(query, [models.Notification.created_at, models.Notification.id], cursor, limit, descending=True)
 
 def update_notification(db: Session, notification_id: str, notification: schemas.NotificationUpdate) -> Optional[models.Notification]:
     db_notification = get_notification(db, notification_id)
@@ -177,28 +282,489 @@ def delete_notification(db: Session, notification_id: str) -> bool:
         return True
     return False
 
-def mark_all_notifications_read(db: Session) -> int:
-    result = db.query(models.Notification).filter(models.Notification.is_read == False).update({"is_read": True})
+def mark_notification_read(db: Session, notification_id: str) -> bool:
+    db_notification = get_notification(db, notification_id)
+    if db_notification is None:
+        return False
+    if not db_notification.is_read:
+        db_notification.is_read = True
+        db.commit()
+    return True
+
+def mark_all_notifications_read(db: Session, user_id: str, batch_size: int = NOTIFICATION_MARK_READ_BATCH_SIZE) -> int:
+    """Mark the unread notifications of ``user_id`` read, oldest first, committing every ``batch_size`` rows.
+
+    Short transactions keep a large inbox from holding its row locks for long.
+    Each batch moves the user's unread counter by the rows it changed.
+    """
+    Notification = models.Notification
+    marked = 0
+    while True:
+        ids = db.execute(
+            select(Notification.id).where(Notification.user_id == user_id, Notification.is_read == False)
+            .order_by(Notification.created_at, Notification.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        # is_read is checked again: a concurrent request may have marked some of them already
+        changed = db.execute(
+            update(Notification).where(Notification.id.in_(ids), Notification.is_read == False)
+            .values(is_read=True).execution_options(synchronize_session=False, **{UNREAD_USERS: [user_id]})
+        ).rowcount
+        adjust_unread(db.connection(), {user_id: -changed})
+        db.commit()
+        marked += changed
+        if len(ids) < batch_size:
+            break
+    return marked
+
+# ----------------------------- PROJECTS / QUOTES / AUDIT -----------------------------
+def _projects_query(db: Session, filters: Optional[schemas.SearchFilters] = None, profile: str = "list"):
+    query = with_profile(db.query(models.Project), models.Project, profile)
+    if filters:
+        if filters.search_term:
+            query = query.filter(models.Project.name.ilike(f"%{filters.search_term}%"))
+        if filters.status:
+            query = query.filter(models.Project.status == filters.status)
+        if filters.priority:
+            query = query.filter(models.Project.priority == filters.priority)
+        if filters.manager_id:
+            query = query.filter(models.Project.manager_id == filters.manager_id)
+        if filters.category:
+            query = query.filter(models.Project.category == filters.category)
+        if filters.start_date_from:
+            query = query.filter(models.Project.start_date >= filters.start_date_from)
+        if filters.start_date_to:
+            query = query.filter(models.Project.start_date <= filters.start_date_to)
+        if filters.budget_min is not None:
+            query = query.filter(models.Project.budget >= filters.budget_min)
+        if filters.budget_max is not None:
+            query = query.filter(models.Project.budget <= filters.budget_max)
+    return query
+
+def get_projects(db: Session, skip: int = 0, limit: int = 100, filters: Optional[schemas.SearchFilters] = None, profile: str = "list") -> List[models.Project]:
+    query = _projects_query(db, filters, profile)
+    return query.order_by(models.Project.created_at.desc(), models.Project.id.desc()).offset(skip).limit(limit).all()
+
+def get_projects_page(db: Session, cursor: Optional[str] = None, limit: int = 100, filters: Optional[schemas.SearchFilters] = None, profile: str = "list") -> Tuple[List[models.Project], Optional[str]]:
+    query = _projects_query(db, filters, profile)
+    return keyset_paginate(query, [models.Project.created_at, models.Project.id], cursor, limit, descending=True)
+
+def get_project(db: Session, project_id: str, profile: str = "detail") -> Optional[models.Project]:
+    return with_profile(db.query(models.Project), models.Project, profile).filter(models.Project.id == project_id).first()
+
+def get_recent_projects(db: Session, limit: int = 5) -> List[models.Project]:
+    return get_projects(db, limit=limit)
+
+def search_projects(db: Session, filters: schemas.AdvancedSearchFilters, skip: int = 0, limit: int = 100) -> List[models.Project]:
+    query = _projects_query(db, filters)
+    if filters.region:
+        query = query.filter(models.Project.region == filters.region)
+    if filters.sor_type:
+        query = query.filter(models.Project.sor_type == filters.sor_type)
+    if filters.sor_code:
+        query = query.filter(models.Project.sor_code == filters.sor_code)
+    if filters.progress_min is not None:
+        query = query.filter(models.Project.progress >= filters.progress_min)
+    if filters.progress_max is not None:
+        query = query.filter(models.Project.progress <= filters.progress_max)
+    return query.order_by(models.Project.created_at.desc(), models.Project.id.desc()).offset(skip).limit(limit).all()
+
+def create_project(db: Session, project: schemas.ProjectCreate) -> models.Project:
+    db_project = models.Project(**project.dict())
+    db.add(db_project)
+    db.commit()
+    db.refresh(db_project)
+    return db_project
+
+def update_project(db: Session, project_id: str, project: schemas.ProjectUpdate) -> Optional[models.Project]:
+    db_project = db.get(models.Project, project_id)
+    if db_project:
+        update_data = project.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(db_project, field, value)
+        db.commit()
+        db.refresh(db_project)
+    return db_project
+
+def delete_project(db: Session, project_id: str) -> bool:
+    db_project = db.get(models.Project, project_id)
+    if db_project:
+        db.delete(db_project)
+        db.commit()
+        return True
+    return False
+
+# ----------------------------- PROJECT LINES -----------------------------
+# Lines are added and removed through the ORM so project_totals sees them in after_flush
+def _add_project_line(db: Session, line: models.Base) -> models.Base:
+    db.add(line)
     db.commit()
-    return result
+    db.refresh(line)
+    return line
+
+def _remove_project_lines(db: Session, query) -> bool:
+    lines = query.all()
+    for line in lines:
+        db.delete(line)
+    db.commit()
+    return bool(lines)
+
+def add_material_to_project(db: Session, project_material: schemas.ProjectMaterialCreate) -> models.ProjectMaterial:
+    return _add_project_line(db, models.ProjectMaterial(**project_material.dict()))
+
+def remove_material_from_project(db: Session, project_id: str, material_id: int) -> bool:
+    return _remove_project_lines(db, db.query(models.ProjectMaterial).filter(
+        models.ProjectMaterial.project_id == project_id, models.ProjectMaterial.material_id == material_id
+    ))
+
+def add_equipment_to_project(db: Session, project_equipment: schemas.ProjectEquipmentCreate) -> models.ProjectEquipment:
+    return _add_project_line(db, models.ProjectEquipment(**project_equipment.dict()))
+
+def remove_equipment_from_project(db: Session, project_id: str, equipment_id: int) -> bool:
+    return _remove_project_lines(db, db.query(models.ProjectEquipment).filter(
+        models.ProjectEquipment.project_id == project_id, models.ProjectEquipment.equipment_id == equipment_id
+    ))
+
+def add_labor_to_project(db: Session, project_labor: schemas.ProjectLaborCreate) -> models.ProjectLabor:
+    return _add_project_line(db, models.ProjectLabor(**project_labor.dict()))
+
+def remove_labor_from_project(db: Session, project_id: str, labor_id: str) -> bool:
+    return _remove_project_lines(db, db.query(models.ProjectLabor).filter(
+        models.ProjectLabor.project_id == project_id, models.ProjectLabor.id == labor_id
+    ))
+
+def _quotes_query(db: Session, search: Optional[str] = None, profile: str = "list"):
+    query = with_profile(db.query(models.Quote), models.Quote, profile)
+    if search:
+        term = f"%{search}%"
+        query = query.filter(
+            or_(
+                models.Quote.quote_number.ilike(term),
+                models.Quote.client_name.ilike(term),
+                models.Quote.project_name.ilike(term)
+            )
+        )
+    return query
+
+def get_quotes(db: Session, skip: int = 0, limit: int = 100, search: Optional[str] = None, profile: str = "list") -> List[models.Quote]:
+    query = _quotes_query(db, search, profile)
+    return query.order_by(models.Quote.created_at.desc(), models.Quote.id.desc()).offset(skip).limit(limit).all()
+
+def get_quotes_page(db: Session, cursor: Optional[str] = None, limit: int = 100, search: Optional[str] = None, profile: str = "list") -> Tuple[List[models.Quote], Optional[str]]:
+    query = _quotes_query(db, search, profile)
+    return keyset_paginate(query, [models.Quote.created_at, models.Quote.id], cursor, limit, descending=True)
+
+def get_quote(db: Session, quote_id: str, profile: str = "detail") -> Optional[models.Quote]:
+    return with_profile(db.query(models.Quote), models.Quote, profile).filter(models.Quote.id == quote_id).first()
+
+def generate_quote_number(db: Session) -> str:
+    # random suffix rather than a running count, so concurrent requests cannot collide on the unique key
+    return f"Q-{datetime.utcnow():%Y%m%d}-{uuid.uuid4().hex[:8].upper()}"
+
+def create_quote(db: Session, quote: schemas.QuoteCreate, created_by: str) -> models.Quote:
+    db_quote = models.Quote(
+        **quote.dict(exclude={"quote_items"}),
+        created_by=created_by,
+        quote_items=[models.QuoteItem(**item.dict()) for item in quote.quote_items],
+    )
+    db.add(db_quote)
+    db.commit()
+    db.refresh(db_quote)
+    return db_quote
+
+def update_quote(db: Session, quote_id: str, quote: schemas.QuoteUpdate) -> Optional[models.Quote]:
+    db_quote = db.get(models.Quote, quote_id)
+    if db_quote:
+        update_data = quote.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(db_quote, field, value)
+        db.commit()
+        db.refresh(db_quote)
+    return db_quote
+
+def delete_quote(db: Session, quote_id: str) -> bool:
+    db_quote = db.get(models.Quote, quote_id)
+    if db_quote:
+        db.delete(db_quote)
+        db.commit()
+        return True
+    return False
+
+def get_quote_items(db: Session, quote_id: str) -> List[models.QuoteItem]:
+    return (
+        db.query(models.QuoteItem).filter(models.QuoteItem.quote_id == quote_id)
+        .order_by(models.QuoteItem.sort_order, models.QuoteItem.created_at).all()
+    )
+
+def _load_quote_item(db: Session, quote_id: str, item_id: str) -> Optional[models.QuoteItem]:
+    return db.query(models.QuoteItem).filter(models.QuoteItem.quote_id == quote_id, models.QuoteItem.id == item_id).first()
+
+def create_quote_item(db: Session, quote_id: str, item: schemas.QuoteItemCreate) -> models.QuoteItem:
+    db_item = models.QuoteItem(**item.dict(), quote_id=quote_id)
+    db.add(db_item)
+    db.commit()
+    db.refresh(db_item)
+    return db_item
+
+def update_quote_item(db: Session, quote_id: str, item_id: str, item: schemas.QuoteItemUpdate) -> Optional[models.QuoteItem]:
+    db_item = _load_quote_item(db, quote_id, item_id)
+    if db_item:
+        update_data = item.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(db_item, field, value)
+        db.commit()
+        db.refresh(db_item)
+    return db_item
+
+def delete_quote_item(db: Session, quote_id: str, item_id: str) -> bool:
+    db_item = _load_quote_item(db, quote_id, item_id)
+    if db_item:
+        db.delete(db_item)
+        db.commit()
+        return True
+    return False
+
+def get_audit_logs(db: Session, skip: int = 0, limit: int = 100, user_id: Optional[str] = None) -> List[models.AuditLog]:
+    query = with_profile(db.query(models.AuditLog), models.AuditLog, "list")
+    if user_id:
+        query = query.filter(models.AuditLog.user_id == user_id)
+    return query.order_by(models.AuditLog.created_at.desc(), models.AuditLog.id.desc()).offset(skip).limit(limit).all()
+
+def get_audit_logs_page(db: Session, cursor: Optional[str] = None, limit: int = 100, user_id: Optional[str] = None) -> Tuple[List[models.AuditLog], Optional[str]]:
+    query = with_profile(db.query(models.AuditLog), models.AuditLog, "list")
+    if user_id:
+        query = query.filter(models.AuditLog.user_id == user_id)
+    return keyset_paginate(query, [models.AuditLog.created_at, models.AuditLog.id], cursor, limit, descending=True)
+
+# ----------------------------- PRICE CHANGES -----------------------------
+def _price_changes_query(db: Session, entity_type: Optional[str] = None, entity_id: Optional[str] = None,
+                         since: Optional[datetime] = None, until: Optional[datetime] = None):
+    # entity_type + created_at is served by ix_price_change_logs_entity_type_created_at
+    query = with_profile(db.query(models.PriceChangeLog), models.PriceChangeLog, "list")
+    if entity_type:
+        query = query.filter(models.PriceChangeLog.entity_type == entity_type)
+    if entity_id:
+        query = query.filter(models.PriceChangeLog.entity_id == entity_id)
+    if since:
+        query = query.filter(models.PriceChangeLog.created_at >= since)
+    if until:
+        query = query.filter(models.PriceChangeLog.created_at < until)
+    return query
+
+def get_price_changes(db: Session, skip: int = 0, limit: int = 100, entity_type: Optional[str] = None, entity_id: Optional[str] = None,
+                      since: Optional[datetime] = None, until: Optional[datetime] = None) -> List[models.PriceChangeLog]:
+    query = _price_changes_query(db, entity_type, entity_id, since, until)
+    return query.order_by(models.PriceChangeLog.created_at.desc(), models.PriceChangeLog.id.desc()).offset(skip).limit(limit).all()
+
+def get_price_changes_page(db: Session, cursor: Optional[str] = None, limit: int = 100, entity_type: Optional[str] = None, entity_id: Optional[str] = None,
+                           since: Optional[datetime] = None, until: Optional[datetime] = None) -> Tuple[List[models.PriceChangeLog], Optional[str]]:
+    query = _price_changes_query(db, entity_type, entity_id, since, until)
+    return keyset_paginate(query, [models.PriceChangeLog.created_at, models.PriceChangeLog.id], cursor, limit, descending=True)
+
+# ----------------------------- RATE CARD SNAPSHOTS -----------------------------
+def create_rate_card_snapshot(db: Session, reason: Optional[str] = None) -> models.RateCardSnapshot:
+    return create_snapshot(db, reason)
+
+def get_rate_card_snapshots(db: Session, skip: int = 0, limit: int = 100) -> List[models.RateCardSnapshot]:
+    return (
+        db.query(models.RateCardSnapshot).options(defer(models.RateCardSnapshot.payload))
+        .order_by(models.RateCardSnapshot.created_at.desc(), models.RateCardSnapshot.id.desc())
+        .offset(skip).limit(limit).all()
+    )
+
+def get_catalog_as_of(db: Session, model: Type[models.Base], as_of: datetime, skip: int = 0, limit: int = 100,
+                      search: Optional[str] = None, state_code: Optional[str] = None) -> List[Any]:
+    """Catalog rows of ``model`` as they were at ``as_of``, in id order."""
+    rows = resolve_snapshot(db, as_of).rows[model]
+    if state_code:
+        state_code = getattr(state_code, "value", state_code)
+        rows = [row for row in rows if row.state_code == state_code]
+    if search:
+        term = search.lower()
+        fields = SEARCH_FIELDS.get(model, ("labour_type",))
+        rows = [row for row in rows if any(term in (getattr(row, f) or "").lower() for f in fields)]
+    return rows[skip:skip + limit]
+
+def get_catalog_item_as_of(db: Session, model: Type[models.Base], as_of: datetime, item_id: Any) -> Optional[Any]:
+    if isinstance(item_id, str) and item_id.isdigit():
+        item_id = int(item_id)
+    return resolve_snapshot(db, as_of).by_id[model].get(item_id)
+
+# ----------------------------- PROJECT TOTALS -----------------------------
+def get_project_totals(db: Session, project_id: str) -> Optional[dict]:
+    totals = db.query(models.ProjectTotals).filter(models.ProjectTotals.project_id == project_id).first()
+    if totals is None:
+        # projects created before the rollup existed are computed on the fly
+        return compute_project_totals(db, project_id)
+    return {"project_id": project_id, **{c: getattr(totals, c) for c in TOTAL_COLUMNS}}
+
+def get_project_summaries(db: Session, skip: int = 0, limit: int = 100) -> List[dict]:
+    rows = (
+        db.query(models.Project, models.User.username, models.ProjectTotals)
+        .outerjoin(models.User, models.User.id == models.Project.manager_id)
+        .outerjoin(models.ProjectTotals, models.ProjectTotals.project_id == models.Project.id)
+        .order_by(models.Project.created_at.desc(), models.Project.id.desc())
+        .offset(skip).limit(limit).all()
+    )
+    missing = [project.id for project, _, totals in rows if totals is None]
+    computed = {row.project_id: row for row in db.execute(totals_select(missing))} if missing else {}
+    summaries = []
+    for project, manager_name, totals in rows:
+        totals = totals if totals is not None else computed.get(project.id)
+        summaries.append({
+            "id": project.id,
+            "name": project.name,
+            "status": project.status,
+            "priority": project.priority,
+            "budget": project.budget or 0.0,
+            "actual_cost": project.actual_cost or 0.0,
+            "progress": project.progress or 0,
+            "start_date": project.start_date,
+            "end_date": project.end_date,
+            "manager_name": manager_name,
+            **{c: getattr(totals, c) if totals is not None else 0.0 for c in TOTAL_COLUMNS},
+        })
+    return summaries
+
+def rebuild_project_totals(db: Session) -> int:
+    refresh_project_totals(db)
+    db.commit()
+    return db.query(models.ProjectTotals).count()
+
+# ----------------------------- SYSTEM CONFIG -----------------------------
+def get_configs(db: Session) -> List[models.SystemConfig]:
+    return db.query(models.SystemConfig).order_by(models.SystemConfig.key).all()
+
+def get_config(db: Session, key: str) -> Optional[models.SystemConfig]:
+    return db.query(models.SystemConfig).filter(models.SystemConfig.key == key).first()
+
+def create_config(db: Session, config: schemas.SystemConfigCreate) -> models.SystemConfig:
+    db_config = models.SystemConfig(**config.dict())
+    db.add(db_config)
+    db.commit()
+    db.refresh(db_config)
+    return db_config
+
+def update_config(db: Session, key: str, config: schemas.SystemConfigUpdate) -> Optional[models.SystemConfig]:
+    db_config = get_config(db, key)
+    if db_config:
+        update_data = config.dict(exclude_unset=True)
+        for field, value in update_data.items():
+            setattr(db_config, field, value)
+        db.commit()
+        db.refresh(db_config)
+    return db_config
 
 # ----------------------------- STATISTICS -----------------------------
+# All figures come from the cached dashboard snapshot (see dashboard_stats)
+_DASHBOARD_FIELDS = (
+    "total_projects", "active_projects", "completed_projects", "total_budget", "total_spent",
+    "total_materials", "total_equipment", "total_labor_roles", "unread_notifications",
+)
+_ADMIN_DASHBOARD_FIELDS = _DASHBOARD_FIELDS + (
+    "pending_projects", "cancelled_projects", "budget_utilization", "total_quotes", "recent_activity",
+)
+
 def get_material_statistics(db: Session):
-    total_materials = db.query(models.Material).count()
-    total_material_value = db.query(func.sum(models.Material.unit_cost)).scalar() or 0
-    sites = db.query(models.Material.state_code).distinct().count()
+    snapshot = get_dashboard_snapshot(db)
     return {
-        "total_materials": total_materials,
-        "total_material_value": total_material_value,
-        "sites": sites
+        "total_materials": snapshot["total_materials"],
+        "total_material_value": snapshot["total_material_value"],
+        "sites": snapshot["material_sites"]
     }
 
 def get_equipment_statistics(db: Session):
-    total_equipment = db.query(models.Equipment).count()
-    total_equipment_value = db.query(func.sum(models.Equipment.price)).scalar() or 0
-    categories = db.query(models.Equipment.category).distinct().count()
+    snapshot = get_dashboard_snapshot(db)
+    return {
+        "total_equipment": snapshot["total_equipment"],
+        "total_equipment_value": snapshot["total_equipment_value"],
+        "categories": snapshot["equipment_categories"]
+    }
+
+def get_dashboard_stats(db: Session) -> dict:
+    snapshot = get_dashboard_snapshot(db)
+    return {field: snapshot[field] for field in _DASHBOARD_FIELDS}
+
+def get_admin_dashboard_stats(db: Session) -> dict:
+    snapshot = get_dashboard_snapshot(db)
+    return {field: snapshot[field] for field in _ADMIN_DASHBOARD_FIELDS}
+
+def get_unread_notification_count(db: Session, user_id: str) -> int:
+    return unread_count(db, user_id)
+
+def reconcile_dashboard_counters(db: Session, fix: bool = False) -> dict:
+    return reconcile_stat_counters(db, fix=fix)
+
+def run_alert_rules() -> Optional[dict]:
+    return run_alerts_once()
+
+# ----------------------------- ADMIN -----------------------------
+def get_admin_projects(db: Session, search: schemas.AdminSearchRequest, skip: int = 0, limit: int = 100) -> List[dict]:
+    query = (
+        db.query(models.Project, models.User.username)
+        .outerjoin(models.User, models.User.id == models.Project.manager_id)
+    )
+    if search.search_term:
+        term = f"%{search.search_term}%"
+        query = query.filter(or_(
+            models.Project.name.ilike(term),
+            models.Project.sor_code.ilike(term),
+            models.Project.sor_description.ilike(term),
+        ))
+    if search.status:
+        query = query.filter(models.Project.status == search.status)
+    if search.priority:
+        query = query.filter(models.Project.priority == search.priority)
+    if search.region:
+        query = query.filter(models.Project.region == search.region)
+    if search.sor_type:
+        query = query.filter(models.Project.sor_type == search.sor_type)
+    if search.manager_id:
+        query = query.filter(models.Project.manager_id == search.manager_id)
+    if search.date_from:
+        query = query.filter(models.Project.created_at >= search.date_from)
+    if search.date_to:
+        query = query.filter(models.Project.created_at <= search.date_to)
+    if search.budget_min is not None:
+        query = query.filter(models.Project.budget >= search.budget_min)
+    if search.budget_max is not None:
+        query = query.filter(models.Project.budget <= search.budget_max)
+    rows = query.order_by(models.Project.created_at.desc(), models.Project.id.desc()).offset(skip).limit(limit).all()
+    return [
+        {
+            **{field: getattr(project, field) for field in schemas.AdminProjectSummary.__fields__ if field != "manager_name"},
+            "budget": project.budget or 0.0,
+            "actual_cost": project.actual_cost or 0.0,
+            "progress": project.progress or 0,
+            "manager_name": manager_name,
+        }
+        for project, manager_name in rows
+    ]
+
+def get_activity_feed(db: Session, user_id: str, skip: int = 0, limit: int = 50) -> dict:
+    notifications = get_notifications(db, user_id, skip=skip, limit=limit)
+    total = db.query(func.count(models.Notification.id)).filter(models.Notification.user_id == user_id).scalar()
     return {
-        "total_equipment": total_equipment,
-        "total_equipment_value": total_equipment_value,
-        "categories": categories
+        "activities": [
+            {
+                "id": n.id,
+                "type": n.type,
+                "severity": n.severity,
+                "title": n.title,
+                "message": n.message,
+                "sender": None,
+                "time": n.created_at.isoformat() if n.created_at else "",
+                "is_read": n.is_read,
+                "related_project_id": n.related_project_id,
+                "related_entity_id": n.related_entity_id,
+            }
+            for n in notifications
+        ],
+        "unread_count": unread_count(db, user_id),
+        "total_count": total,
     }
+
+# ----------------------------- BULK OPERATIONS -----------------------------
+def bulk_import(db: Session, request: schemas.BulkImportRequest, changed_by: Optional[str] = None) -> dict:
+    return import_records(db, request.entity_type, enumerate(request.data, start=1), changed_by=changed_by)
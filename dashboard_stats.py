@@ -0,0 +1,170 @@
+"""
+Dashboard statistics.
+
+Every numeric ``DashboardStats`` / ``AdminDashboardStats`` field is read
+from the incrementally maintained ``stat_counters`` table in one query (see
+stat_counters.py), so a snapshot costs the same at any table size. The admin
+snapshot adds the latest audit log entries as its second query.
+
+Snapshots are cached per process for ``DASHBOARD_STATS_TTL_SECONDS``.
+Session hooks invalidate the cache when a commit changed one of the tables
+the snapshot reads. Writes that bypass the session (the streaming bulk
+import) call ``invalidate`` themselves. When a snapshot is stale, one
+request recomputes it while concurrent requests are served the previous
+snapshot, up to ``DASHBOARD_STATS_MAX_STALE_SECONDS`` old. A poll storm
+therefore costs one recomputation rather than one per request.
+"""
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from . import models
+from .config import settings
+from .stat_counters import dashboard_figures
+
+DASHBOARD_STATS_TTL_SECONDS = settings.dashboard_stats_ttl_seconds
+DASHBOARD_STATS_MAX_STALE_SECONDS = settings.dashboard_stats_max_stale_seconds
+RECENT_ACTIVITY_LIMIT = 10
+
+# Tables the snapshots read; a committed write to any of them invalidates the cache
+_WATCHED_MODELS = (
+    models.Project, models.Material, models.Equipment, models.LabourRate,
+    models.Quote, models.Notification, models.AuditLog,
+)
+_WATCHED_TABLES = frozenset(model.__tablename__ for model in _WATCHED_MODELS)
+
+
+def compute_snapshot(db: Session) -> Dict[str, Any]:
+    """All dashboard figures from the counters and the audit log (two statements)."""
+    row = dashboard_figures(db)
+    row["budget_utilization"] = (
+        round(row["total_spent"] / row["total_budget"] * 100, 2) if row["total_budget"] else 0.0
+    )
+    AuditLog = models.AuditLog
+    recent = db.execute(
+        select(AuditLog.id, AuditLog.user_id, AuditLog.action, AuditLog.entity_type,
+               AuditLog.entity_id, AuditLog.created_at)
+        .order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+        .limit(RECENT_ACTIVITY_LIMIT)
+    ).all()
+    row["recent_activity"] = [dict(r._mapping) for r in recent]
+    return row
+
+
+class _Snapshot:
+    __slots__ = ("data", "generation", "computed_at")
+
+    def __init__(self, data: Dict[str, Any], generation: int, computed_at: float):
+        self.data = data
+        self.generation = generation
+        self.computed_at = computed_at
+
+    def age(self) -> float:
+        return time.monotonic() - self.computed_at
+
+
+class DashboardStatsCache:
+    """Single cached snapshot with TTL, write invalidation and stale-while-revalidate."""
+
+    def __init__(self, ttl_seconds: int = DASHBOARD_STATS_TTL_SECONDS,
+                 max_stale_seconds: int = DASHBOARD_STATS_MAX_STALE_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.hits = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+        self.invalidations = 0
+        self._snapshot: Optional[_Snapshot] = None
+        self._generation = 0
+        self._refresh_lock = threading.Lock()
+
+    def _is_fresh(self, snapshot: Optional[_Snapshot]) -> bool:
+        return (snapshot is not None and snapshot.generation == self._generation
+                and snapshot.age() < self.ttl_seconds)
+
+    def get(self, db: Session, compute: Callable[[Session], Dict[str, Any]] = compute_snapshot) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            self.hits += 1
+            return snapshot.data
+        usable = snapshot is not None and snapshot.age() < self.max_stale_seconds
+        # with a usable snapshot, only one request recomputes; the rest are served the old one
+        if not self._refresh_lock.acquire(blocking=not usable):
+            self.stale_hits += 1
+            return snapshot.data
+        try:
+            if self._is_fresh(self._snapshot):
+                # refreshed by the request we waited for
+                self.hits += 1
+                return self._snapshot.data
+            generation = self._generation
+            data = compute(db)
+            # an invalidation during compute leaves this snapshot stale again
+            self._snapshot = _Snapshot(data, generation, time.monotonic())
+            self.refreshes += 1
+            return data
+        finally:
+            self._refresh_lock.release()
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "invalidations": self.invalidations,
+            "ttl_seconds": self.ttl_seconds,
+            "max_stale_seconds": self.max_stale_seconds,
+            "snapshot_age_seconds": round(snapshot.age(), 3) if snapshot is not None else None,
+            "fresh": self._is_fresh(snapshot),
+        }
+
+
+dashboard_stats_cache = DashboardStatsCache()
+
+
+def get_dashboard_snapshot(db: Session) -> Dict[str, Any]:
+    return dashboard_stats_cache.get(db)
+
+
+def invalidate() -> None:
+    dashboard_stats_cache.invalidate()
+
+
+# ----------------------------- invalidation hooks -----------------------------
+_DIRTY = "dashboard_stats_dirty"
+
+
+@event.listens_for(Session, "after_flush")
+def _note_flushed_writes(session: Session, flush_context: Any) -> None:
+    if not session.info.get(_DIRTY) and any(
+        isinstance(obj, _WATCHED_MODELS) for obj in (*session.new, *session.dirty, *session.deleted)
+    ):
+        session.info[_DIRTY] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_writes(orm_execute_state: Any) -> None:
+    # query.update()/delete() and session.execute(insert(...)) skip the flush
+    statement = orm_execute_state.statement
+    if isinstance(statement, UpdateBase) and getattr(statement.table, "name", None) in _WATCHED_TABLES:
+        orm_execute_state.session.info[_DIRTY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session: Session) -> None:
+    if session.info.pop(_DIRTY, False):
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_writes(session: Session) -> None:
+    session.info.pop(_DIRTY, None)
@@ -0,0 +1,102 @@
+"""
+Cold-start import budget.
+
+Importing the API should only define it: no engine or DBAPI driver, no
+connections, no DDL and none of the modules that are only needed on a few
+paths (password hashing, JWT, migrations). ``python -m <package>.import_budget``
+imports the app in a fresh interpreter under ``-X importtime``, best of
+``--runs``, and exits non-zero if
+
+* the import takes longer than ``IMPORT_BUDGET_MS`` (or ``--budget-ms``),
+* the import created the database engine, or
+* any of ``DEFERRED_MODULES`` was imported.
+
+It prints the slowest modules so a regression can be traced to its import.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from .config import settings
+
+IMPORT_BUDGET_MS = settings.import_budget_ms
+
+# Heavy modules that must only be imported on the paths that use them
+DEFERRED_MODULES = ("passlib", "bcrypt", "jose", "alembic", "psycopg2", "uvicorn")
+
+_PACKAGE_DIR = Path(__file__).resolve().parent
+PACKAGE = _PACKAGE_DIR.name
+
+_PROBE = """
+import importlib, json, sys, time
+started = time.perf_counter()
+importlib.import_module({module!r})
+elapsed = time.perf_counter() - started
+database = sys.modules.get({package!r} + ".database")
+print(json.dumps({{
+    "ms": elapsed * 1000,
+    "engine_created": database is not None and database._engine is not None,
+    "deferred": sorted(m for m in {deferred!r} if m in sys.modules),
+}}))
+"""
+
+
+def _slowest(importtime: str, count: int) -> List[Tuple[int, str]]:
+    """``(self µs, module)`` of the ``count`` modules with the highest self time."""
+    rows = []
+    for line in importtime.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), name.strip()))
+    return sorted(rows, reverse=True)[:count]
+
+
+def measure(module: str) -> Dict[str, Any]:
+    """Import ``module`` in a fresh interpreter and report the cost."""
+    code = _PROBE.format(module=module, package=PACKAGE, deferred=DEFERRED_MODULES)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(_PACKAGE_DIR.parent),
+        env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-4000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["slowest"] = _slowest(proc.stderr, 10)
+    return result
+
+
+def check(module: str, budget_ms: float, runs: int = 3) -> List[str]:
+    """Budget violations for importing ``module``; the fastest of ``runs`` is timed."""
+    results = [measure(module) for _ in range(max(1, runs))]
+    best = min(results, key=lambda r: r["ms"])
+    problems = []
+    if best["ms"] > budget_ms:
+        problems.append(f"import took {best['ms']:.0f} ms, budget is {budget_ms:.0f} ms")
+    if best["engine_created"]:
+        problems.append("importing the app created the database engine")
+    if best["deferred"]:
+        problems.append(f"deferred modules imported eagerly: {', '.join(best['deferred'])}")
+    print(f"{module}: {best['ms']:.0f} ms (best of {len(results)}), budget {budget_ms:.0f} ms")
+    for self_us, name in best["slowest"]:
+        print(f"  {self_us / 1000:8.1f} ms  {name}")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail if importing the API regresses its cold-start budget")
+    parser.add_argument("--module", default=f"{PACKAGE}.main")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    found = check(args.module, args.budget_ms, args.runs)
+    for problem in found:
+        print(f"OVER BUDGET  {problem}")
+    sys.exit(1 if found else 0)
@@ -0,0 +1,198 @@
+"""
+Index plan for the project/quote join graph.
+
+The indexes are declared on the models: the foreign keys the detail loaders
+join on, plus composite indexes matching the newest-first orderings of the
+list and keyset-paginated endpoints. Alembic revision 0002 builds them, with
+``CREATE INDEX CONCURRENTLY`` on Postgres so the tables stay writable meanwhile.
+
+``check_query_plans`` runs the crud calls behind the list and detail
+endpoints, EXPLAINs the SQL they executed and reports every endpoint that
+reads a large table with a full scan. test_index_plan.py runs it against the
+Postgres database ``INDEX_PLAN_DATABASE_URL`` names; ``python -m
+<package>.index_plan [DATABASE_URL]`` runs it elsewhere (SQLite by default).
+Both seed realistic volumes (100k quotes, 2M quote items) into an empty
+scratch database first.
+"""
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import create_engine, inspect, insert, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas
+from .load_profiles import count_queries
+
+# Tables large enough that a full scan on a request path is a regression
+PLAN_TABLES = (
+    "projects", "project_materials", "project_equipment", "project_labor", "project_tasks",
+    "project_external_costs", "quotes", "quote_items", "notifications", "audit_logs", "price_change_logs",
+)
+
+
+# ----------------------------- plan check -----------------------------
+PAGE_SIZE = 100
+
+
+def _two_pages(db: Session, page: Callable[..., Tuple[List[Any], Optional[str]]], **filters: Any) -> None:
+    """Load the first and second page, so the keyset predicate is planned too."""
+    _, cursor = page(db, limit=PAGE_SIZE, **filters)
+    if cursor:
+        page(db, cursor=cursor, limit=PAGE_SIZE, **filters)
+
+
+# The crud calls behind the list and detail endpoints, keyed by endpoint.
+# mark-all-read commits, so it runs last.
+PLAN_CALLS: Dict[str, Callable[[Session, Dict[str, str]], Any]] = {
+    "GET /projects": lambda db, s: crud.get_projects(db, limit=PAGE_SIZE),
+    "GET /projects?manager_id": lambda db, s: crud.get_projects(
+        db, limit=PAGE_SIZE, filters=schemas.SearchFilters(manager_id=s["user_id"])),
+    "GET /projects/page": lambda db, s: _two_pages(db, crud.get_projects_page),
+    "GET /projects/{id}": lambda db, s: crud.get_project(db, s["project_id"]),
+    "GET /quotes": lambda db, s: crud.get_quotes(db, limit=PAGE_SIZE),
+    "GET /quotes/page": lambda db, s: _two_pages(db, crud.get_quotes_page),
+    "GET /quotes/{id}": lambda db, s: crud.get_quote(db, s["quote_id"]),
+    "GET /quotes/{id}/items": lambda db, s: crud.get_quote_items(db, s["quote_id"]),
+    "GET /notifications/page?user_id": lambda db, s: _two_pages(db, crud.get_notifications_page, user_id=s["user_id"]),
+    "GET /notifications/unread": lambda db, s: crud.get_unread_notifications(db, s["user_id"], limit=PAGE_SIZE),
+    "GET /notifications/unread/page": lambda db, s: _two_pages(
+        db, crud.get_unread_notifications_page, user_id=s["user_id"]),
+    "GET /audit-logs/page": lambda db, s: _two_pages(db, crud.get_audit_logs_page),
+    "GET /audit-logs/page?user_id": lambda db, s: _two_pages(db, crud.get_audit_logs_page, user_id=s["user_id"]),
+    "GET /price-changes?entity_type": lambda db, s: crud.get_price_changes(db, limit=PAGE_SIZE, entity_type="material"),
+    "GET /price-changes/page?entity_type": lambda db, s: _two_pages(
+        db, crud.get_price_changes_page, entity_type="material"),
+    "PUT /notifications/read-all": lambda db, s: crud.mark_all_notifications_read(db, s["user_id"]),
+}
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE")
+
+
+def captured_statements(bind: Engine, endpoint: str, sample: Dict[str, str]) -> List[Tuple[str, Any]]:
+    """``(statement, parameters)`` as executed by the crud call behind ``endpoint``."""
+    with count_queries(bind) as counter:
+        with Session(bind) as db:
+            PLAN_CALLS[endpoint](db, sample)
+    return [
+        (statement, parameters) for statement, parameters in zip(counter.statements, counter.parameters)
+        if statement.lstrip().upper().startswith(EXPLAINABLE)
+    ]
+
+
+def _walk(node: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    yield node
+    for child in node.get("Plans", ()):
+        yield from _walk(child)
+
+
+def full_scans(conn: Connection, statement: str, parameters: Any = None) -> List[str]:
+    """Tables the driver-level ``statement`` reads with a full table scan."""
+    if conn.dialect.name == "postgresql":
+        plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        return [node["Relation Name"] for node in _walk(plan[0]["Plan"]) if node["Node Type"] == "Seq Scan"]
+    scans = []
+    for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters):
+        detail = row[-1]
+        # "SCAN t USING INDEX ix" walks an index; a bare "SCAN t" reads the table
+        if detail.startswith("SCAN ") and " USING " not in detail:
+            scans.append(detail.split()[1])
+    return scans
+
+
+def check_endpoint(bind: Engine, endpoint: str, sample: Dict[str, str]) -> List[str]:
+    """Large tables fully scanned by a statement the crud call behind ``endpoint`` executed."""
+    statements = captured_statements(bind, endpoint, sample)
+    with bind.connect() as conn:
+        return [t for statement, parameters in statements for t in full_scans(conn, statement, parameters)
+                if t in PLAN_TABLES]
+
+
+def check_query_plans(bind: Engine, sample: Dict[str, str]) -> Dict[str, List[str]]:
+    """``{endpoint: [fully scanned large tables]}`` for every regressed endpoint."""
+    regressions = {}
+    for endpoint in PLAN_CALLS:
+        scanned = check_endpoint(bind, endpoint, sample)
+        if scanned:
+            regressions[endpoint] = scanned
+    return regressions
+
+
+# ----------------------------- seeding -----------------------------
+SEED_TABLES = ("users", "projects", "labour_rates", "project_labor", "project_tasks", "project_external_costs",
+               "quotes", "quote_items", "notifications", "audit_logs", "price_change_logs")
+
+
+def _chunks(rows: Callable[[int], Dict[str, Any]], count: int, size: int = 20000) -> Iterator[List[Dict[str, Any]]]:
+    for start in range(0, count, size):
+        yield [rows(n) for n in range(start, min(start + size, count))]
+
+
+def seed(bind: Engine, quotes: int = 100_000, items_per_quote: int = 20, projects: int = 20_000,
+         users: int = 200, notifications: int = 500_000, audit_logs: int = 500_000) -> Dict[str, str]:
+    """Create the schema in an empty scratch database and fill the seeded tables; returns sample ids."""
+    # every table, since the crud calls join the unseeded ones too
+    models.Base.metadata.create_all(bind)
+    rng = random.Random(42)
+    start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    project_ids = [str(uuid.uuid4()) for _ in range(projects)]
+    quote_ids = [str(uuid.uuid4()) for _ in range(quotes)]
+
+    def at(n: int, total: int) -> datetime:
+        return start + timedelta(seconds=n * 86400 * 365 // max(total, 1))
+
+    plan = [
+        (models.User, users, lambda n: {"id": user_ids[n], "username": f"user{n}", "email": f"user{n}@example.com",
+                                        "password_hash": "x"}),
+        (models.Project, projects, lambda n: {"id": project_ids[n], "name": f"Project {n}", "manager_id": rng.choice(user_ids),
+                                              "created_at": at(n, projects)}),
+        (models.LabourRate, 40, lambda n: {"id": n + 1, "labour_type": f"Role {n % 10}", "cost_per_person": 80.0,
+                                           "state_code": ("NSW", "VIC", "QLD", "WA")[n % 4]}),
+        (models.ProjectLabor, projects * 3, lambda n: {"project_id": project_ids[n // 3], "labour_rate_id": n % 40 + 1,
+                                                       "state_code": "NSW", "unit_rate": 80.0, "total_cost": 640.0}),
+        (models.ProjectTask, projects * 3, lambda n: {"project_id": project_ids[n // 3], "name": f"Task {n}"}),
+        (models.ProjectExternalCost, projects * 2, lambda n: {"project_id": project_ids[n // 2], "cost_type": "crane_fee",
+                                                              "amount": 450.0}),
+        (models.Quote, quotes, lambda n: {"id": quote_ids[n], "quote_number": f"Q-{n:07d}", "client_name": f"Client {n % 977}",
+                                          "project_name": f"Quote project {n}", "created_by": rng.choice(user_ids),
+                                          "created_at": at(n, quotes)}),
+        (models.QuoteItem, quotes * items_per_quote, lambda n: {"quote_id": quote_ids[n // items_per_quote],
+                                                                "item_type": "material", "item_name": f"Item {n}",
+                                                                "unit_price": 10.0, "total_price": 10.0}),
+        (models.Notification, notifications, lambda n: {"user_id": rng.choice(user_ids), "type": "system",
+                                                        "title": "Notice", "message": "Seeded",
+                                                        "is_read": rng.random() > 0.05,
+                                                        "created_at": at(n, notifications)}),
+        (models.AuditLog, audit_logs, lambda n: {"user_id": rng.choice(user_ids), "action": "update",
+                                                 "entity_type": "quote", "entity_id": rng.choice(quote_ids),
+                                                 "created_at": at(n, audit_logs)}),
+        (models.PriceChangeLog, 50_000, lambda n: {"entity_type": ("material", "equipment", "labor")[n % 3],
+                                                   "entity_id": str(n), "entity_name": f"Item {n}", "old_price": 1.0,
+                                                   "new_price": 2.0, "created_at": at(n, 50_000)}),
+    ]
+    for model, count, row in plan:
+        for chunk in _chunks(row, count):
+            with bind.begin() as conn:
+                conn.execute(insert(model.__table__), chunk)
+    with bind.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    return {"project_id": project_ids[projects // 2], "quote_id": quote_ids[quotes // 2], "user_id": user_ids[0]}
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "sqlite:///index_plan_check.db"
+    engine = create_engine(url)
+    if set(inspect(engine).get_table_names()) & set(SEED_TABLES):
+        sys.exit(f"{url} already has tables; point the check at an empty scratch database")
+    started = time.perf_counter()
+    sample_ids = seed(engine)
+    print(f"seeded in {time.perf_counter() - started:.0f} s")
+    found = check_query_plans(engine, sample_ids)
+    for endpoint, tables in found.items():
+        print(f"FULL SCAN  {endpoint}: {', '.join(tables)}")
+    print(f"{len(PLAN_CALLS) - len(found)} endpoints use indexes, {len(found)} regressions")
+    sys.exit(1 if found else 0)
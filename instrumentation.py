@@ -0,0 +1,261 @@
+"""
+Per-request database instrumentation.
+
+Engine events time every statement and a QueuePool subclass times connection
+checkouts. The totals are collected into the stats object of the current
+request, which ``install_instrumentation`` creates for every request.
+Requests get a ``Server-Timing`` header; per-route totals, pool telemetry
+and the admission state are served as Prometheus text at ``/metrics``.
+Requests over the configured time or query count thresholds are logged and
+counted as slow.
+
+The same middleware applies adaptive admission control (``admission.py``)
+when ``DB_ADAPTIVE_CONCURRENCY`` is on. An exhausted pool is answered with
+503 instead of a 500. It is a plain ASGI middleware, so a streamed body (an
+export, say) runs inside the request's stats and holds its admission slot
+until the last chunk is sent; ``Server-Timing`` covers the time to the
+response headers.
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from . import pool_telemetry
+from .admission import admission
+from .config import settings
+from .pool_telemetry import PoolTelemetry
+
+logger = logging.getLogger(__name__)
+
+SLOW_REQUEST_MS = settings.slow_request_ms
+SLOW_REQUEST_QUERIES = settings.slow_request_queries
+
+# Served without admission control: probes and metrics must answer under load
+ADMISSION_EXEMPT_PATHS = ("/health", "/metrics", "/docs", "/redoc", "/openapi.json", "/notifications/stream")
+
+
+class RequestStats:
+    """Database work attributed to one request."""
+
+    __slots__ = ("endpoint", "started", "query_count", "db_time", "pool_wait", "wrote")
+
+    def __init__(self, endpoint: Optional[str] = None):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.db_time = 0.0
+        self.pool_wait = 0.0
+        # set once the request has written; later reads then skip the replicas
+        self.wrote = False
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# ----------------------------- engine hooks -----------------------------
+class TimedQueuePool(QueuePool):
+    """QueuePool that charges the time spent waiting for a connection to the current request.
+
+    Checkout and connect latencies, checkout timeouts and failed connects are
+    also recorded in ``self.telemetry`` (see ``pool_telemetry``).
+    """
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.telemetry = PoolTelemetry()
+
+    def recreate(self):
+        # Engine.dispose swaps in a fresh pool; keep counting into the same telemetry
+        pool = super().recreate()
+        pool.telemetry = self.telemetry
+        return pool
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.telemetry.timed_out()
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            self.telemetry.checkout.observe(elapsed)
+            stats = _current.get()
+            if stats is not None:
+                stats.pool_wait += elapsed
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._create_connection()
+        except Exception:
+            self.telemetry.connect_failed()
+            raise
+        self.telemetry.connect.observe(time.perf_counter() - started)
+        return connection
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.query_count += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def _handle_error(context):
+    # failed statements never reach after_cursor_execute
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def instrument_engine(engine: Engine, name: str = "primary") -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+    pool_telemetry.register(name, engine)
+
+
+# ----------------------------- aggregation -----------------------------
+class RouteMetrics:
+    """Running per-route totals for the /metrics endpoint."""
+
+    _FIELDS = ("requests", "slow_requests", "handler_seconds", "db_seconds", "pool_wait_seconds", "queries")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[Tuple[str, str], Dict[str, float]] = {}
+
+    def record(self, method: str, route: str, stats: RequestStats, elapsed: float, slow: bool) -> None:
+        with self._lock:
+            totals = self._routes.setdefault((method, route), dict.fromkeys(self._FIELDS, 0))
+            totals["requests"] += 1
+            totals["slow_requests"] += int(slow)
+            totals["handler_seconds"] += elapsed
+            totals["db_seconds"] += stats.db_time
+            totals["pool_wait_seconds"] += stats.pool_wait
+            totals["queries"] += stats.query_count
+
+    def render(self) -> str:
+        with self._lock:
+            routes = sorted(self._routes.items())
+        lines: List[str] = []
+        for field, kind, help_text in (
+            ("requests", "counter", "HTTP requests handled"),
+            ("slow_requests", "counter", "Requests over SLOW_REQUEST_MS or SLOW_REQUEST_QUERIES"),
+            ("handler_seconds", "counter", "Total request handling time"),
+            ("db_seconds", "counter", "Total time spent executing SQL"),
+            ("pool_wait_seconds", "counter", "Total time spent waiting for a pooled connection"),
+            ("queries", "counter", "SQL statements executed"),
+        ):
+            name = f"ratecard_http_{field}_total"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (method, route), totals in routes:
+                lines.append(f'{name}{{method="{method}",route="{route}"}} {totals[field]:g}')
+        return "\n".join(lines) + "\n"
+
+
+route_metrics = RouteMetrics()
+
+
+def _server_timing(stats: RequestStats, elapsed: float) -> str:
+    return (
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.query_count} queries", '
+        f"pool;dur={stats.pool_wait * 1000:.1f}, "
+        f"app;dur={elapsed * 1000:.1f}"
+    )
+
+
+def _busy_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy, retry shortly"},
+        headers={"Retry-After": "1"},
+    )
+
+
+def _admission_applies(request: Request) -> bool:
+    return (admission.enabled and request.method != "OPTIONS"
+            and not request.url.path.startswith(ADMISSION_EXEMPT_PATHS))
+
+
+class InstrumentationMiddleware:
+    """Times each HTTP request and applies admission control until its response body is sent."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request = Request(scope)
+        stats = RequestStats(f"{request.method} {request.url.path}")
+        gated = _admission_applies(request)
+        if gated and not await admission.acquire():
+            await _busy_response()(scope, receive, send)
+            return
+        # an event stream stays open for as long as its client listens; its length is not slowness
+        event_stream = False
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal event_stream
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", _server_timing(stats, time.perf_counter() - stats.started))
+                event_stream = headers.get("content-type", "").startswith("text/event-stream")
+            await send(message)
+
+        token = _current.set(stats)
+        try:
+            # returns once the whole body, streamed or not, has been sent
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if gated:
+                admission.release(stats.pool_wait)
+        elapsed = time.perf_counter() - stats.started
+        route = getattr(scope.get("route"), "path", "unmatched")
+        slow = not event_stream and (elapsed * 1000 > SLOW_REQUEST_MS or stats.query_count > SLOW_REQUEST_QUERIES)
+        if slow:
+            logger.warning(
+                "slow request %s %s: %.1f ms, %d queries, %.1f ms in DB, %.1f ms waiting for a connection",
+                request.method, route, elapsed * 1000, stats.query_count, stats.db_time * 1000, stats.pool_wait * 1000,
+            )
+        route_metrics.record(request.method, route, stats, elapsed, slow)
+
+
+def install_instrumentation(app: FastAPI) -> None:
+    """Add the timing and admission middleware and the ``/metrics`` endpoint to a FastAPI app."""
+    app.add_middleware(InstrumentationMiddleware)
+
+    @app.exception_handler(PoolTimeoutError)
+    async def _pool_exhausted(request: Request, exc: PoolTimeoutError):
+        # no connection became free within DB_POOL_TIMEOUT
+        logger.warning("connection pool exhausted on %s %s: %s", request.method, request.url.path, exc)
+        return _busy_response()
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics() -> PlainTextResponse:
+        body = route_metrics.render() + pool_telemetry.render() + admission.render()
+        return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
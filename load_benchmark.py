@@ -0,0 +1,96 @@
+"""
+Event loop blocking benchmark.
+
+The handlers in main.py used to be ``async def`` and call the synchronous
+CRUD layer, so a slow query held the event loop and every concurrent request
+on the worker waited behind it. They are plain ``def`` now, which FastAPI
+runs on its worker thread pool, capped at ``DB_WORKER_THREADS`` when the app
+starts.
+
+``python -m <package>.load_benchmark [--concurrency N] [--query-ms MS]``
+sends N concurrent requests to both versions of a handler that blocks for
+MS milliseconds, as a slow query would, and reports p50/p99/max latency and
+throughput. Requests go through httpx's in-process ASGI transport, so no
+database or network is involved and only the execution model differs.
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from typing import Any, Dict, List
+
+from fastapi import FastAPI
+
+from .database import db_worker_threads
+
+
+def _blocking_query(seconds: float) -> None:
+    # stands in for a synchronous Session round trip
+    time.sleep(seconds)
+
+
+def build_app(query_ms: float) -> FastAPI:
+    seconds = query_ms / 1000
+    app = FastAPI()
+
+    @app.get("/before")
+    async def before():
+        _blocking_query(seconds)
+        return {"ok": True}
+
+    @app.get("/after")
+    def after():
+        _blocking_query(seconds)
+        return {"ok": True}
+
+    return app
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+async def _load(app: FastAPI, path: str, concurrency: int) -> Dict[str, float]:
+    import httpx
+    from anyio.to_thread import current_default_thread_limiter
+    # the cap main.py's startup hook applies
+    current_default_thread_limiter().total_tokens = db_worker_threads()
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark") as client:
+        async def request() -> float:
+            response = await client.get(path)
+            response.raise_for_status()
+            # from the moment all requests arrived: a blocked loop delays even starting one
+            return (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*(request() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {
+        "p50_ms": round(_percentile(latencies, 50), 1),
+        "p99_ms": round(_percentile(latencies, 99), 1),
+        "max_ms": round(max(latencies), 1),
+        "requests_per_s": round(concurrency / elapsed, 1),
+    }
+
+
+def benchmark(concurrency: int = 200, query_ms: float = 50.0) -> Dict[str, Any]:
+    """Latency of ``concurrency`` concurrent requests, before and after the move to the thread pool."""
+    app = build_app(query_ms)
+    return {
+        "concurrency": concurrency,
+        "query_ms": query_ms,
+        "worker_threads": db_worker_threads(),
+        "before": asyncio.run(_load(app, "/before", concurrency)),
+        "after": asyncio.run(_load(app, "/after", concurrency)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="p99 latency of blocking handlers on the event loop vs the thread pool")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--query-ms", type=float, default=50.0)
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.concurrency, args.query_ms), indent=2))
@@ -0,0 +1,103 @@
+"""
+Named relationship loading profiles.
+
+Every ``relationship()`` in models.py lazy-loads, so serialising a list of
+projects or quotes with nested users and items issues one query per row per
+relationship. Each endpoint picks a profile here instead: ``list`` loads what
+the list response schemas nest, and ``detail`` loads the full detail graph.
+Anything outside the profile is left lazy.
+
+``count_queries`` and ``assert_query_budget`` count the statements a block of
+code sends to the database; query_budget.py holds each list endpoint to a
+fixed budget with them.
+"""
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Type
+
+from sqlalchemy import event
+from sqlalchemy.orm import Query, joinedload, selectinload
+
+from . import models
+
+# many-to-one parents are joined into the row; collections use one IN query each
+LOAD_PROFILES: Dict[Type[models.Base], Dict[str, List[Any]]] = {
+    models.Project: {
+        "list": [joinedload(models.Project.manager_user)],
+        "detail": [
+            joinedload(models.Project.manager_user),
+            selectinload(models.Project.project_materials).joinedload(models.ProjectMaterial.material),
+            selectinload(models.Project.project_equipment).joinedload(models.ProjectEquipment.equipment),
+            selectinload(models.Project.project_labor).joinedload(models.ProjectLabor.labour_rate),
+            selectinload(models.Project.project_tasks),
+            selectinload(models.Project.project_external_costs),
+        ],
+    },
+    models.Quote: {
+        "list": [joinedload(models.Quote.created_by_user), selectinload(models.Quote.quote_items)],
+        "detail": [joinedload(models.Quote.created_by_user), selectinload(models.Quote.quote_items)],
+    },
+    models.QuoteItem: {
+        "list": [],
+        "detail": [joinedload(models.QuoteItem.quote)],
+    },
+    models.User: {
+        "list": [],
+        "detail": [selectinload(models.User.projects), selectinload(models.User.notifications)],
+    },
+    models.Notification: {
+        # NotificationResponse nests nothing
+        "list": [],
+        "detail": [joinedload(models.Notification.user)],
+    },
+    models.AuditLog: {
+        "list": [joinedload(models.AuditLog.user)],
+        "detail": [joinedload(models.AuditLog.user)],
+    },
+    models.PriceChangeLog: {
+        "list": [joinedload(models.PriceChangeLog.changed_by_user)],
+        "detail": [joinedload(models.PriceChangeLog.changed_by_user)],
+    },
+}
+
+
+def with_profile(query: Query, model: Type[models.Base], profile: str = "list") -> Query:
+    """Apply the named loading profile of ``model`` to ``query``."""
+    try:
+        options = LOAD_PROFILES[model][profile]
+    except KeyError:
+        raise ValueError(f"No '{profile}' loading profile for {model.__name__}")
+    return query.options(*options) if options else query
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements: List[str] = []
+        self.parameters: List[Any] = []
+
+
+@contextmanager
+def count_queries(bind: Any) -> Iterator[QueryCounter]:
+    """Count (and record) the statements executed on engine ``bind`` inside the block."""
+    counter = QueryCounter()
+
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        counter.count += 1
+        counter.statements.append(statement)
+        counter.parameters.append(parameters)
+
+    event.listen(bind, "before_cursor_execute", _count)
+    try:
+        yield counter
+    finally:
+        event.remove(bind, "before_cursor_execute", _count)
+
+
+@contextmanager
+def assert_query_budget(bind: Any, budget: int) -> Iterator[QueryCounter]:
+    """Fail with AssertionError if the block executes more than ``budget`` statements."""
+    with count_queries(bind) as counter:
+        yield counter
+    if counter.count > budget:
+        listing = "\n".join(counter.statements)
+        raise AssertionError(f"{counter.count} queries executed, budget is {budget}:\n{listing}")
@@ -1,28 +1,29 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query, Path
+from fastapi import FastAPI, BackgroundTasks, Depends, HTTPException, status, Query, Path, Request, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
-import uvicorn
 from datetime import datetime, timedelta
 import os
-from dotenv import load_dotenv
 
-from .database import get_db, engine
-from .models import Base
+from .database import get_db, db_worker_threads, run_startup_check
+from .instrumentation import install_instrumentation
+from .admission import admission
+from . import pool_telemetry
+from .slow_queries import SLOW_QUERY_LOG, slow_query_log
 from .schemas import *
-from .crud import (
-    UserCRUD, ProjectCRUD, MaterialCRUD, EquipmentCRUD, LabourRoleCRUD,
-    ProjectMaterialCRUD, ProjectEquipmentCRUD, ProjectLaborCRUD,
-    NotificationCRUD, SystemConfigCRUD, AuditLogCRUD, DashboardCRUD,
-    QuoteCRUD, QuoteItemCRUD, AdvancedSearchCRUD, AdminDashboardCRUD, BulkOperationsCRUD
-)
-
-# Load environment variables
-load_dotenv()
-
-# Create database tables
-Base.metadata.create_all(bind=engine)
+from . import crud, models
+from .pagination import InvalidCursor, page_response
+from .bulk_import import BULK_IMPORT_BATCH_SIZE, detect_format, import_stream
+from .bulk_export import MEDIA_TYPES, export_filename, export_format, export_stream
+from .pricing import CALCULATOR_BATCH_MAX_REQUESTS, price_batch, price_calculator_request
+from .rate_snapshots import SnapshotNotFound, snapshot_cache
+from .dashboard_stats import dashboard_stats_cache
+from .notification_stream import notification_hub, sse_events
+
+# The schema is managed by Alembic (`alembic upgrade head` before starting the
+# workers); importing the app runs no DDL, and the engine is created on first use
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -41,6 +42,28 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+install_instrumentation(app)
+
+# DB-bound handlers are plain ``def`` so FastAPI dispatches them to its worker
+# thread pool instead of blocking the event loop. Bound that pool to what the
+# connection pool can serve so excess requests wait for a thread, not a connection.
+@app.on_event("startup")
+def _configure_db_worker_pool() -> None:
+    from anyio.to_thread import current_default_thread_limiter
+    current_default_thread_limiter().total_tokens = db_worker_threads()
+
+@app.on_event("startup")
+def _check_db() -> None:
+    run_startup_check()
+
+@app.exception_handler(SnapshotNotFound)
+async def snapshot_not_found_handler(request: Request, exc: SnapshotNotFound):
+    # an ``as_of`` read before any rate card snapshot exists
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
 
 # Security
 security = HTTPBearer()
@@ -58,50 +81,50 @@ async def health_check():
 
 # ==================== USER ENDPOINTS ====================
 @app.get("/users", response_model=List[UserResponse])
-async def get_users(
+def get_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
     """Get all users with pagination"""
-    users = UserCRUD.get_users(db, skip=skip, limit=limit)
+    users = crud.get_users(db, skip=skip, limit=limit)
     return users
 
 @app.get("/users/{user_id}", response_model=UserResponse)
-async def get_user(
+def get_user(
     user_id: str = Path(..., description="User ID"),
     db: Session = Depends(get_db)
 ):
     """Get a specific user by ID"""
-    user = UserCRUD.get_user(db, user_id)
+    user = crud.get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
 @app.post("/users", response_model=UserResponse)
-async def create_user(
+def create_user(
     user: UserCreate,
     db: Session = Depends(get_db)
 ):
     """Create a new user"""
     # Check if user already exists
-    existing_user = UserCRUD.get_user_by_email(db, user.email)
+    existing_user = crud.get_user_by_email(db, user.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    existing_username = UserCRUD.get_user_by_username(db, user.username)
+    existing_username = crud.get_user_by_username(db, user.username)
     if existing_username:
         raise HTTPException(status_code=400, detail="Username already taken")
     
     # Hash password (in real app, use proper password hashing)
     hashed_password = f"hashed_{user.password}"  # Simplified for demo
     
-    db_user = UserCRUD.create_user(db, user, hashed_password)
+    db_user = crud.create_user(db, user, hashed_password)
     return db_user
 
 # ==================== PROJECT ENDPOINTS ====================
 @app.get("/projects", response_model=List[ProjectResponse])
-async def get_projects(
+def get_projects(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     search: Optional[str] = Query(None),
@@ -119,262 +142,350 @@ async def get_projects(
         manager_id=manager_id,
         category=category
     )
-    projects = ProjectCRUD.get_projects(db, skip=skip, limit=limit, filters=filters)
+    projects = crud.get_projects(db, skip=skip, limit=limit, filters=filters, profile="list")
     return projects
 
+@app.get("/projects/page", response_model=ProjectPage)
+def get_projects_by_cursor(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=100),
+    search: Optional[str] = Query(None),
+    status: Optional[ProjectStatus] = Query(None),
+    priority: Optional[ProjectPriority] = Query(None),
+    manager_id: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Get projects newest first using keyset pagination"""
+    filters = SearchFilters(
+        search_term=search,
+        status=status,
+        priority=priority,
+        manager_id=manager_id,
+        category=category
+    )
+    return page_response(*crud.get_projects_page(db, cursor=cursor, limit=limit, filters=filters))
+
+@app.get("/projects/summaries", response_model=List[ProjectSummaryResponse])
+def get_project_summaries_with_totals(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    """Get projects newest first with their cost totals read from the rollup"""
+    return crud.get_project_summaries(db, skip=skip, limit=limit)
+
+@app.post("/projects/totals/rebuild")
+def rebuild_all_project_totals(
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Recompute the cost rollup of every project"""
+    return {"message": "Project totals rebuilt", "projects": crud.rebuild_project_totals(db)}
+
 @app.get("/projects/{project_id}", response_model=ProjectDetailResponse)
-async def get_project(
+def get_project(
     project_id: str = Path(..., description="Project ID"),
     db: Session = Depends(get_db)
 ):
     """Get a specific project with all details"""
-    project = ProjectCRUD.get_project(db, project_id)
+    project = crud.get_project(db, project_id, profile="detail")
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     return project
 
 @app.post("/projects", response_model=ProjectResponse)
-async def create_project(
+def create_project(
     project: ProjectCreate,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new project"""
-    db_project = ProjectCRUD.create_project(db, project)
+    db_project = crud.create_project(db, project)
     return db_project
 
 @app.put("/projects/{project_id}", response_model=ProjectResponse)
-async def update_project(
+def update_project(
     project_id: str = Path(..., description="Project ID"),
     project_update: ProjectUpdate = None,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update a project"""
-    db_project = ProjectCRUD.update_project(db, project_id, project_update)
+    db_project = crud.update_project(db, project_id, project_update)
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
     return db_project
 
 @app.delete("/projects/{project_id}")
-async def delete_project(
+def delete_project(
     project_id: str = Path(..., description="Project ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a project"""
-    success = ProjectCRUD.delete_project(db, project_id)
+    success = crud.delete_project(db, project_id)
     if not success:
         raise HTTPException(status_code=404, detail="Project not found")
     return {"message": "Project deleted successfully"}
 
-@app.get("/projects/{project_id}/totals")
-async def get_project_totals(
+@app.get("/projects/{project_id}/totals", response_model=ProjectTotalsResponse)
+def get_project_totals(
     project_id: str = Path(..., description="Project ID"),
     db: Session = Depends(get_db)
 ):
-    """Get project cost totals"""
-    totals = ProjectCRUD.calculate_project_totals(db, project_id)
+    """Get project cost totals from the rollup"""
+    totals = crud.get_project_totals(db, project_id)
     if not totals:
         raise HTTPException(status_code=404, detail="Project not found")
     return totals
 
 @app.get("/projects/recent", response_model=List[ProjectResponse])
-async def get_recent_projects(
+def get_recent_projects(
     limit: int = Query(5, ge=1, le=20),
     db: Session = Depends(get_db)
 ):
     """Get recent projects"""
-    projects = ProjectCRUD.get_recent_projects(db, limit=limit)
+    projects = crud.get_recent_projects(db, limit=limit)
     return projects
 
 # ==================== MATERIAL ENDPOINTS ====================
 @app.get("/materials", response_model=List[MaterialResponse])
-async def get_materials(
+def get_materials(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     search: Optional[str] = Query(None),
+    as_of: Optional[datetime] = Query(None, description="Return the rates in force at this time"),
     db: Session = Depends(get_db)
 ):
     """Get materials with optional search"""
-    materials = MaterialCRUD.get_materials(db, skip=skip, limit=limit, search=search)
+    if as_of is not None:
+        return crud.get_catalog_as_of(db, models.Material, as_of, skip=skip, limit=limit, search=search)
+    materials = crud.get_materials(db, skip=skip, limit=limit, search=search)
     return materials
 
+@app.get("/materials/page", response_model=MaterialPage)
+def get_materials_by_cursor(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Get materials in id order using keyset pagination"""
+    return page_response(*crud.get_materials_page(db, cursor=cursor, limit=limit))
+
 @app.get("/materials/{material_id}", response_model=MaterialResponse)
-async def get_material(
-    material_id: str = Path(..., description="Material ID"),
+def get_material(
+    material_id: int = Path(..., description="Material ID"),
+    as_of: Optional[datetime] = Query(None, description="Return the rates in force at this time"),
     db: Session = Depends(get_db)
 ):
     """Get a specific material"""
-    material = MaterialCRUD.get_material(db, material_id)
+    if as_of is not None:
+        material = crud.get_catalog_item_as_of(db, models.Material, as_of, material_id)
+    else:
+        material = crud.get_material(db, material_id)
     if not material:
         raise HTTPException(status_code=404, detail="Material not found")
     return material
 
 @app.post("/materials", response_model=MaterialResponse)
-async def create_material(
+def create_material(
     material: MaterialCreate,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new material"""
-    db_material = MaterialCRUD.create_material(db, material)
+    db_material = crud.create_material(db, material)
     return db_material
 
 @app.put("/materials/{material_id}", response_model=MaterialResponse)
-async def update_material(
-    material_id: str = Path(..., description="Material ID"),
+def update_material(
+    material_id: int = Path(..., description="Material ID"),
     material_update: MaterialUpdate = None,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update a material"""
-    db_material = MaterialCRUD.update_material(db, material_id, material_update)
+    db_material = crud.update_material(db, material_id, material_update)
     if not db_material:
         raise HTTPException(status_code=404, detail="Material not found")
     return db_material
 
 @app.delete("/materials/{material_id}")
-async def delete_material(
-    material_id: str = Path(..., description="Material ID"),
+def delete_material(
+    material_id: int = Path(..., description="Material ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a material (soft delete)"""
-    success = MaterialCRUD.delete_material(db, material_id)
+    success = crud.delete_material(db, material_id)
     if not success:
         raise HTTPException(status_code=404, detail="Material not found")
     return {"message": "Material deleted successfully"}
 
 # ==================== EQUIPMENT ENDPOINTS ====================
 @app.get("/equipment", response_model=List[EquipmentResponse])
-async def get_equipment(
+def get_equipment(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     search: Optional[str] = Query(None),
+    as_of: Optional[datetime] = Query(None, description="Return the rates in force at this time"),
     db: Session = Depends(get_db)
 ):
     """Get equipment with optional search"""
-    equipment = EquipmentCRUD.get_equipment_list(db, skip=skip, limit=limit, search=search)
+    if as_of is not None:
+        return crud.get_catalog_as_of(db, models.Equipment, as_of, skip=skip, limit=limit, search=search)
+    equipment = crud.get_equipment_list(db, skip=skip, limit=limit, search=search)
     return equipment
 
+@app.get("/equipment/page", response_model=EquipmentPage)
+def get_equipment_by_cursor(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Get equipment in id order using keyset pagination"""
+    return page_response(*crud.get_equipment_page(db, cursor=cursor, limit=limit))
+
 @app.get("/equipment/{equipment_id}", response_model=EquipmentResponse)
-async def get_equipment_item(
-    equipment_id: str = Path(..., description="Equipment ID"),
+def get_equipment_item(
+    equipment_id: int = Path(..., description="Equipment ID"),
+    as_of: Optional[datetime] = Query(None, description="Return the rates in force at this time"),
     db: Session = Depends(get_db)
 ):
     """Get a specific equipment item"""
-    equipment = EquipmentCRUD.get_equipment(db, equipment_id)
+    if as_of is not None:
+        equipment = crud.get_catalog_item_as_of(db, models.Equipment, as_of, equipment_id)
+    else:
+        equipment = crud.get_equipment(db, equipment_id)
     if not equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     return equipment
 
 @app.post("/equipment", response_model=EquipmentResponse)
-async def create_equipment(
+def create_equipment(
     equipment: EquipmentCreate,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create new equipment"""
-    db_equipment = EquipmentCRUD.create_equipment(db, equipment)
+    db_equipment = crud.create_equipment(db, equipment)
     return db_equipment
 
 @app.put("/equipment/{equipment_id}", response_model=EquipmentResponse)
-async def update_equipment(
-    equipment_id: str = Path(..., description="Equipment ID"),
+def update_equipment(
+    equipment_id: int = Path(..., description="Equipment ID"),
     equipment_update: EquipmentUpdate = None,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update equipment"""
-    db_equipment = EquipmentCRUD.update_equipment(db, equipment_id, equipment_update)
+    db_equipment = crud.update_equipment(db, equipment_id, equipment_update)
     if not db_equipment:
         raise HTTPException(status_code=404, detail="Equipment not found")
     return db_equipment
 
 @app.delete("/equipment/{equipment_id}")
-async def delete_equipment(
-    equipment_id: str = Path(..., description="Equipment ID"),
+def delete_equipment(
+    equipment_id: int = Path(..., description="Equipment ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete equipment (soft delete)"""
-    success = EquipmentCRUD.delete_equipment(db, equipment_id)
+    success = crud.delete_equipment(db, equipment_id)
     if not success:
         raise HTTPException(status_code=404, detail="Equipment not found")
     return {"message": "Equipment deleted successfully"}
 
 # ==================== LABOUR ROLE ENDPOINTS ====================
-@app.get("/labour-roles", response_model=List[LabourRoleResponse])
-async def get_labour_roles(
+@app.get("/labour-roles", response_model=List[LabourRateResponse])
+def get_labour_roles(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     state_code: Optional[StateCode] = Query(None),
+    as_of: Optional[datetime] = Query(None, description="Return the rates in force at this time"),
     db: Session = Depends(get_db)
 ):
     """Get labour roles with optional state filtering"""
-    labour_roles = LabourRoleCRUD.get_labour_roles(db, skip=skip, limit=limit, state_code=state_code)
+    if as_of is not None:
+        return crud.get_catalog_as_of(db, models.LabourRate, as_of, skip=skip, limit=limit, state_code=state_code)
+    labour_roles = crud.get_labour_rates(db, skip=skip, limit=limit, state_code=state_code)
     return labour_roles
 
-@app.get("/labour-roles/{role_id}", response_model=LabourRoleResponse)
-async def get_labour_role(
-    role_id: str = Path(..., description="Labour Role ID"),
+@app.get("/labour-roles/page", response_model=LabourRatePage)
+def get_labour_roles_by_cursor(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Get labour roles in id order using keyset pagination"""
+    return page_response(*crud.get_labour_rates_page(db, cursor=cursor, limit=limit))
+
+@app.get("/labour-roles/{role_id}", response_model=LabourRateResponse)
+def get_labour_role(
+    role_id: int = Path(..., description="Labour Role ID"),
+    as_of: Optional[datetime] = Query(None, description="Return the rates in force at this time"),
     db: Session = Depends(get_db)
 ):
     """Get a specific labour role"""
-    labour_role = LabourRoleCRUD.get_labour_role(db, role_id)
+    if as_of is not None:
+        labour_role = crud.get_catalog_item_as_of(db, models.LabourRate, as_of, role_id)
+    else:
+        labour_role = crud.get_labour_rate(db, role_id)
     if not labour_role:
         raise HTTPException(status_code=404, detail="Labour role not found")
     return labour_role
 
-@app.post("/labour-roles", response_model=LabourRoleResponse)
-async def create_labour_role(
-    labour_role: LabourRoleCreate,
+@app.post("/labour-roles", response_model=LabourRateResponse)
+def create_labour_role(
+    labour_role: LabourRateCreate,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new labour role"""
-    db_labour_role = LabourRoleCRUD.create_labour_role(db, labour_role)
+    db_labour_role = crud.create_labour_rate(db, labour_role)
     return db_labour_role
 
-@app.put("/labour-roles/{role_id}", response_model=LabourRoleResponse)
-async def update_labour_role(
-    role_id: str = Path(..., description="Labour Role ID"),
-    labour_role_update: LabourRoleUpdate = None,
+@app.put("/labour-roles/{role_id}", response_model=LabourRateResponse)
+def update_labour_role(
+    role_id: int = Path(..., description="Labour Role ID"),
+    labour_role_update: LabourRateUpdate = None,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update a labour role"""
-    db_labour_role = LabourRoleCRUD.update_labour_role(db, role_id, labour_role_update)
+    db_labour_role = crud.update_labour_rate(db, role_id, labour_role_update)
     if not db_labour_role:
         raise HTTPException(status_code=404, detail="Labour role not found")
     return db_labour_role
 
 @app.delete("/labour-roles/{role_id}")
-async def delete_labour_role(
-    role_id: str = Path(..., description="Labour Role ID"),
+def delete_labour_role(
+    role_id: int = Path(..., description="Labour Role ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a labour role (soft delete)"""
-    success = LabourRoleCRUD.delete_labour_role(db, role_id)
+    success = crud.delete_labour_rate(db, role_id)
     if not success:
         raise HTTPException(status_code=404, detail="Labour role not found")
     return {"message": "Labour role deleted successfully"}
 
 @app.get("/labour-roles/rate/{labour_type}/{state_code}")
-async def get_effective_rate(
+def get_effective_rate(
     labour_type: str = Path(..., description="Labour Type"),
     state_code: StateCode = Path(..., description="State Code"),
     db: Session = Depends(get_db)
 ):
     """Get effective labour rate for a specific type and state"""
-    rate = LabourRoleCRUD.get_effective_rate(db, labour_type, state_code)
+    rate = crud.get_effective_rate(db, labour_type, state_code)
+    if rate is None:
+        raise HTTPException(status_code=404, detail="Labour rate not found")
     return {"labour_type": labour_type, "state_code": state_code, "effective_rate": rate}
 
 # ==================== PROJECT COMPONENT ENDPOINTS ====================
 @app.post("/projects/{project_id}/materials", response_model=ProjectMaterialResponse)
-async def add_material_to_project(
+def add_material_to_project(
     project_id: str = Path(..., description="Project ID"),
     project_material: ProjectMaterialCreate = None,
     current_user: dict = Depends(get_current_user),
@@ -382,24 +493,24 @@ async def add_material_to_project(
 ):
     """Add material to project"""
     project_material.project_id = project_id
-    db_project_material = ProjectMaterialCRUD.add_material_to_project(db, project_material)
+    db_project_material = crud.add_material_to_project(db, project_material)
     return db_project_material
 
 @app.delete("/projects/{project_id}/materials/{material_id}")
-async def remove_material_from_project(
+def remove_material_from_project(
     project_id: str = Path(..., description="Project ID"),
-    material_id: str = Path(..., description="Material ID"),
+    material_id: int = Path(..., description="Material ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Remove material from project"""
-    success = ProjectMaterialCRUD.remove_material_from_project(db, project_id, material_id)
+    success = crud.remove_material_from_project(db, project_id, material_id)
     if not success:
         raise HTTPException(status_code=404, detail="Material not found in project")
     return {"message": "Material removed from project"}
 
 @app.post("/projects/{project_id}/equipment", response_model=ProjectEquipmentResponse)
-async def add_equipment_to_project(
+def add_equipment_to_project(
     project_id: str = Path(..., description="Project ID"),
     project_equipment: ProjectEquipmentCreate = None,
     current_user: dict = Depends(get_current_user),
@@ -407,24 +518,24 @@ async def add_equipment_to_project(
 ):
     """Add equipment to project"""
     project_equipment.project_id = project_id
-    db_project_equipment = ProjectEquipmentCRUD.add_equipment_to_project(db, project_equipment)
+    db_project_equipment = crud.add_equipment_to_project(db, project_equipment)
     return db_project_equipment
 
 @app.delete("/projects/{project_id}/equipment/{equipment_id}")
-async def remove_equipment_from_project(
+def remove_equipment_from_project(
     project_id: str = Path(..., description="Project ID"),
-    equipment_id: str = Path(..., description="Equipment ID"),
+    equipment_id: int = Path(..., description="Equipment ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Remove equipment from project"""
-    success = ProjectEquipmentCRUD.remove_equipment_from_project(db, project_id, equipment_id)
+    success = crud.remove_equipment_from_project(db, project_id, equipment_id)
     if not success:
         raise HTTPException(status_code=404, detail="Equipment not found in project")
     return {"message": "Equipment removed from project"}
 
 @app.post("/projects/{project_id}/labor", response_model=ProjectLaborResponse)
-async def add_labor_to_project(
+def add_labor_to_project(
     project_id: str = Path(..., description="Project ID"),
     project_labor: ProjectLaborCreate = None,
     current_user: dict = Depends(get_current_user),
@@ -432,176 +543,260 @@ async def add_labor_to_project(
 ):
     """Add labor to project"""
     project_labor.project_id = project_id
-    db_project_labor = ProjectLaborCRUD.add_labor_to_project(db, project_labor)
+    db_project_labor = crud.add_labor_to_project(db, project_labor)
     return db_project_labor
 
 @app.delete("/projects/{project_id}/labor/{labor_id}")
-async def remove_labor_from_project(
+def remove_labor_from_project(
     project_id: str = Path(..., description="Project ID"),
     labor_id: str = Path(..., description="Labor ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Remove labor from project"""
-    success = ProjectLaborCRUD.remove_labor_from_project(db, project_id, labor_id)
+    success = crud.remove_labor_from_project(db, project_id, labor_id)
     if not success:
         raise HTTPException(status_code=404, detail="Labor not found in project")
     return {"message": "Labor removed from project"}
 
 # ==================== NOTIFICATION ENDPOINTS ====================
 @app.get("/notifications", response_model=List[NotificationResponse])
-async def get_notifications(
+def get_notifications(
     user_id: str = Query(..., description="User ID"),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
     """Get user notifications"""
-    notifications = NotificationCRUD.get_notifications(db, user_id, skip=skip, limit=limit)
+    notifications = crud.get_notifications(db, user_id, skip=skip, limit=limit)
     return notifications
 
+@app.get("/notifications/page", response_model=NotificationPage)
+def get_notifications_by_cursor(
+    user_id: str = Query(..., description="User ID"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Get user notifications newest first using keyset pagination"""
+    return page_response(*crud.get_notifications_page(db, user_id=user_id, cursor=cursor, limit=limit))
+
 @app.get("/notifications/unread", response_model=List[NotificationResponse])
-async def get_unread_notifications(
+def get_unread_notifications(
     user_id: str = Query(..., description="User ID"),
+    limit: int = Query(50, ge=1, le=100),
     db: Session = Depends(get_db)
 ):
-    """Get unread notifications for user"""
-    notifications = NotificationCRUD.get_unread_notifications(db, user_id)
-    return notifications
+    """Get the newest unread notifications for user"""
+    return crud.get_unread_notifications(db, user_id, limit=limit)
+
+@app.get("/notifications/unread/page", response_model=NotificationPage)
+def get_unread_notifications_by_cursor(
+    user_id: str = Query(..., description="User ID"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(50, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """Get unread notifications for user newest first using keyset pagination"""
+    return page_response(*crud.get_unread_notifications_page(db, user_id=user_id, cursor=cursor, limit=limit))
+
+@app.get("/notifications/unread/count")
+def get_unread_notification_count(
+    user_id: str = Query(..., description="User ID"),
+    db: Session = Depends(get_db)
+):
+    """Number of unread notifications for user, read from its counter"""
+    return {"user_id": user_id, "unread": crud.get_unread_notification_count(db, user_id)}
+
+@app.get("/notifications/stream")
+async def stream_notifications(user_id: str = Query(..., description="User ID")):
+    """Server-Sent Events stream of new notifications and unread count changes for user"""
+    subscriber = notification_hub.subscribe(user_id)
+    if subscriber is None:
+        raise HTTPException(status_code=503, detail="Too many notification streams", headers={"Retry-After": "5"})
+    return StreamingResponse(
+        sse_events(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/notifications/stream/stats")
+def get_notification_stream_stats(current_user: dict = Depends(get_current_user)):
+    """Open notification streams and delivery counters of this worker"""
+    return notification_hub.stats()
 
 @app.post("/notifications", response_model=NotificationResponse)
-async def create_notification(
+def create_notification(
     notification: NotificationCreate,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new notification"""
-    db_notification = NotificationCRUD.create_notification(db, notification)
+    db_notification = crud.create_notification(db, notification)
     return db_notification
 
 @app.put("/notifications/{notification_id}/read")
-async def mark_notification_read(
+def mark_notification_read(
     notification_id: str = Path(..., description="Notification ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Mark notification as read"""
-    success = NotificationCRUD.mark_notification_read(db, notification_id)
+    success = crud.mark_notification_read(db, notification_id)
     if not success:
         raise HTTPException(status_code=404, detail="Notification not found")
     return {"message": "Notification marked as read"}
 
 @app.put("/notifications/read-all")
-async def mark_all_notifications_read(
+def mark_all_notifications_read(
     user_id: str = Query(..., description="User ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Mark all notifications as read for user"""
-    updated_count = NotificationCRUD.mark_all_notifications_read(db, user_id)
+    """Mark all notifications as read for user, in batches of NOTIFICATION_MARK_READ_BATCH_SIZE"""
+    updated_count = crud.mark_all_notifications_read(db, user_id)
     return {"message": f"{updated_count} notifications marked as read"}
 
 # ==================== DASHBOARD ENDPOINTS ====================
 @app.get("/dashboard/stats", response_model=DashboardStats)
-async def get_dashboard_stats(
+def get_dashboard_stats(
     db: Session = Depends(get_db)
 ):
-    """Get dashboard statistics"""
-    stats = DashboardCRUD.get_dashboard_stats(db)
-    return stats
+    """Get dashboard statistics (cached snapshot, see dashboard_stats)"""
+    return crud.get_dashboard_stats(db)
+
+@app.get("/dashboard/stats/cache")
+def get_dashboard_stats_cache():
+    """Dashboard snapshot cache usage"""
+    return dashboard_stats_cache.stats()
 
 # ==================== SYSTEM CONFIG ENDPOINTS ====================
 @app.get("/config", response_model=List[SystemConfigResponse])
-async def get_system_configs(
+def get_system_configs(
     db: Session = Depends(get_db)
 ):
     """Get all system configurations"""
-    configs = SystemConfigCRUD.get_configs(db)
+    configs = crud.get_configs(db)
     return configs
 
 @app.get("/config/{key}", response_model=SystemConfigResponse)
-async def get_system_config(
+def get_system_config(
     key: str = Path(..., description="Config Key"),
     db: Session = Depends(get_db)
 ):
     """Get a specific system configuration"""
-    config = SystemConfigCRUD.get_config(db, key)
+    config = crud.get_config(db, key)
     if not config:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return config
 
 @app.post("/config", response_model=SystemConfigResponse)
-async def create_system_config(
+def create_system_config(
     config: SystemConfigCreate,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new system configuration"""
-    db_config = SystemConfigCRUD.create_config(db, config)
+    db_config = crud.create_config(db, config)
     return db_config
 
 @app.put("/config/{key}", response_model=SystemConfigResponse)
-async def update_system_config(
+def update_system_config(
     key: str = Path(..., description="Config Key"),
     config_update: SystemConfigUpdate = None,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update a system configuration"""
-    db_config = SystemConfigCRUD.update_config(db, key, config_update)
+    db_config = crud.update_config(db, key, config_update)
     if not db_config:
         raise HTTPException(status_code=404, detail="Configuration not found")
     return db_config
 
 # ==================== PRICE CHANGE LOG ENDPOINTS ====================
 @app.get("/price-changes", response_model=List[PriceChangeLogResponse])
-async def get_price_changes(
+def get_price_changes(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
-    entity_type: Optional[str] = Query(None),
+    entity_type: Optional[str] = Query(None, pattern="^(material|equipment|labor)$"),
+    entity_id: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None, description="Changes at or after this time"),
+    until: Optional[datetime] = Query(None, description="Changes before this time"),
     db: Session = Depends(get_db)
 ):
-    """Get price change logs"""
-    # This would need to be implemented in CRUD
-    return []
+    """Get price change logs, newest first"""
+    return crud.get_price_changes(db, skip=skip, limit=limit, entity_type=entity_type, entity_id=entity_id, since=since, until=until)
+
+@app.get("/price-changes/page", response_model=PriceChangeLogPage)
+def get_price_changes_by_cursor(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=100),
+    entity_type: Optional[str] = Query(None, pattern="^(material|equipment|labor)$"),
+    entity_id: Optional[str] = Query(None),
+    since: Optional[datetime] = Query(None, description="Changes at or after this time"),
+    until: Optional[datetime] = Query(None, description="Changes before this time"),
+    db: Session = Depends(get_db)
+):
+    """Get price change logs newest first using keyset pagination"""
+    return page_response(*crud.get_price_changes_page(db, cursor=cursor, limit=limit, entity_type=entity_type, entity_id=entity_id, since=since, until=until))
 
 # ==================== AUDIT LOG ENDPOINTS ====================
 @app.get("/audit-logs", response_model=List[AuditLogResponse])
-async def get_audit_logs(
+def get_audit_logs(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     user_id: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
     """Get audit logs"""
-    audit_logs = AuditLogCRUD.get_audit_logs(db, skip=skip, limit=limit, user_id=user_id)
+    audit_logs = crud.get_audit_logs(db, skip=skip, limit=limit, user_id=user_id)
     return audit_logs
 
+@app.get("/audit-logs/page", response_model=AuditLogPage)
+def get_audit_logs_by_cursor(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=100),
+    user_id: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Get audit logs newest first using keyset pagination"""
+    return page_response(*crud.get_audit_logs_page(db, cursor=cursor, limit=limit, user_id=user_id))
+
 # ==================== QUOTE ENDPOINTS ====================
 @app.get("/quotes", response_model=List[QuoteResponse])
-async def get_quotes(
+def get_quotes(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=100),
     search: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
     """Get quotes with optional search"""
-    quotes = QuoteCRUD.get_quotes(db, skip=skip, limit=limit, search=search)
+    quotes = crud.get_quotes(db, skip=skip, limit=limit, search=search, profile="list")
     return quotes
 
+@app.get("/quotes/page", response_model=QuotePage)
+def get_quotes_by_cursor(
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    limit: int = Query(100, ge=1, le=100),
+    search: Optional[str] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """Get quotes newest first using keyset pagination"""
+    return page_response(*crud.get_quotes_page(db, cursor=cursor, limit=limit, search=search))
+
 @app.get("/quotes/{quote_id}", response_model=QuoteResponse)
-async def get_quote(
+def get_quote(
     quote_id: str = Path(..., description="Quote ID"),
     db: Session = Depends(get_db)
 ):
     """Get a specific quote with all details"""
-    quote = QuoteCRUD.get_quote(db, quote_id)
+    quote = crud.get_quote(db, quote_id, profile="detail")
     if not quote:
         raise HTTPException(status_code=404, detail="Quote not found")
     return quote
 
 @app.post("/quotes", response_model=QuoteResponse)
-async def create_quote(
+def create_quote(
     quote: QuoteCreate,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -609,58 +804,58 @@ async def create_quote(
     """Create a new quote"""
     # Generate quote number if not provided
     if not quote.quote_number:
-        quote.quote_number = QuoteCRUD.generate_quote_number(db)
+        quote.quote_number = crud.generate_quote_number(db)
     
-    db_quote = QuoteCRUD.create_quote(db, quote, current_user["id"])
+    db_quote = crud.create_quote(db, quote, current_user["id"])
     return db_quote
 
 @app.put("/quotes/{quote_id}", response_model=QuoteResponse)
-async def update_quote(
+def update_quote(
     quote_id: str = Path(..., description="Quote ID"),
     quote_update: QuoteUpdate = None,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Update a quote"""
-    db_quote = QuoteCRUD.update_quote(db, quote_id, quote_update)
+    db_quote = crud.update_quote(db, quote_id, quote_update)
     if not db_quote:
         raise HTTPException(status_code=404, detail="Quote not found")
     return db_quote
 
 @app.delete("/quotes/{quote_id}")
-async def delete_quote(
+def delete_quote(
     quote_id: str = Path(..., description="Quote ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete a quote"""
-    success = QuoteCRUD.delete_quote(db, quote_id)
+    success = crud.delete_quote(db, quote_id)
     if not success:
         raise HTTPException(status_code=404, detail="Quote not found")
     return {"message": "Quote deleted successfully"}
 
 @app.get("/quotes/{quote_id}/items", response_model=List[QuoteItemResponse])
-async def get_quote_items(
+def get_quote_items(
     quote_id: str = Path(..., description="Quote ID"),
     db: Session = Depends(get_db)
 ):
     """Get quote items"""
-    items = QuoteItemCRUD.get_quote_items(db, quote_id)
+    items = crud.get_quote_items(db, quote_id)
     return items
 
 @app.post("/quotes/{quote_id}/items", response_model=QuoteItemResponse)
-async def add_quote_item(
+def add_quote_item(
     quote_id: str = Path(..., description="Quote ID"),
     item: QuoteItemCreate = None,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Add item to quote"""
-    db_item = QuoteItemCRUD.create_quote_item(db, quote_id, item)
+    db_item = crud.create_quote_item(db, quote_id, item)
     return db_item
 
 @app.put("/quotes/{quote_id}/items/{item_id}", response_model=QuoteItemResponse)
-async def update_quote_item(
+def update_quote_item(
     quote_id: str = Path(..., description="Quote ID"),
     item_id: str = Path(..., description="Item ID"),
     item_update: QuoteItemUpdate = None,
@@ -668,72 +863,137 @@ async def update_quote_item(
     db: Session = Depends(get_db)
 ):
     """Update quote item"""
-    db_item = QuoteItemCRUD.update_quote_item(db, item_id, item_update)
+    db_item = crud.update_quote_item(db, quote_id, item_id, item_update)
     if not db_item:
         raise HTTPException(status_code=404, detail="Quote item not found")
     return db_item
 
 @app.delete("/quotes/{quote_id}/items/{item_id}")
-async def delete_quote_item(
+def delete_quote_item(
     quote_id: str = Path(..., description="Quote ID"),
     item_id: str = Path(..., description="Item ID"),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Delete quote item"""
-    success = QuoteItemCRUD.delete_quote_item(db, item_id)
+    success = crud.delete_quote_item(db, quote_id, item_id)
     if not success:
         raise HTTPException(status_code=404, detail="Quote item not found")
     return {"message": "Quote item deleted successfully"}
 
 # ==================== CALCULATOR ENDPOINTS ====================
 @app.post("/calculator/rate-card", response_model=CalculatorResponse)
-async def calculate_rate_card(
+def calculate_rate_card(
     request: CalculatorRequest,
     db: Session = Depends(get_db)
 ):
-    """Calculate rate card based on region and selections"""
-    # This is a simplified calculation - you can expand this based on your business logic
-    base_amount = 1000.0  # Base rate
-    support_amount = len(request.additional_support) * 100.0  # Support items
-    
-    # Apply risk uplift
-    risk_multiplier = 1 + (request.risk_uplift / 100)
-    subtotal = (base_amount + support_amount) * risk_multiplier
-    
-    # Add tax (assuming 10% GST)
-    tax_rate = 10.0
-    tax_amount = subtotal * (tax_rate / 100)
-    total_amount = subtotal + tax_amount
-    
-    return CalculatorResponse(
-        base_amount=base_amount,
-        support_amount=support_amount,
-        subtotal=subtotal,
-        total_amount=total_amount,
-        breakdown={
-            "base_rate": base_amount,
-            "support_items": support_amount,
-            "risk_uplift_percent": request.risk_uplift,
-            "risk_multiplier": risk_multiplier,
-            "tax_rate": tax_rate,
-            "tax_amount": tax_amount,
-            "sor_code": request.sor_code,
-            "sor_description": request.sor_description
-        }
+    """Price a rate card against the region's material, equipment and labour rates"""
+    return CalculatorResponse(**price_calculator_request(db, request))
+
+@app.post("/calculator/rate-card/batch")
+def calculate_rate_card_batch(
+    requests: List[CalculatorRequest],
+    db: Session = Depends(get_db)
+):
+    """Price many rate cards at once, streamed back as newline-delimited CalculatorResponse JSON"""
+    if len(requests) > CALCULATOR_BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"At most {CALCULATOR_BATCH_MAX_REQUESTS} requests per batch")
+    priced = price_batch(db, requests)
+    return StreamingResponse(
+        (CalculatorResponse(**result).json() + "\n" for result in priced),
+        media_type="application/x-ndjson"
     )
 
+# ==================== RATE CARD SNAPSHOT ENDPOINTS ====================
+@app.post("/rate-card/snapshots", response_model=RateCardSnapshotResponse, status_code=201)
+def create_rate_card_snapshot(
+    snapshot: RateCardSnapshotCreate,
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Capture the current materials, equipment and labour rates as an immutable snapshot"""
+    return crud.create_rate_card_snapshot(db, reason=snapshot.reason)
+
+@app.get("/rate-card/snapshots", response_model=List[RateCardSnapshotResponse])
+def get_rate_card_snapshots(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """List rate card snapshots, newest first"""
+    return crud.get_rate_card_snapshots(db, skip=skip, limit=limit)
+
+@app.get("/rate-card/snapshots/cache")
+def get_rate_card_snapshot_cache_stats():
+    """Decoded snapshot cache usage"""
+    return snapshot_cache.stats()
+
 # ==================== ADMIN DASHBOARD ENDPOINTS ====================
 @app.get("/admin/dashboard/stats", response_model=AdminDashboardStats)
-async def get_admin_dashboard_stats(
+def get_admin_dashboard_stats(
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get admin dashboard statistics (cached snapshot, see dashboard_stats)"""
+    return crud.get_admin_dashboard_stats(db)
+
+@app.get("/admin/slow-queries", response_model=SlowQueryLogResponse)
+def get_admin_slow_queries(
+    limit: int = Query(50, ge=1, le=500),
+    current_user: dict = Depends(get_current_user)
+):
+    """Get the most recent slow SQL statements, with sampled EXPLAIN plans on Postgres"""
+    return SlowQueryLogResponse(
+        enabled=SLOW_QUERY_LOG,
+        threshold_ms=slow_query_log.threshold_ms,
+        explain_rate=slow_query_log.explain_rate,
+        recorded=slow_query_log.recorded,
+        explains_dropped=slow_query_log.explains_dropped,
+        entries=slow_query_log.entries(limit)
+    )
+
+@app.delete("/admin/slow-queries")
+def clear_admin_slow_queries(
+    current_user: dict = Depends(get_current_user)
+):
+    """Empty the slow query log"""
+    slow_query_log.clear()
+    return {"message": "Slow query log cleared"}
+
+@app.get("/admin/stat-counters/drift")
+def get_admin_stat_counter_drift(
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get admin dashboard statistics"""
-    return AdminDashboardCRUD.get_dashboard_stats(db)
+    """Recompute the dashboard counters from the base tables and report the ones that drifted"""
+    return crud.reconcile_dashboard_counters(db)
+
+@app.post("/admin/stat-counters/reconcile")
+def reconcile_admin_stat_counters(
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Recompute the dashboard counters and rewrite the ones that drifted"""
+    return crud.reconcile_dashboard_counters(db, fix=True)
+
+@app.post("/admin/alerts/run", status_code=status.HTTP_202_ACCEPTED)
+def run_admin_alerts(
+    background_tasks: BackgroundTasks,
+    current_user: dict = Depends(get_current_user)
+):
+    """Start an alert run now instead of waiting for the alert worker; it runs after the response on its own session"""
+    background_tasks.add_task(crud.run_alert_rules)
+    return {"message": "Alert run started"}
+
+@app.get("/admin/db-pool")
+def get_admin_db_pool(
+    current_user: dict = Depends(get_current_user)
+):
+    """Connection pool state, checkout/connect latency percentiles and the admission limit"""
+    return {"pools": pool_telemetry.snapshot(), "admission": admission.stats()}
 
 @app.get("/admin/projects", response_model=List[AdminProjectSummary])
-async def get_admin_projects(
+def get_admin_projects(
     search_term: Optional[str] = Query(None),
     status: Optional[ProjectStatus] = Query(None),
     priority: Optional[ProjectPriority] = Query(None),
@@ -762,10 +1022,10 @@ async def get_admin_projects(
         budget_min=budget_min,
         budget_max=budget_max
     )
-    return AdminDashboardCRUD.get_admin_projects(db, search_request, skip, limit)
+    return crud.get_admin_projects(db, search_request, skip, limit)
 
 @app.get("/admin/activity-feed", response_model=ActivityFeedResponse)
-async def get_admin_activity_feed(
+def get_admin_activity_feed(
     user_id: str = Query(..., description="User ID"),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
@@ -773,30 +1033,47 @@ async def get_admin_activity_feed(
     db: Session = Depends(get_db)
 ):
     """Get activity feed for admin dashboard"""
-    return AdminDashboardCRUD.get_activity_feed(db, user_id, skip, limit)
+    return crud.get_activity_feed(db, user_id, skip, limit)
 
 # ==================== BULK OPERATIONS ENDPOINTS ====================
 @app.post("/bulk/import", response_model=BulkImportResponse)
-async def bulk_import(
+def bulk_import(
     request: BulkImportRequest,
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Bulk import data"""
-    return BulkOperationsCRUD.bulk_import(db, request)
+    return crud.bulk_import(db, request, changed_by=current_user["id"])
 
-@app.post("/bulk/export", response_model=BulkExportResponse)
-async def bulk_export(
-    request: BulkExportRequest,
+@app.post("/bulk/import/{entity_type}", response_model=StreamingBulkImportResponse)
+def bulk_import_file(
+    entity_type: str = Path(..., pattern="^(materials|equipment|labour_rates)$"),
+    file: UploadFile = File(..., description="CSV with a header row, or NDJSON (.ndjson/.jsonl)"),
+    batch_size: int = Query(BULK_IMPORT_BATCH_SIZE, ge=100, le=50000),
     current_user: dict = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Bulk export data"""
-    return BulkOperationsCRUD.bulk_export(db, request)
+    """Stream a CSV/NDJSON upload into the catalog, upserting on the natural key batch by batch"""
+    file_format = detect_format(file.filename, file.content_type)
+    return import_stream(db, entity_type, file.file, file_format, batch_size=batch_size)
+
+@app.post("/bulk/export")
+def bulk_export(
+    request: BulkExportRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream an export as CSV or NDJSON, optionally gzipped, straight from a server-side cursor"""
+    file_format = export_format(request.format)
+    filename = export_filename(request.entity_type, file_format, request.gzip)
+    return StreamingResponse(
+        export_stream(request.entity_type, file_format, filters=request.filters, compress=request.gzip),
+        media_type="application/gzip" if request.gzip else MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 # ==================== ENHANCED SEARCH ENDPOINTS ====================
 @app.get("/search/projects", response_model=List[ProjectResponse])
-async def search_projects(
+def search_projects(
     search_term: Optional[str] = Query(None),
     status: Optional[ProjectStatus] = Query(None),
     priority: Optional[ProjectPriority] = Query(None),
@@ -832,10 +1109,10 @@ async def search_projects(
         progress_min=progress_min,
         progress_max=progress_max
     )
-    return AdvancedSearchCRUD.search_projects(db, filters, skip, limit)
+    return crud.search_projects(db, filters, skip, limit)
 
 @app.get("/search/materials", response_model=List[MaterialResponse])
-async def search_materials(
+def search_materials(
     search_term: Optional[str] = Query(None),
     category: Optional[str] = Query(None),
     site: Optional[str] = Query(None),
@@ -844,11 +1121,11 @@ async def search_materials(
     db: Session = Depends(get_db)
 ):
     """Enhanced search for materials"""
-    materials = MaterialCRUD.get_materials(db, skip=skip, limit=limit, search=search_term)
+    materials = crud.get_materials(db, skip=skip, limit=limit, search=search_term)
     return materials
 
 @app.get("/search/equipment", response_model=List[EquipmentResponse])
-async def search_equipment(
+def search_equipment(
     search_term: Optional[str] = Query(None),
     category: Optional[str] = Query(None),
     site: Optional[str] = Query(None),
@@ -857,13 +1134,14 @@ async def search_equipment(
     db: Session = Depends(get_db)
 ):
     """Enhanced search for equipment"""
-    equipment = EquipmentCRUD.get_equipment_list(db, skip=skip, limit=limit, search=search_term)
+    equipment = crud.get_equipment_list(db, skip=skip, limit=limit, search=search_term)
     return equipment
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=True
-    )
\ No newline at end of file
+    )
\ No newline at end of file
@@ -1,12 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum as SQLEnum, Numeric
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Enum as SQLEnum, Numeric, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import column_property, relationship
 from sqlalchemy.sql import func
 from enum import Enum
 import uuid
 
 Base = declarative_base()
 
+# Columns diffed by the price_changes and stat_counters flush hooks: active_history
+# loads the stored value before it is overwritten, also on expired objects
+def tracked_column(*args, **kwargs):
+    return column_property(Column(*args, **kwargs), active_history=True)
+
 class UserRole(str, Enum):
     ADMIN = "admin"
     USER = "user"
@@ -104,17 +109,17 @@ class Project(Base):
     sor_code = Column(String(100))  # SOR Code field
     sor_description = Column(Text)  # SOR Description field
     sor_type = Column(String(100))  # SOR Type field
-    manager_id = Column(String, ForeignKey("users.id"), nullable=False)
+    manager_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
     category = Column(String(100))
-    status = Column(SQLEnum(ProjectStatus), default=ProjectStatus.PLANNING)
+    status = tracked_column(SQLEnum(ProjectStatus), default=ProjectStatus.PLANNING)
     priority = Column(SQLEnum(ProjectPriority), default=ProjectPriority.MEDIUM)
-    budget = Column(Float, default=0.0)
-    actual_cost = Column(Float, default=0.0)
+    budget = tracked_column(Float, default=0.0)
+    actual_cost = tracked_column(Float, default=0.0)
     progress = Column(Integer, default=0)  # Percentage 0-100
     start_date = Column(DateTime(timezone=True))
     end_date = Column(DateTime(timezone=True))
     region = Column(String(50))  # Region field for projects
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
@@ -124,6 +129,12 @@ class Project(Base):
     project_labor = relationship("ProjectLabor", back_populates="project", cascade="all, delete-orphan")
     project_tasks = relationship("ProjectTask", back_populates="project", cascade="all, delete-orphan")
     project_external_costs = relationship("ProjectExternalCost", back_populates="project", cascade="all, delete-orphan")
+    totals = relationship("ProjectTotals", uselist=False, back_populates="project", passive_deletes=True)
+
+    __table_args__ = (
+        # newest-first listing and keyset pagination
+        Index("ix_projects_created_at_id", "created_at", "id"),
+    )
 
 # Inventory Management
 class Material(Base):
@@ -133,9 +144,9 @@ class Material(Base):
     sales_part_no = Column(String(100), unique=True, nullable=False)
     description = Column(Text, nullable=False)
     name = Column(String(100))
-    state_code = Column(String(10), nullable=False, index=True)
+    state_code = tracked_column(String(10), nullable=False, index=True)
     qty = Column(Integer, default=1)
-    unit_cost = Column(Float, nullable=False)
+    unit_cost = tracked_column(Float, nullable=False)
     image_url = Column(String(500))
     sor_code = Column(String(30), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -148,12 +159,12 @@ class Equipment(Base):
     __tablename__ = "equipments"
     
     id = Column(Integer, primary_key=True, index=True)
-    task_id = Column(Integer, ForeignKey("tasks.id", ondelete="SET NULL"), nullable=True)
+    task_id = Column(String, ForeignKey("project_tasks.id", ondelete="SET NULL"), nullable=True)
     sales_part_no = Column(String(50))
     equipment_name = Column(Text)
-    category = Column(String(100), nullable=False)
+    category = tracked_column(String(100), nullable=False)
     state_code = Column(String(100))
-    price = Column(Float, nullable=False)
+    price = tracked_column(Float, nullable=False)
     price_incl_tax = Column(Float, nullable=False)
     sor_code = Column(String(30), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -168,7 +179,7 @@ class LabourRate(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     labour_type = Column(String(100), nullable=False)
-    cost_per_person = Column(Float, nullable=False)
+    cost_per_person = tracked_column(Float, nullable=False)
     hours = Column(Float, default=1)
     state_code = Column(String(10), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -182,8 +193,8 @@ class ProjectMaterial(Base):
     __tablename__ = "project_materials"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    project_id = Column(String, ForeignKey("projects.id"), nullable=False)
-    material_id = Column(String, ForeignKey("materials.id"), nullable=False)
+    project_id = Column(String, ForeignKey("projects.id"), nullable=False, index=True)
+    material_id = Column(Integer, ForeignKey("materials.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False, default=1)
     unit_price = Column(Float, nullable=False)
     total_price = Column(Float, nullable=False)
@@ -197,8 +208,8 @@ class ProjectEquipment(Base):
     __tablename__ = "project_equipment"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    project_id = Column(String, ForeignKey("projects.id"), nullable=False)
-    equipment_id = Column(String, ForeignKey("equipment.id"), nullable=False)
+    project_id = Column(String, ForeignKey("projects.id"), nullable=False, index=True)
+    equipment_id = Column(Integer, ForeignKey("equipments.id"), nullable=False, index=True)
     quantity = Column(Integer, nullable=False, default=1)
     unit_price = Column(Float, nullable=False)
     total_price = Column(Float, nullable=False)
@@ -212,8 +223,8 @@ class ProjectLabor(Base):
     __tablename__ = "project_labor"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    project_id = Column(String, ForeignKey("projects.id"), nullable=False)
-    labour_rate_id = Column(Integer, ForeignKey("labour_rates.id"), nullable=False)
+    project_id = Column(String, ForeignKey("projects.id"), nullable=False, index=True)
+    labour_rate_id = Column(Integer, ForeignKey("labour_rates.id"), nullable=False, index=True)
     persons = Column(Integer, nullable=False, default=1)
     hours = Column(Integer, nullable=False, default=8)
     state_code = Column(String(10), nullable=False)
@@ -229,7 +240,7 @@ class ProjectTask(Base):
     __tablename__ = "project_tasks"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    project_id = Column(String, ForeignKey("projects.id"), nullable=False)
+    project_id = Column(String, ForeignKey("projects.id"), nullable=False, index=True)
     name = Column(String(200), nullable=False)
     description = Column(Text)
     status = Column(SQLEnum(TaskStatus), default=TaskStatus.PENDING)
@@ -244,7 +255,7 @@ class ProjectExternalCost(Base):
     __tablename__ = "project_external_costs"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    project_id = Column(String, ForeignKey("projects.id"), nullable=False)
+    project_id = Column(String, ForeignKey("projects.id"), nullable=False, index=True)
     cost_type = Column(String(50), nullable=False)  # 'crane_fee', 'risk_rate', etc.
     description = Column(String(200))
     amount = Column(Float, nullable=False)
@@ -255,24 +266,56 @@ class ProjectExternalCost(Base):
     # Relationships
     project = relationship("Project", back_populates="project_external_costs")
 
+# Cost rollup per project, kept current by project_totals on every line change
+class ProjectTotals(Base):
+    __tablename__ = "project_totals"
+    
+    project_id = Column(String, ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    total_materials = Column(Float, nullable=False, default=0.0)
+    total_equipment = Column(Float, nullable=False, default=0.0)
+    total_labor = Column(Float, nullable=False, default=0.0)
+    total_external = Column(Float, nullable=False, default=0.0)
+    grand_total = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    # Relationships
+    project = relationship("Project", back_populates="totals")
+
+# Dashboard counters (counts and sums per scope and key), kept current by stat_counters on every write
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+    
+    scope = Column(String(50), primary_key=True)
+    key = Column(String(200), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
 # Notification System
 class Notification(Base):
     __tablename__ = "notifications"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    user_id = Column(String, ForeignKey("users.id"), nullable=False)
+    user_id = tracked_column(String, ForeignKey("users.id"), nullable=False)
     type = Column(SQLEnum(NotificationType), nullable=False)
     severity = Column(SQLEnum(NotificationSeverity), default=NotificationSeverity.MEDIUM)
     title = Column(String(200), nullable=False)
     message = Column(Text, nullable=False)
-    is_read = Column(Boolean, default=False)
-    related_project_id = Column(String, ForeignKey("projects.id"))
+    is_read = tracked_column(Boolean, default=False)
+    related_project_id = Column(String, ForeignKey("projects.id"), index=True)
     related_entity_id = Column(String)  # For other related entities
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    dedupe_key = Column(String(200))  # Set by generated alerts (see alerts.py); one per user and key
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
     user = relationship("User", back_populates="notifications")
 
+    __table_args__ = (
+        Index("ix_notifications_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_notifications_user_id_is_read_created_at_id", "user_id", "is_read", "created_at", "id"),
+        Index("uq_notifications_user_id_dedupe_key", "user_id", "dedupe_key", unique=True),
+    )
+
 # Quote Management
 class Quote(Base):
     __tablename__ = "quotes"
@@ -288,26 +331,30 @@ class Quote(Base):
     sor_code = Column(String(100))  # SOR Code field
     sor_description = Column(Text)  # SOR Description field
     region = Column(String(50))
-    status = Column(SQLEnum(QuoteStatus), default=QuoteStatus.DRAFT)
+    status = tracked_column(SQLEnum(QuoteStatus), default=QuoteStatus.DRAFT)
     subtotal = Column(Float, default=0.0)
     tax_rate = Column(Float, default=0.0)
     tax_amount = Column(Float, default=0.0)
     total_amount = Column(Float, default=0.0)
     valid_until = Column(DateTime(timezone=True))
     notes = Column(Text)
-    created_by = Column(String, ForeignKey("users.id"), nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_by = Column(String, ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Relationships
     created_by_user = relationship("User")
     quote_items = relationship("QuoteItem", back_populates="quote", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_quotes_created_at_id", "created_at", "id"),
+    )
+
 class QuoteItem(Base):
     __tablename__ = "quote_items"
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    quote_id = Column(String, ForeignKey("quotes.id"), nullable=False)
+    quote_id = Column(String, ForeignKey("quotes.id"), nullable=False, index=True)
     item_type = Column(SQLEnum(QuoteItemType), nullable=False)
     item_name = Column(String(200), nullable=False)
     description = Column(Text)
@@ -330,13 +377,30 @@ class PriceChangeLog(Base):
     entity_name = Column(String(200), nullable=False)
     old_price = Column(Float, nullable=False)
     new_price = Column(Float, nullable=False)
-    changed_by = Column(String, ForeignKey("users.id"))
+    changed_by = Column(String, ForeignKey("users.id"), index=True)
     change_reason = Column(Text)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     
     # Relationships
     changed_by_user = relationship("User")
 
+    __table_args__ = (
+        Index("ix_price_change_logs_entity_type_created_at", "entity_type", "created_at"),
+    )
+
+# Point-in-time rate cards
+class RateCardSnapshot(Base):
+    __tablename__ = "rate_card_snapshots"
+    
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    reason = Column(String(200))
+    material_count = Column(Integer, nullable=False, default=0)
+    equipment_count = Column(Integer, nullable=False, default=0)
+    labour_rate_count = Column(Integer, nullable=False, default=0)
+    payload_bytes = Column(Integer, nullable=False, default=0)
+    payload = Column(LargeBinary, nullable=False)  # zlib-compressed columnar JSON, see rate_snapshots.py
+
 # System Configuration
 class SystemConfig(Base):
     __tablename__ = "system_config"
@@ -362,7 +426,12 @@ class AuditLog(Base):
     new_values = Column(Text)  # JSON string
     ip_address = Column(String(45))
     user_agent = Column(Text)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
-    user = relationship("User")
\ No newline at end of file
+    user = relationship("User")
+
+    __table_args__ = (
+        Index("ix_audit_logs_created_at_id", "created_at", "id"),
+        Index("ix_audit_logs_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
\ No newline at end of file
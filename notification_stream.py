@@ -0,0 +1,385 @@
+"""
+Push channel for notifications (Server-Sent Events).
+
+``GET /notifications/stream?user_id=`` keeps a connection open per browser
+tab. It receives:
+
+* ``notification`` events with each new notification of the user;
+* ``unread`` events carrying the user's unread count whenever it changes,
+  and once when the stream opens;
+* ``resync`` events when the stream fell behind and events were dropped.
+  The client should then refetch.
+
+Session hooks collect the notifications written in a transaction and
+publish them once it commits; a rolled back transaction publishes nothing.
+Bulk ``UPDATE``/``DELETE`` statements on notifications refresh the unread
+count of every subscribed user, or only of the users they name with the
+``UNREAD_USERS`` execution option. Unread counts come from
+the ``stat_counters`` rows, read once per commit for the users that have an
+open stream in this worker. An idle stream costs no database work at all.
+
+``NOTIFICATION_PUBSUB`` selects the transport:
+
+* ``local`` (default): publishing goes straight to the in-process hub, so
+  streams only see writes made by their own worker process.
+* ``postgres``: the hooks ``pg_notify`` inside the writing transaction.
+  Every worker runs one ``LISTEN`` connection that feeds its own hub, so
+  streams see writes from every worker and every host.
+
+Each stream has a bounded queue (``SSE_QUEUE_SIZE``). A stream whose
+client does not keep up has its backlog replaced by a single ``resync``
+event, so it never grows without bound. Comment heartbeats every
+``SSE_HEARTBEAT_SECONDS`` keep proxies from closing idle streams and let
+the server notice clients that have gone away. At most
+``SSE_MAX_SUBSCRIBERS`` streams are open per worker; further requests get
+503.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from itertools import chain
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import event, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from . import models
+from .config import settings
+from .stat_counters import UNREAD_USERS
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATION_PUBSUB = settings.notification_pubsub
+SSE_HEARTBEAT_SECONDS = settings.sse_heartbeat_seconds
+SSE_QUEUE_SIZE = settings.sse_queue_size
+SSE_MAX_SUBSCRIBERS = settings.sse_max_subscribers
+SSE_RETRY_MS = 5000
+
+CHANNEL = "ratecard_notifications"
+# pg_notify payloads must stay under 8000 bytes
+_MAX_PAYLOAD = 7900
+_PENDING = "notification_stream_pending"
+_PAYLOAD_COLUMNS = ("id", "user_id", "type", "severity", "title", "message", "is_read",
+                    "related_project_id", "related_entity_id", "created_at")
+ALL_USERS = None
+
+
+def _plain(value: Any) -> Any:
+    value = getattr(value, "value", value)
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def notification_payload(notification: models.Notification) -> Dict[str, Any]:
+    # only loaded values: server defaults such as created_at are expired after the flush
+    return _row_payload(inspect(notification).dict)
+
+
+def _row_payload(row: Dict[str, Any]) -> Dict[str, Any]:
+    return {column: _plain(row.get(column)) for column in _PAYLOAD_COLUMNS}
+
+
+# ----------------------------- hub -----------------------------
+class _Subscriber:
+    __slots__ = ("user_id", "queue", "loop")
+
+    def __init__(self, user_id: str, queue_size: int):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.loop = asyncio.get_running_loop()
+
+
+class NotificationHub:
+    """In-process fan-out from publishers (any thread) to per-stream asyncio queues."""
+
+    def __init__(self, queue_size: int = SSE_QUEUE_SIZE, max_subscribers: int = SSE_MAX_SUBSCRIBERS):
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.published = 0
+        self.dropped = 0
+        self._subscribers: Dict[str, Set[_Subscriber]] = {}
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: str) -> Optional[_Subscriber]:
+        """A new stream for ``user_id``, or None when the worker is at ``max_subscribers``."""
+        subscriber = _Subscriber(user_id, self.queue_size)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                return None
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+            self._count += 1
+        if NOTIFICATION_PUBSUB == "postgres":
+            postgres_listener.ensure_started()
+        return subscriber
+
+    def unsubscribe(self, subscriber: _Subscriber) -> None:
+        with self._lock:
+            streams = self._subscribers.get(subscriber.user_id)
+            if streams is not None and subscriber in streams:
+                streams.discard(subscriber)
+                self._count -= 1
+                if not streams:
+                    del self._subscribers[subscriber.user_id]
+
+    def subscribed(self, user_ids: Optional[Iterable[str]] = ALL_USERS) -> List[str]:
+        """Those of ``user_ids`` (all users if None) with an open stream in this worker."""
+        with self._lock:
+            if user_ids is ALL_USERS:
+                return list(self._subscribers)
+            return [user_id for user_id in user_ids if user_id in self._subscribers]
+
+    def dispatch(self, user_id: str, event_name: str, data: Any) -> None:
+        """Queue an event on every stream of ``user_id``; safe to call from any thread."""
+        with self._lock:
+            streams = list(self._subscribers.get(user_id, ()))
+        for subscriber in streams:
+            subscriber.loop.call_soon_threadsafe(self._offer, subscriber, (event_name, data))
+        self.published += len(streams)
+
+    def _offer(self, subscriber: _Subscriber, item: Any) -> None:
+        queue = subscriber.queue
+        if not queue.full():
+            queue.put_nowait(item)
+            return
+        # the client is not keeping up: replace its backlog with one resync
+        while not queue.empty():
+            queue.get_nowait()
+            self.dropped += 1
+        queue.put_nowait(("resync", {"reason": "stream fell behind"}))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            users, streams = len(self._subscribers), self._count
+        return {
+            "transport": NOTIFICATION_PUBSUB,
+            "users": users,
+            "streams": streams,
+            "max_streams": self.max_subscribers,
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "dropped": self.dropped,
+            "listener_connected": postgres_listener.connected if NOTIFICATION_PUBSUB == "postgres" else None,
+        }
+
+
+notification_hub = NotificationHub()
+
+
+def _read_unread_counts(user_ids: List[str]) -> Dict[str, int]:
+    from .database import SessionLocal, use_primary
+    from .stat_counters import unread_counts
+    db = use_primary(SessionLocal())
+    try:
+        return unread_counts(db, user_ids)
+    finally:
+        db.close()
+
+
+def publish_unread(user_ids: Optional[Iterable[str]] = ALL_USERS) -> None:
+    """Send the current unread count to the subscribed ones of ``user_ids`` (all if None)."""
+    subscribed = notification_hub.subscribed(user_ids)
+    if not subscribed:
+        return
+    try:
+        counts = _read_unread_counts(subscribed)
+    except Exception:
+        logger.exception("could not read unread counts for %d streamed users", len(subscribed))
+        return
+    for user_id, count in counts.items():
+        notification_hub.dispatch(user_id, "unread", {"unread": count})
+
+
+def deliver(message: Dict[str, Any]) -> None:
+    """Hand one published message to this worker's streams."""
+    kind = message.get("kind")
+    if kind == "notification":
+        payload = message["notification"]
+        notification_hub.dispatch(payload["user_id"], "notification", payload)
+    elif kind == "resync":
+        notification_hub.dispatch(message["user_id"], "resync", {"reason": "notification too large to push"})
+    elif kind == "unread":
+        publish_unread(message.get("user_ids"))
+
+
+# ----------------------------- session hooks -----------------------------
+def _pending(session: Session) -> Dict[str, Any]:
+    return session.info.setdefault(_PENDING, {"notifications": [], "users": set(), "all_users": False})
+
+
+def _encode(message: Dict[str, Any]) -> str:
+    payload = json.dumps(message, default=str)
+    if len(payload.encode()) > _MAX_PAYLOAD:
+        if message.get("kind") == "notification":
+            payload = json.dumps({"kind": "resync", "user_id": message["notification"]["user_id"]})
+        else:
+            # too many users to list: every worker refreshes all of its streams
+            payload = json.dumps({"kind": "unread", "user_ids": ALL_USERS})
+    return payload
+
+
+def _notify(session: Session, message: Dict[str, Any]) -> None:
+    session.connection().execute(text("SELECT pg_notify(:channel, :payload)"),
+                                 {"channel": CHANNEL, "payload": _encode(message)})
+
+
+def publish_inserted(session: Session, rows: Iterable[Dict[str, Any]]) -> None:
+    """Publish notifications written with a Core ``insert()``, which the flush hooks never see.
+
+    Like the hooks, they reach the streams only if the transaction commits.
+    The unread counts follow from the statement's ``UNREAD_USERS`` option.
+    """
+    payloads = [_row_payload(row) for row in rows]
+    if not payloads:
+        return
+    if NOTIFICATION_PUBSUB == "postgres":
+        session.connection().execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            [{"channel": CHANNEL, "payload": _encode({"kind": "notification", "notification": payload})}
+             for payload in payloads],
+        )
+        return
+    _pending(session)["notifications"].extend(payloads)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_notifications(session: Session, flush_context: Any) -> None:
+    created = [obj for obj in session.new if isinstance(obj, models.Notification)]
+    users: Set[str] = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, models.Notification):
+            users.add(obj.user_id)
+            users.update(inspect(obj).attrs.user_id.history.deleted or ())
+    users.discard(None)
+    if not users:
+        return
+    payloads = [notification_payload(obj) for obj in created]
+    if NOTIFICATION_PUBSUB == "postgres":
+        # NOTIFY is transactional: listeners only hear it if this transaction commits
+        for payload in payloads:
+            _notify(session, {"kind": "notification", "notification": payload})
+        _notify(session, {"kind": "unread", "user_ids": sorted(users)})
+        return
+    pending = _pending(session)
+    pending["notifications"].extend(payloads)
+    pending["users"].update(users)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_notification_writes(orm_execute_state: Any) -> None:
+    statement = orm_execute_state.statement
+    if isinstance(statement, UpdateBase) and getattr(statement.table, "name", None) == models.Notification.__tablename__:
+        session = orm_execute_state.session
+        user_ids = orm_execute_state.execution_options.get(UNREAD_USERS)
+        if NOTIFICATION_PUBSUB == "postgres":
+            _notify(session, {"kind": "unread", "user_ids": ALL_USERS if user_ids is None else sorted(user_ids)})
+        elif user_ids is None:
+            _pending(session)["all_users"] = True
+        else:
+            _pending(session)["users"].update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session: Session) -> None:
+    pending = session.info.pop(_PENDING, None)
+    if pending is None:
+        return
+    for payload in pending["notifications"]:
+        notification_hub.dispatch(payload["user_id"], "notification", payload)
+    publish_unread(ALL_USERS if pending["all_users"] else pending["users"])
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session: Session) -> None:
+    session.info.pop(_PENDING, None)
+
+
+# ----------------------------- postgres transport -----------------------------
+class PostgresListener:
+    """One LISTEN connection per worker, feeding ``deliver``; reconnects with backoff."""
+
+    def __init__(self, channel: str = CHANNEL):
+        self.channel = channel
+        self.connected = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="notification-listener", daemon=True)
+                self._thread.start()
+
+    def _connect(self) -> Any:
+        from sqlalchemy import create_engine
+        from sqlalchemy.pool import NullPool
+        from .database import _build_connect_args, settings
+        # its own connection, outside the request pool it would otherwise hold forever
+        engine = create_engine(settings.database_url, poolclass=NullPool,
+                               connect_args=_build_connect_args(settings.database_url))
+        connection = engine.raw_connection().driver_connection
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(f"LISTEN {self.channel}")
+        return connection
+
+    def _run(self) -> None:
+        import select
+        delay = 1
+        while True:
+            connection = None
+            try:
+                connection = self._connect()
+                self.connected, delay = True, 1
+                logger.info("listening for notifications on %s", self.channel)
+                while True:
+                    if select.select([connection], [], [], SSE_HEARTBEAT_SECONDS) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        try:
+                            deliver(json.loads(notify.payload))
+                        except Exception:
+                            logger.exception("bad notification message on %s", self.channel)
+            except Exception as exc:
+                self.connected = False
+                logger.warning("notification listener disconnected, retrying in %ds: %s", delay, exc)
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            finally:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Exception:
+                        pass
+
+
+postgres_listener = PostgresListener()
+
+
+# ----------------------------- stream -----------------------------
+def _sse(event_name: str, data: Any) -> str:
+    return f"event: {event_name}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+async def sse_events(subscriber: _Subscriber) -> AsyncIterator[str]:
+    """The event stream of one subscriber; unsubscribes when the client goes away."""
+    from starlette.concurrency import run_in_threadpool
+    try:
+        yield f"retry: {SSE_RETRY_MS}\n\n"
+        counts = await run_in_threadpool(_read_unread_counts, [subscriber.user_id])
+        yield _sse("unread", {"unread": counts[subscriber.user_id]})
+        while True:
+            try:
+                event_name, data = await asyncio.wait_for(subscriber.queue.get(), SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            yield _sse(event_name, data)
+    finally:
+        notification_hub.unsubscribe(subscriber)
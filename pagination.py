@@ -0,0 +1,72 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor is an opaque url-safe token holding the sort key of the last row of
+the previous page, so each page is a single index range scan no matter how
+deep the client has paged. A cursor that cannot be decoded raises
+``InvalidCursor``, which the apps answer with 400.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, columns: Sequence[Any]) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if not isinstance(payload, list) or len(payload) != len(columns):
+            raise ValueError("cursor does not match sort key")
+        values = []
+        for column, value in zip(columns, payload):
+            if value is not None and column.type.python_type is datetime:
+                value = datetime.fromisoformat(value)
+            values.append(value)
+        return values
+    except (ValueError, TypeError, NotImplementedError):
+        raise InvalidCursor("Invalid pagination cursor")
+
+
+def keyset_paginate(
+    query: Query,
+    columns: Sequence[Any],
+    cursor: Optional[str] = None,
+    limit: int = 100,
+    descending: bool = False,
+) -> Tuple[List[Any], Optional[str]]:
+    """Return one page of ``query`` ordered by ``columns`` and the cursor of the next page.
+
+    ``columns`` must form a unique key (end it with the primary key) and be
+    NOT NULL: a row with a NULL key would drop out of every later page.
+    """
+    key = tuple_(*columns)
+    if cursor:
+        after = tuple_(*decode_cursor(cursor, columns))
+        query = query.filter(key < after if descending else key > after)
+    query = query.order_by(*(c.desc() if descending else c.asc() for c in columns))
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return rows, next_cursor
+
+
+def page_response(items: List[Any], next_cursor: Optional[str]) -> dict:
+    """Build the ``CursorPaginatedResponse`` envelope for one page."""
+    return {"items": items, "size": len(items), "next_cursor": next_cursor, "has_more": next_cursor is not None}
@@ -0,0 +1,186 @@
+"""
+Connection pool telemetry.
+
+Every pool built by ``database._build_engine`` is a ``TimedQueuePool``,
+which records how long each checkout took, how long opening a new
+connection took and how many checkouts timed out. ``instrument_engine``
+registers the pool under a name (``primary``, ``replica0``, ...). The
+counters live in a ``PoolTelemetry`` object that is kept when the pool is
+recreated by ``Engine.dispose``.
+
+``snapshot`` reports the live pool state with the counters, for the
+``/admin/db-pool`` endpoint. ``render`` reports them as Prometheus text for
+``/metrics``.
+"""
+import threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy.engine import Engine
+
+# Checkout and connect latencies, in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus layout."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def state(self) -> Tuple[List[int], float]:
+        """``(cumulative counts per bucket plus +Inf, sum)``."""
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile (0 when empty)."""
+        cumulative, _ = self.state()
+        if not cumulative[-1]:
+            return 0.0
+        rank = q * cumulative[-1]
+        for bound, count in zip(self.buckets, cumulative):
+            if count >= rank:
+                return bound
+        return float("inf")
+
+    def summary(self) -> Dict[str, Any]:
+        cumulative, total = self.state()
+        count = cumulative[-1]
+        return {
+            "count": count,
+            "avg_ms": round(total / count * 1000, 3) if count else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p90_ms": self.quantile(0.9) * 1000,
+            "p99_ms": self.quantile(0.99) * 1000,
+        }
+
+    def render(self, name: str, labels: str) -> List[str]:
+        cumulative, total = self.state()
+        lines = [
+            f'{name}_bucket{{{labels},le="{bound:g}"}} {count}'
+            for bound, count in zip(self.buckets, cumulative)
+        ]
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative[-1]}')
+        lines.append(f"{name}_sum{{{labels}}} {total:g}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative[-1]}")
+        return lines
+
+
+class PoolTelemetry:
+    """Checkout and connect counters of one pool."""
+
+    def __init__(self):
+        self.checkout = Histogram()
+        self.connect = Histogram()
+        self.timeouts = 0
+        self.connect_errors = 0
+        self._lock = threading.Lock()
+
+    def timed_out(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def connect_failed(self) -> None:
+        with self._lock:
+            self.connect_errors += 1
+
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+
+def register(name: str, engine: Engine) -> None:
+    with _engines_lock:
+        _engines[name] = engine
+
+
+def _pool_state(pool: Any) -> Dict[str, Any]:
+    if not hasattr(pool, "checkedout"):
+        return {}
+    size = pool.size()
+    return {
+        "pool_size": size,
+        "max_overflow": getattr(pool, "_max_overflow", None),
+        "timeout_seconds": pool.timeout(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # QueuePool counts overflow down from -pool_size until the pool is full
+        "overflow": max(0, pool.overflow()),
+        "open": max(0, size + pool.overflow()),
+    }
+
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Live state and counters of every pool created so far."""
+    with _engines_lock:
+        engines = sorted(_engines.items())
+    report = {}
+    for name, engine in engines:
+        pool = engine.pool
+        telemetry = getattr(pool, "telemetry", None)
+        entry = _pool_state(pool)
+        if telemetry is not None:
+            entry.update(
+                timeouts=telemetry.timeouts,
+                connect_errors=telemetry.connect_errors,
+                checkout=telemetry.checkout.summary(),
+                connect=telemetry.connect.summary(),
+            )
+        report[name] = entry
+    return report
+
+
+def render() -> str:
+    """Prometheus text for every pool created so far."""
+    with _engines_lock:
+        engines = sorted(_engines.items())
+    lines: List[str] = []
+    for metric, field, help_text in (
+        ("size", "pool_size", "Connections kept open by the pool"),
+        ("checked_out", "checked_out", "Connections currently in use"),
+        ("overflow", "overflow", "Connections open beyond the pool size"),
+    ):
+        name = f"ratecard_db_pool_{metric}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for pool_name, engine in engines:
+            state = _pool_state(engine.pool)
+            if state:
+                lines.append(f'{name}{{pool="{pool_name}"}} {state[field]}')
+    for field, help_text in (
+        ("timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT"),
+        ("connect_errors", "New connections that failed to open"),
+    ):
+        name = f"ratecard_db_pool_{field}_total"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for pool_name, engine in engines:
+            telemetry = getattr(engine.pool, "telemetry", None)
+            if telemetry is not None:
+                lines.append(f'{name}{{pool="{pool_name}"}} {getattr(telemetry, field)}')
+    for field, help_text in (
+        ("checkout", "Time to check out a connection, including opening a new one"),
+        ("connect", "Time to open a new database connection"),
+    ):
+        name = f"ratecard_db_pool_{field}_seconds"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for pool_name, engine in engines:
+            telemetry = getattr(engine.pool, "telemetry", None)
+            if telemetry is not None:
+                lines.extend(getattr(telemetry, field).render(name, f'pool="{pool_name}"'))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,108 @@
+"""
+Price change tracking.
+
+Every change to a material ``unit_cost``, an equipment ``price`` or a labour
+rate ``cost_per_person`` is written to ``price_change_logs``:
+
+* bulk loads diff the staged price list against the catalog with a single
+  join on the natural key (``staged_price_changes``) and bulk-insert one log
+  row per changed price before the merge UPDATE runs;
+* single-row ORM updates are picked up by a session ``after_flush`` hook from
+  the attribute history of the flushed objects.
+
+``changed_by`` and ``change_reason`` for the ORM path are read from
+``session.info`` (see ``attribute_price_changes``).
+"""
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Type
+
+from sqlalchemy import Table, and_, event, inspect, insert, select
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+class TrackedPrice:
+    def __init__(self, entity_type: str, column: str, name_columns: Sequence[str], label: Callable[[Any], str]):
+        self.entity_type = entity_type
+        self.column = column
+        self.name_columns = tuple(name_columns)
+        self.label = label
+
+
+TRACKED_PRICES: Dict[Type[models.Base], TrackedPrice] = {
+    models.Material: TrackedPrice("material", "unit_cost", ("name", "sales_part_no"),
+                                  lambda row: row.name or row.sales_part_no),
+    models.Equipment: TrackedPrice("equipment", "price", ("equipment_name", "sales_part_no"),
+                                   lambda row: row.equipment_name or row.sales_part_no or ""),
+    models.LabourRate: TrackedPrice("labor", "cost_per_person", ("labour_type", "state_code"),
+                                    lambda row: f"{row.labour_type} ({row.state_code})"),
+}
+
+ENTITY_TYPES = tuple(tracked.entity_type for tracked in TRACKED_PRICES.values())
+
+
+def _log_row(tracked: TrackedPrice, entity_id: Any, name: str, old_price: float, new_price: float,
+             changed_by: Optional[str], change_reason: Optional[str]) -> Dict[str, Any]:
+    return {
+        "entity_type": tracked.entity_type,
+        "entity_id": str(entity_id),
+        "entity_name": name[:200],
+        "old_price": old_price,
+        "new_price": new_price,
+        "changed_by": changed_by,
+        "change_reason": change_reason,
+    }
+
+
+def staged_price_changes(conn: Connection, model: Type[models.Base], stage: Table, key: Sequence[str],
+                         changed_by: Optional[str] = None, change_reason: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Log rows for every catalog price that ``stage`` would change, from one join on ``key``."""
+    tracked = TRACKED_PRICES[model]
+    target = model.__table__
+    price = tracked.column
+    diff = (
+        select(target.c.id, *(target.c[c] for c in tracked.name_columns),
+               target.c[price].label("old_price"), stage.c[price].label("new_price"))
+        .join_from(target, stage, and_(*(target.c[k] == stage.c[k] for k in key)))
+        .where(target.c[price] != stage.c[price])
+    )
+    return [
+        _log_row(tracked, row.id, tracked.label(row), row.old_price, row.new_price, changed_by, change_reason)
+        for row in conn.execute(diff)
+    ]
+
+
+def log_price_changes(conn: Connection, rows: List[Dict[str, Any]]) -> int:
+    if rows:
+        conn.execute(insert(models.PriceChangeLog.__table__), rows)
+    return len(rows)
+
+
+@contextmanager
+def attribute_price_changes(session: Session, changed_by: Optional[str] = None,
+                            change_reason: Optional[str] = None) -> Iterator[Session]:
+    """Record ``changed_by``/``change_reason`` on price changes flushed inside the block."""
+    previous = {k: session.info.get(k) for k in ("changed_by", "change_reason")}
+    session.info.update(changed_by=changed_by, change_reason=change_reason)
+    try:
+        yield session
+    finally:
+        session.info.update(previous)
+
+
+@event.listens_for(Session, "after_flush")
+def _log_after_flush(session: Session, flush_context: Any) -> None:
+    rows = []
+    for obj in session.dirty:
+        tracked = TRACKED_PRICES.get(type(obj))
+        if tracked is None:
+            continue
+        history = inspect(obj).attrs[tracked.column].history
+        if not history.deleted or not history.added or history.deleted[0] == history.added[0]:
+            continue
+        rows.append(_log_row(tracked, obj.id, tracked.label(obj), history.deleted[0], history.added[0],
+                             session.info.get("changed_by"), session.info.get("change_reason")))
+    if rows:
+        log_price_changes(session.connection(), rows)
@@ -0,0 +1,399 @@
+"""
+Server-side rate card pricing engine.
+
+A ``CalculatorRequest`` is priced in one pass against preloaded rate tables:
+materials and equipment keyed by (state_code, sales_part_no) and by SOR code,
+labour rates keyed by (state_code, labour_type). The tables are built from the
+catalog cache snapshot and rebuilt only when a cached table changes, so
+pricing a quote issues no per-line queries. Requests with ``as_of`` are
+priced against the point-in-time rate card from ``rate_snapshots``.
+"""
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from . import models
+from .catalog_cache import catalog_cache
+from .config import settings
+from .rate_snapshots import resolve_snapshot
+
+CALCULATOR_BATCH_MAX_REQUESTS = settings.calculator_batch_max_requests
+
+# Free-text region names the calculator accepts in place of a state code
+REGION_STATE_CODES = {
+    "NEW SOUTH WALES": "NSW",
+    "VICTORIA": "VIC",
+    "QUEENSLAND": "QLD",
+    "NORTHERN TERRITORY": "NT",
+    "SOUTH AUSTRALIA": "SA",
+    "WESTERN AUSTRALIA": "WA",
+    "TASMANIA": "TAS",
+    "AUSTRALIAN CAPITAL TERRITORY": "ACT",
+}
+
+_MODELS = (models.Material, models.Equipment, models.LabourRate)
+
+
+def _key(value: Any) -> Optional[str]:
+    value = getattr(value, "value", value)  # enum members stored by the seed data
+    if value is None:
+        return None
+    return str(value).strip().upper()
+
+
+def state_code_for_region(region: str) -> str:
+    code = _key(region) or ""
+    return REGION_STATE_CODES.get(code, code)
+
+
+class RateTables:
+    """Catalog rows indexed for constant-time price lookups."""
+
+    def __init__(self, materials: Iterable[Any], equipment: Iterable[Any], labour_rates: Iterable[Any], version: Any = None):
+        self.version = version
+        self.material_by_id: Dict[Any, Any] = {}
+        self.material_by_part: Dict[Tuple[Optional[str], str], Any] = {}
+        self.material_by_sor: Dict[Tuple[Optional[str], str], List[Any]] = {}
+        self.equipment_by_id: Dict[Any, Any] = {}
+        self.equipment_by_part: Dict[Tuple[Optional[str], str], Any] = {}
+        self.equipment_by_sor: Dict[Tuple[Optional[str], str], List[Any]] = {}
+        self.labour_by_id: Dict[Any, Any] = {}
+        self.labour_by_type: Dict[Tuple[Optional[str], str], Any] = {}
+        self._index_catalog(materials, self.material_by_id, self.material_by_part, self.material_by_sor)
+        self._index_catalog(equipment, self.equipment_by_id, self.equipment_by_part, self.equipment_by_sor)
+        for row in labour_rates:
+            self.labour_by_id[row.id] = row
+            labour_type = _key(row.labour_type)
+            if labour_type:
+                self.labour_by_type[(_key(row.state_code), labour_type)] = row
+                self.labour_by_type.setdefault((None, labour_type), row)
+
+    @staticmethod
+    def _index_catalog(rows: Iterable[Any], by_id: Dict, by_part: Dict, by_sor: Dict) -> None:
+        for row in rows:
+            by_id[row.id] = row
+            state = _key(row.state_code)
+            part = _key(row.sales_part_no)
+            if part:
+                by_part[(state, part)] = row
+                # any-state fallback used when the part is not stocked in the region
+                by_part.setdefault((None, part), row)
+            sor = _key(row.sor_code)
+            if sor:
+                by_sor.setdefault((state, sor), []).append(row)
+
+    @staticmethod
+    def _by_part(index: Dict, state: str, part: Optional[str]) -> Optional[Any]:
+        part = _key(part)
+        if not part:
+            return None
+        row = index.get((state, part))
+        return row if row is not None else index.get((None, part))
+
+    def material(self, state: str, item_id: Optional[int], part: Optional[str]) -> Optional[Any]:
+        if item_id is not None:
+            return self.material_by_id.get(item_id)
+        return self._by_part(self.material_by_part, state, part)
+
+    def equipment(self, state: str, item_id: Optional[int], part: Optional[str]) -> Optional[Any]:
+        if item_id is not None:
+            return self.equipment_by_id.get(item_id)
+        return self._by_part(self.equipment_by_part, state, part)
+
+    def labour(self, state: str, item_id: Optional[int], labour_type: Optional[str]) -> Optional[Any]:
+        if item_id is not None:
+            return self.labour_by_id.get(item_id)
+        return self._by_part(self.labour_by_type, state, labour_type)
+
+    def sor_items(self, state: str, sor_code: Optional[str]) -> Tuple[List[Any], List[Any]]:
+        sor = _key(sor_code)
+        if not sor:
+            return [], []
+        return self.material_by_sor.get((state, sor), []), self.equipment_by_sor.get((state, sor), [])
+
+
+_tables: Optional[RateTables] = None
+_tables_lock = threading.Lock()
+
+
+def load_rate_tables(db: Session, state_code: str) -> RateTables:
+    """Rate tables for pricing in ``state_code``.
+
+    Built from the catalog cache and reused until one of the cached tables
+    changes. If a table is too large to cache, only the region's rows are read,
+    in one query per table.
+    """
+    global _tables
+    version = tuple(catalog_cache.version(db, model) for model in _MODELS)
+    current = _tables
+    if current is not None and None not in version and current.version == version:
+        return current
+
+    snapshots = [catalog_cache.snapshot(db, model) for model in _MODELS]
+    if any(snapshot is None for snapshot in snapshots):
+        rows = [
+            snapshot[1] if snapshot is not None
+            else db.query(model).filter(model.state_code == state_code).all()
+            for model, snapshot in zip(_MODELS, snapshots)
+        ]
+        return RateTables(*rows)
+
+    version = tuple(snapshot[0] for snapshot in snapshots)
+    with _tables_lock:
+        if _tables is None or _tables.version != version:
+            _tables = RateTables(*(snapshot[1] for snapshot in snapshots), version=version)
+        return _tables
+
+
+def load_rate_tables_as_of(db: Session, as_of: datetime) -> RateTables:
+    """Rate tables as they were at ``as_of``, built once per resolved snapshot."""
+    snapshot = resolve_snapshot(db, as_of)
+    if snapshot.rate_tables is None:
+        snapshot.rate_tables = RateTables(*(snapshot.rows[model] for model in _MODELS), version=snapshot.key)
+    return snapshot.rate_tables
+
+
+def _tables_for(db: Session, state_code: str, as_of: Optional[datetime]) -> RateTables:
+    return load_rate_tables(db, state_code) if as_of is None else load_rate_tables_as_of(db, as_of)
+
+
+def _line(item_type: str, name: Any, reference: Any, quantity: float, unit_price: float, **extra: Any) -> Dict[str, Any]:
+    line = {
+        "item_type": item_type,
+        "name": name,
+        "reference": reference,
+        "quantity": quantity,
+        "unit_price": unit_price,
+        "total_price": round(unit_price * quantity, 2),
+    }
+    line.update(extra)
+    return line
+
+
+def _price_line(tables: RateTables, state: str, line: Any) -> Optional[Dict[str, Any]]:
+    """Price one ``CalculatorLine``; returns None if it cannot be resolved."""
+    item_type = getattr(line.item_type, "value", line.item_type)
+    override = line.unit_price
+    if item_type == "material":
+        row = tables.material(state, line.item_id, line.reference)
+        if row is not None:
+            unit = row.unit_cost if override is None else override
+            return _line(item_type, line.name or row.name or row.description, row.sales_part_no, line.quantity, unit, item_id=row.id)
+    elif item_type == "equipment":
+        row = tables.equipment(state, line.item_id, line.reference)
+        if row is not None:
+            unit = row.price if override is None else override
+            return _line(item_type, line.name or row.equipment_name, row.sales_part_no, line.quantity, unit, item_id=row.id)
+    elif item_type == "labor":
+        row = tables.labour(state, line.item_id, line.reference)
+        if row is not None:
+            hours = row.hours if line.hours is None else line.hours
+            unit = row.cost_per_person * (hours or 1) if override is None else override
+            return _line(item_type, line.name or row.labour_type, row.labour_type, line.quantity, unit, item_id=row.id, hours=hours)
+    if override is not None:
+        # tasks, external items and uncatalogued parts carry their own price
+        return _line(item_type, line.name or line.reference, line.reference, line.quantity, override)
+    return None
+
+
+def _price_support(tables: RateTables, state: str, item: Any) -> Optional[Dict[str, Any]]:
+    if not isinstance(item, str):
+        return _price_line(tables, state, item)
+    row = tables.material(state, None, item)
+    if row is not None:
+        return _line("material", row.name or row.description, row.sales_part_no, 1, row.unit_cost, item_id=row.id)
+    row = tables.equipment(state, None, item)
+    if row is not None:
+        return _line("equipment", row.equipment_name, row.sales_part_no, 1, row.price, item_id=row.id)
+    return None
+
+
+def price_request(request: Any, tables: RateTables) -> Dict[str, Any]:
+    """Price a ``CalculatorRequest`` against ``tables``.
+
+    Returns the fields of a ``CalculatorResponse``. Without explicit ``lines``
+    the request's SOR code is expanded into the region's materials and
+    equipment carrying that code.
+    """
+    state = state_code_for_region(request.region)
+    lines: List[Dict[str, Any]] = []
+    unresolved: List[Dict[str, Any]] = []
+    totals = {"material": 0.0, "equipment": 0.0, "labor": 0.0}
+    other_total = 0.0
+
+    if request.lines:
+        for line in request.lines:
+            priced = _price_line(tables, state, line)
+            if priced is None:
+                unresolved.append({"item_type": getattr(line.item_type, "value", line.item_type), "reference": line.reference, "item_id": line.item_id})
+                continue
+            lines.append(priced)
+    else:
+        sor_materials, sor_equipment = tables.sor_items(state, request.sor_code)
+        for row in sor_materials:
+            lines.append(_line("material", row.name or row.description, row.sales_part_no, row.qty or 1, row.unit_cost, item_id=row.id))
+        for row in sor_equipment:
+            lines.append(_line("equipment", row.equipment_name, row.sales_part_no, 1, row.price, item_id=row.id))
+
+    for priced in lines:
+        if priced["item_type"] in totals:
+            totals[priced["item_type"]] += priced["total_price"]
+        else:
+            other_total += priced["total_price"]
+    base_amount = sum(totals.values()) + other_total
+
+    support_lines: List[Dict[str, Any]] = []
+    for item in request.additional_support:
+        priced = _price_support(tables, state, item)
+        if priced is None:
+            unresolved.append({"item_type": "support", "reference": item if isinstance(item, str) else item.reference})
+            continue
+        support_lines.append(priced)
+    support_amount = sum(line["total_price"] for line in support_lines)
+
+    external_lines: List[Dict[str, Any]] = []
+    for cost in request.external_costs:
+        if not cost.is_enabled:
+            continue
+        amount = cost.amount
+        if cost.percentage:
+            amount += (base_amount + support_amount) * cost.percentage / 100
+        external_lines.append({"cost_type": cost.cost_type, "description": cost.description, "amount": round(amount, 2)})
+    external_amount = sum(line["amount"] for line in external_lines)
+
+    pre_risk = base_amount + support_amount + external_amount
+    risk_multiplier = 1 + request.risk_uplift / 100
+    subtotal = pre_risk * risk_multiplier
+    tax_amount = subtotal * request.tax_rate / 100
+    total_amount = subtotal + tax_amount
+
+    return {
+        "base_amount": round(base_amount, 2),
+        "support_amount": round(support_amount, 2),
+        "subtotal": round(subtotal, 2),
+        "total_amount": round(total_amount, 2),
+        "breakdown": {
+            "region": request.region,
+            "state_code": state,
+            "product_sor": request.product_sor,
+            "sor_code": request.sor_code,
+            "sor_description": request.sor_description,
+            "as_of": request.as_of,
+            "lines": lines,
+            "support_lines": support_lines,
+            "external_costs": external_lines,
+            "unresolved": unresolved,
+            "materials_total": round(totals["material"], 2),
+            "equipment_total": round(totals["equipment"], 2),
+            "labor_total": round(totals["labor"], 2),
+            "other_total": round(other_total, 2),
+            "base_rate": round(base_amount, 2),
+            "support_items": round(support_amount, 2),
+            "external_total": round(external_amount, 2),
+            "risk_uplift_percent": request.risk_uplift,
+            "risk_multiplier": risk_multiplier,
+            "risk_amount": round(subtotal - pre_risk, 2),
+            "tax_rate": request.tax_rate,
+            "tax_amount": round(tax_amount, 2),
+        },
+    }
+
+
+def price_calculator_request(db: Session, request: Any) -> Dict[str, Any]:
+    return price_request(request, _tables_for(db, state_code_for_region(request.region), request.as_of))
+
+
+def price_batch(db: Session, requests: List[Any]) -> Iterator[Dict[str, Any]]:
+    """Price many requests, loading the rate tables of each region and ``as_of`` once up front.
+
+    Pricing itself is lazy so results can be streamed as they are produced.
+    """
+    keys = {(state_code_for_region(r.region), r.as_of) for r in requests}
+    tables = {key: _tables_for(db, *key) for key in keys}
+    return (price_request(r, tables[(state_code_for_region(r.region), r.as_of)]) for r in requests)
+
+
+# ----------------------------- benchmark -----------------------------
+def _synthetic_tables(catalog_rows: int) -> RateTables:
+    from collections import namedtuple
+
+    states = list(REGION_STATE_CODES.values())
+    material = namedtuple("Material", "id sales_part_no name description state_code qty unit_cost sor_code")
+    equipment = namedtuple("Equipment", "id sales_part_no equipment_name state_code price sor_code")
+    labour = namedtuple("LabourRate", "id labour_type cost_per_person hours state_code")
+    return RateTables(
+        [material(i, f"MAT-{i}", f"Material {i}", "", states[i % 8], 1, 10.0 + i % 50, f"SOR-{i % 100}") for i in range(catalog_rows)],
+        [equipment(i, f"EQ-{i}", f"Equipment {i}", states[i % 8], 100.0 + i % 70, f"SOR-{i % 100}") for i in range(catalog_rows // 4)],
+        [labour(i, f"Role {i % 20}", 75.0 + i % 20, 8, states[i % 8]) for i in range(160)],
+    )
+
+
+def _synthetic_request(lines: int, catalog_rows: int, seed: int = 0) -> Any:
+    from . import schemas
+
+    kinds = ("material", "equipment", "labor")
+    return schemas.CalculatorRequest(
+        client_name="Benchmark",
+        region=list(REGION_STATE_CODES)[seed % 8],
+        product_sor="Benchmark SOR",
+        risk_uplift=5,
+        lines=[
+            schemas.CalculatorLine(
+                item_type=kinds[i % 3],
+                reference=(f"MAT-{(i + seed) * 8 % catalog_rows}", f"EQ-{(i + seed) * 8 % (catalog_rows // 4)}", f"Role {i % 20}")[i % 3],
+                quantity=1 + i % 5,
+            )
+            for i in range(lines)
+        ],
+        additional_support=[f"MAT-{i}" for i in range(0, 80, 8)],
+        external_costs=[schemas.CalculatorExternalCost(cost_type="crane_fee", amount=450.0),
+                        schemas.CalculatorExternalCost(cost_type="risk_rate", percentage=2.5)],
+    )
+
+
+def benchmark(lines: int = 500, catalog_rows: int = 20000, repeat: int = 200) -> Dict[str, float]:
+    """Time ``price_request`` on a synthetic ``lines``-line quote (no database needed).
+
+    Run with ``python -m <package>.pricing``.
+    """
+    tables = _synthetic_tables(catalog_rows)
+    request = _synthetic_request(lines, catalog_rows)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        price_request(request, tables)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        "lines": lines,
+        "median_ms": round(timings[len(timings) // 2] * 1000, 3),
+        "p95_ms": round(timings[int(len(timings) * 0.95)] * 1000, 3),
+    }
+
+
+def benchmark_batch(requests: int = 800, lines: int = 50, catalog_rows: int = 20000) -> Dict[str, float]:
+    """Throughput of batch pricing: ``requests`` quotes spread over all eight regions."""
+    tables = _synthetic_tables(catalog_rows)
+    batch = [_synthetic_request(lines, catalog_rows, seed) for seed in range(requests)]
+    started = time.perf_counter()
+    for _ in (price_request(request, tables) for request in batch):
+        pass
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": requests,
+        "lines": requests * lines,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "requests_per_second": round(requests / elapsed),
+        "lines_per_second": round(requests * lines / elapsed),
+    }
+
+
+if __name__ == "__main__":
+    result = benchmark()
+    print(f"priced {result['lines']} lines: median {result['median_ms']} ms, p95 {result['p95_ms']} ms")
+    result = benchmark_batch()
+    print(f"priced a batch of {result['requests']} requests ({result['lines']} lines) in {result['elapsed_ms']} ms: "
+          f"{result['requests_per_second']} requests/s, {result['lines_per_second']} lines/s")
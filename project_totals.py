@@ -0,0 +1,123 @@
+"""
+Project cost totals.
+
+``totals_select`` computes materials, equipment, labour and external cost
+totals for any number of projects in a single aggregated statement. The
+results are materialised in the ``project_totals`` rollup table, which a
+session ``after_flush`` hook refreshes for every project whose lines (or the
+project itself) were inserted, updated or deleted in the flush. Whichever
+code path mutates the lines, dashboards read the totals instead of
+recomputing them.
+
+External costs count like the calculator prices them: the fixed ``amount``
+plus ``percentage`` of the project's material, equipment and labour total.
+"""
+from itertools import chain
+from typing import Any, Dict, Iterable, Optional, Set
+
+from sqlalchemy import delete, event, exists, func, inspect, insert, select, true
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from . import models
+
+TOTAL_COLUMNS = ("total_materials", "total_equipment", "total_labor", "total_external", "grand_total")
+
+# Line tables that feed the rollup
+_LINE_MODELS = (models.ProjectMaterial, models.ProjectEquipment, models.ProjectLabor, models.ProjectExternalCost)
+
+
+def _line_sum(model: Any, column: str, *criteria: Any) -> Any:
+    total = select(func.sum(getattr(model, column))).where(model.project_id == models.Project.id, *criteria)
+    return func.coalesce(total.scalar_subquery(), 0.0)
+
+
+def totals_select(project_ids: Optional[Iterable[str]] = None) -> Select:
+    """One statement returning ``project_id`` and the total columns per project."""
+    per_type = select(
+        models.Project.id.label("project_id"),
+        _line_sum(models.ProjectMaterial, "total_price").label("total_materials"),
+        _line_sum(models.ProjectEquipment, "total_price").label("total_equipment"),
+        _line_sum(models.ProjectLabor, "total_cost").label("total_labor"),
+        _line_sum(models.ProjectExternalCost, "amount", models.ProjectExternalCost.is_enabled.isnot(False)).label("external_amount"),
+        _line_sum(models.ProjectExternalCost, "percentage", models.ProjectExternalCost.is_enabled.isnot(False)).label("external_percentage"),
+    )
+    if project_ids is not None:
+        per_type = per_type.where(models.Project.id.in_(list(project_ids)))
+    sub = per_type.subquery()
+    lines_total = sub.c.total_materials + sub.c.total_equipment + sub.c.total_labor
+    total_external = sub.c.external_amount + lines_total * sub.c.external_percentage / 100.0
+    return select(
+        sub.c.project_id,
+        sub.c.total_materials,
+        sub.c.total_equipment,
+        sub.c.total_labor,
+        total_external.label("total_external"),
+        (lines_total + total_external).label("grand_total"),
+    )
+
+
+def refresh_project_totals(bind: Any, project_ids: Optional[Iterable[str]] = None) -> None:
+    """Recompute the rollup rows of ``project_ids`` (all projects if None).
+
+    ``bind`` is a Session or Connection; the caller owns the transaction.
+    Rows are upserted on ``project_id``, so two transactions refreshing the
+    same project cannot both insert it; rows of deleted projects are removed.
+    """
+    ids = None if project_ids is None else list(project_ids)
+    if ids == []:
+        return
+    table = models.ProjectTotals.__table__
+    dialect = bind.get_bind().dialect.name if isinstance(bind, Session) else bind.dialect.name
+    # SQLite needs a WHERE on INSERT ... SELECT ... ON CONFLICT to parse it
+    computed = totals_select(ids).where(true())
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = upsert(table).from_select(["project_id", *TOTAL_COLUMNS], computed)
+        bind.execute(stmt.on_conflict_do_update(
+            index_elements=[table.c.project_id],
+            set_={**{c: stmt.excluded[c] for c in TOTAL_COLUMNS}, "updated_at": func.now()},
+        ))
+        orphaned = delete(table).where(~exists().where(models.Project.id == table.c.project_id))
+        if ids is not None:
+            orphaned = orphaned.where(table.c.project_id.in_(ids))
+        bind.execute(orphaned)
+        return
+    clear = delete(table)
+    if ids is not None:
+        clear = clear.where(table.c.project_id.in_(ids))
+    bind.execute(clear)
+    bind.execute(insert(table).from_select(["project_id", *TOTAL_COLUMNS], computed))
+
+
+def compute_project_totals(db: Session, project_id: str) -> Optional[Dict[str, float]]:
+    """Totals straight from the line tables, without touching the rollup."""
+    row = db.execute(totals_select([project_id])).first()
+    return dict(row._mapping) if row is not None else None
+
+
+def _touched_projects(session: Session) -> Set[str]:
+    project_ids: Set[str] = set()
+    for obj in chain(session.new, session.deleted):
+        if isinstance(obj, models.Project):
+            # new projects get a zero row up front; deleted ones have theirs removed
+            project_ids.add(obj.id)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, _LINE_MODELS):
+            project_ids.add(obj.project_id)
+            # a line moved to another project changes the old project as well
+            project_ids.update(inspect(obj).attrs.project_id.history.deleted or ())
+    project_ids.discard(None)
+    return project_ids
+
+
+@event.listens_for(Session, "after_flush")
+def _refresh_after_flush(session: Session, flush_context: Any) -> None:
+    project_ids = _touched_projects(session)
+    if project_ids:
+        connection: Connection = session.connection()
+        refresh_project_totals(connection, project_ids)
@@ -0,0 +1,142 @@
+"""
+Query budgets for the list endpoints.
+
+The list endpoints load their rows with the ``list`` profile of
+load_profiles.py and serialise them through their response schemas. A
+nested relationship the profile misses becomes one lazy load per row, so
+``QUERY_BUDGETS`` fixes the number of statements one page may cost,
+however many rows it holds.
+
+``check_endpoint`` serves one endpoint under ``assert_query_budget``;
+test_query_budget.py runs it for every endpoint over a few seeded pages of
+rows in in-memory SQLite. ``python -m <package>.query_budget [DATABASE_URL]``
+runs the same check against another empty scratch database and exits
+non-zero on a regression.
+"""
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Tuple, Type
+
+from pydantic import BaseModel
+from sqlalchemy import create_engine, insert, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas
+from .load_profiles import assert_query_budget
+
+# Statements one page of each list endpoint may execute
+QUERY_BUDGETS: Dict[str, int] = {
+    "GET /projects": 1,
+    "GET /projects/page": 1,
+    "GET /quotes": 2,
+    "GET /quotes/page": 2,
+    "GET /notifications": 1,
+    "GET /notifications/page": 1,
+    "GET /notifications/unread": 1,
+    "GET /notifications/unread/page": 1,
+    "GET /audit-logs": 1,
+    "GET /audit-logs/page": 1,
+    "GET /price-changes": 1,
+    "GET /price-changes/page": 1,
+}
+PAGE_SIZE = 50
+
+
+def endpoints(sample: Dict[str, str]) -> Dict[str, Tuple[Callable[[Session], List[Any]], Type[BaseModel]]]:
+    """``{endpoint: (load one page, response schema)}`` for every budgeted endpoint."""
+    user_id = sample["user_id"]
+    return {
+        "GET /projects": (lambda db: crud.get_projects(db, limit=PAGE_SIZE), schemas.ProjectResponse),
+        "GET /projects/page": (lambda db: crud.get_projects_page(db, limit=PAGE_SIZE)[0], schemas.ProjectResponse),
+        "GET /quotes": (lambda db: crud.get_quotes(db, limit=PAGE_SIZE), schemas.QuoteResponse),
+        "GET /quotes/page": (lambda db: crud.get_quotes_page(db, limit=PAGE_SIZE)[0], schemas.QuoteResponse),
+        "GET /notifications": (
+            lambda db: crud.get_notifications(db, user_id, limit=PAGE_SIZE), schemas.NotificationResponse
+        ),
+        "GET /notifications/page": (
+            lambda db: crud.get_notifications_page(db, user_id, limit=PAGE_SIZE)[0], schemas.NotificationResponse
+        ),
+        "GET /notifications/unread": (
+            lambda db: crud.get_unread_notifications(db, user_id, limit=PAGE_SIZE), schemas.NotificationResponse
+        ),
+        "GET /notifications/unread/page": (
+            lambda db: crud.get_unread_notifications_page(db, user_id, limit=PAGE_SIZE)[0], schemas.NotificationResponse
+        ),
+        "GET /audit-logs": (lambda db: crud.get_audit_logs(db, limit=PAGE_SIZE), schemas.AuditLogResponse),
+        "GET /audit-logs/page": (lambda db: crud.get_audit_logs_page(db, limit=PAGE_SIZE)[0], schemas.AuditLogResponse),
+        "GET /price-changes": (lambda db: crud.get_price_changes(db, limit=PAGE_SIZE), schemas.PriceChangeLogResponse),
+        "GET /price-changes/page": (
+            lambda db: crud.get_price_changes_page(db, limit=PAGE_SIZE)[0], schemas.PriceChangeLogResponse
+        ),
+    }
+
+
+def check_endpoint(bind: Engine, endpoint: str, sample: Dict[str, str]) -> None:
+    """Serve one page of ``endpoint``; AssertionError listing the statements if it goes over budget."""
+    load, schema = endpoints(sample)[endpoint]
+    # a fresh session per endpoint, so nothing is served from the identity map
+    with Session(bind) as db:
+        with assert_query_budget(bind, QUERY_BUDGETS[endpoint]):
+            [schema.model_validate(row) for row in load(db)]
+
+
+def check_query_budgets(bind: Engine, sample: Dict[str, str]) -> Dict[str, str]:
+    """``{endpoint: statements executed}`` for every endpoint over its budget."""
+    regressions = {}
+    for endpoint in QUERY_BUDGETS:
+        try:
+            check_endpoint(bind, endpoint, sample)
+        except AssertionError as exc:
+            regressions[endpoint] = str(exc)
+    return regressions
+
+
+# ----------------------------- seeding -----------------------------
+def seed(bind: Engine, rows: int = 2 * PAGE_SIZE, users: int = 10, items_per_quote: int = 5) -> Dict[str, str]:
+    """Create the schema in an empty scratch database and fill a few pages of every list; returns sample ids."""
+    models.Base.metadata.create_all(bind)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    user_ids = [str(uuid.uuid4()) for _ in range(users)]
+    quote_ids = [str(uuid.uuid4()) for _ in range(rows)]
+
+    def at(n: int) -> datetime:
+        return start + timedelta(hours=n)
+
+    plan = [
+        (models.User, [{"id": user_ids[n], "username": f"user{n}", "email": f"user{n}@example.com",
+                        "password_hash": "x"} for n in range(users)]),
+        (models.Project, [{"id": str(uuid.uuid4()), "name": f"Project {n}", "manager_id": user_ids[n % users],
+                           "created_at": at(n)} for n in range(rows)]),
+        (models.Quote, [{"id": quote_ids[n], "quote_number": f"Q-{n:07d}", "client_name": f"Client {n}",
+                         "project_name": f"Quote project {n}", "created_by": user_ids[n % users],
+                         "created_at": at(n)} for n in range(rows)]),
+        (models.QuoteItem, [{"id": str(uuid.uuid4()), "quote_id": quote_ids[n // items_per_quote],
+                             "item_type": models.QuoteItemType.MATERIAL, "item_name": f"Item {n}",
+                             "unit_price": 10.0, "total_price": 10.0} for n in range(rows * items_per_quote)]),
+        (models.Notification, [{"id": str(uuid.uuid4()), "user_id": user_ids[0], "type": models.NotificationType.SYSTEM,
+                                "title": "Notice", "message": "Seeded", "is_read": n % 2 == 0,
+                                "created_at": at(n)} for n in range(rows * 2)]),
+        (models.AuditLog, [{"id": str(uuid.uuid4()), "user_id": user_ids[n % users], "action": "update",
+                            "entity_type": "quote", "entity_id": quote_ids[n], "created_at": at(n)} for n in range(rows)]),
+        (models.PriceChangeLog, [{"id": str(uuid.uuid4()), "entity_type": "material", "entity_id": str(n),
+                                  "entity_name": f"Item {n}", "old_price": 1.0, "new_price": 2.0,
+                                  "changed_by": user_ids[n % users], "created_at": at(n)} for n in range(rows)]),
+    ]
+    with bind.begin() as conn:
+        for model, model_rows in plan:
+            conn.execute(insert(model.__table__), model_rows)
+    return {"user_id": user_ids[0]}
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "sqlite://"
+    engine = create_engine(url)
+    if inspect(engine).get_table_names():
+        sys.exit(f"{url} already has tables; point the check at an empty scratch database")
+    found = check_query_budgets(engine, seed(engine))
+    for endpoint, failure in found.items():
+        print(f"OVER BUDGET  {endpoint}: {failure}")
+    print(f"{len(QUERY_BUDGETS) - len(found)} endpoints within budget, {len(found)} regressions")
+    sys.exit(1 if found else 0)
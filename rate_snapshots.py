@@ -0,0 +1,231 @@
+"""
+Point-in-time rate card snapshots.
+
+A snapshot is an immutable copy of the materials, equipment and labour rate
+tables, stored in ``rate_card_snapshots`` as one zlib-compressed JSON
+document: per table, the column names and, per state code, one array per
+column. Snapshots are taken on demand and after every bulk import that
+changed prices.
+
+``resolve_snapshot`` answers "what were the rates at ``as_of``": it starts
+from the nearest snapshot (the latest one at or before ``as_of``, else the
+earliest one after it) and replays the ``price_change_logs`` entries between
+the snapshot and ``as_of`` onto it, so single-row price edits made between
+snapshots are honoured as well. Only prices are replayed: catalog rows
+inserted or deleted between a snapshot and ``as_of`` are not logged, so such
+reads show the row set of the nearest snapshot. Take a snapshot after adding
+or removing rows when historical reads must reflect them. Decoded snapshots
+are kept in a small LRU cache; they never change, so cached entries are never
+invalidated.
+
+Snapshots are built from the tables themselves, not the process-local
+catalog cache, which may lag writes made by other workers.
+"""
+import json
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from datetime import date, datetime, timezone
+from enum import Enum
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple, Type
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .price_changes import TRACKED_PRICES
+
+RATE_SNAPSHOT_CACHE_SIZE = settings.rate_snapshot_cache_size
+
+SNAPSHOT_TABLES: Tuple[Tuple[str, Type[models.Base]], ...] = (
+    ("materials", models.Material),
+    ("equipment", models.Equipment),
+    ("labour_rates", models.LabourRate),
+)
+
+_MODEL_BY_ENTITY_TYPE = {tracked.entity_type: model for model, tracked in TRACKED_PRICES.items()}
+
+
+class SnapshotNotFound(LookupError):
+    pass
+
+
+def _utc(value: datetime) -> datetime:
+    """Aware UTC datetime; naive values (SQLite) are taken to be UTC already."""
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+# ----------------------------- encoding -----------------------------
+def _catalog_tables(db: Session) -> Dict[str, Sequence[Tuple]]:
+    """Current rows of every snapshot table, read in the caller's transaction."""
+    if db.get_bind().dialect.name == "postgresql" and not db.in_transaction():
+        # one MVCC snapshot for all three tables, so a concurrent import cannot split them
+        db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    tables = {}
+    for name, model in SNAPSHOT_TABLES:
+        table = model.__table__
+        tables[name] = db.execute(select(*table.columns).order_by(table.c.id)).all()
+    return tables
+
+
+def encode_catalog(tables: Dict[str, Sequence[Tuple]]) -> bytes:
+    """Columnar, per-state encoding of ``{table name: rows}`` (rows in table column order)."""
+    document = {}
+    for name, model in SNAPSHOT_TABLES:
+        columns = [column.name for column in model.__table__.columns]
+        states: Dict[str, List[List[Any]]] = {}
+        for row in tables[name]:
+            arrays = states.setdefault(row.state_code or "", [[] for _ in columns])
+            for array, value in zip(arrays, row):
+                array.append(_plain(value))
+        document[name] = {"columns": columns, "states": states}
+    return zlib.compress(json.dumps(document, separators=(",", ":")).encode("utf-8"), 6)
+
+
+class RateSnapshot:
+    """Decoded snapshot rows, sorted by id and indexed by id, per model."""
+
+    def __init__(self, key: Hashable, created_at: datetime, rows: Dict[Type[models.Base], List[Tuple]]):
+        self.key = key
+        self.created_at = created_at
+        self.rows = rows
+        self.by_id = {model: {row.id: row for row in model_rows} for model, model_rows in rows.items()}
+        # filled in by pricing.load_rate_tables_as_of
+        self.rate_tables: Any = None
+
+    @classmethod
+    def decode(cls, snapshot_id: int, created_at: datetime, payload: bytes) -> "RateSnapshot":
+        document = json.loads(zlib.decompress(payload))
+        rows = {}
+        for name, model in SNAPSHOT_TABLES:
+            section = document[name]
+            row_type = namedtuple(f"Snapshot{model.__name__}", section["columns"])
+            decoded = [row_type(*values) for arrays in section["states"].values() for values in zip(*arrays)]
+            decoded.sort(key=lambda row: row.id)
+            rows[model] = decoded
+        return cls(snapshot_id, created_at, rows)
+
+    def with_prices(self, key: Hashable, prices: Dict[Tuple[Type[models.Base], str], float]) -> "RateSnapshot":
+        """Copy of this snapshot with ``{(model, str(id)): price}`` applied."""
+        rows = {}
+        for model, model_rows in self.rows.items():
+            column = TRACKED_PRICES[model].column
+            rows[model] = [
+                row._replace(**{column: prices[(model, str(row.id))]}) if (model, str(row.id)) in prices else row
+                for row in model_rows
+            ]
+        return RateSnapshot(key, self.created_at, rows)
+
+
+class SnapshotCache:
+    """Small LRU of decoded snapshots keyed by snapshot id plus the replayed changes."""
+
+    def __init__(self, size: int = RATE_SNAPSHOT_CACHE_SIZE):
+        self.size = max(1, size)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, RateSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, build: Callable[[], RateSnapshot]) -> RateSnapshot:
+        with self._lock:
+            snapshot = self._entries.get(key)
+            if snapshot is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return snapshot
+            self.misses += 1
+        snapshot = build()
+        with self._lock:
+            self._entries[key] = snapshot
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "size": self.size, "hits": self.hits, "misses": self.misses}
+
+
+snapshot_cache = SnapshotCache()
+
+
+# ----------------------------- create / resolve -----------------------------
+def create_snapshot(db: Session, reason: Optional[str] = None) -> models.RateCardSnapshot:
+    """Capture the current catalog as a new immutable snapshot."""
+    tables = _catalog_tables(db)
+    payload = encode_catalog(tables)
+    snapshot = models.RateCardSnapshot(
+        reason=reason,
+        material_count=len(tables["materials"]),
+        equipment_count=len(tables["equipment"]),
+        labour_rate_count=len(tables["labour_rates"]),
+        payload_bytes=len(payload),
+        payload=payload,
+    )
+    db.add(snapshot)
+    db.commit()
+    db.refresh(snapshot)
+    return snapshot
+
+
+def _nearest_snapshot(db: Session, as_of: datetime) -> Any:
+    table = models.RateCardSnapshot
+    columns = (table.id, table.created_at)
+    row = (
+        db.query(*columns).filter(table.created_at <= as_of)
+        .order_by(table.created_at.desc(), table.id.desc()).first()
+    )
+    if row is None:
+        row = db.query(*columns).order_by(table.created_at.asc(), table.id.asc()).first()
+    if row is None:
+        raise SnapshotNotFound("No rate card snapshot has been taken yet")
+    return row
+
+
+def _load(db: Session, snapshot_id: int) -> RateSnapshot:
+    table = models.RateCardSnapshot
+    row = db.query(table.id, table.created_at, table.payload).filter(table.id == snapshot_id).one()
+    return RateSnapshot.decode(row.id, row.created_at, row.payload)
+
+
+def _price_changes_between(db: Session, start: datetime, end: datetime, forward: bool) -> List[Any]:
+    log = models.PriceChangeLog
+    order = (log.created_at.asc(), log.id.asc()) if forward else (log.created_at.desc(), log.id.desc())
+    return (
+        db.query(log.id, log.entity_type, log.entity_id, log.old_price, log.new_price)
+        .filter(log.created_at > start, log.created_at <= end)
+        .order_by(*order).all()
+    )
+
+
+def resolve_snapshot(db: Session, as_of: datetime) -> RateSnapshot:
+    """The catalog as it was priced at ``as_of``."""
+    as_of = _utc(as_of)
+    nearest = _nearest_snapshot(db, as_of)
+    base = snapshot_cache.get(nearest.id, lambda: _load(db, nearest.id))
+    taken_at = _utc(nearest.created_at)
+    forward = taken_at <= as_of
+    # replay changes made after the snapshot, or undo those made after as_of
+    changes = _price_changes_between(db, *((taken_at, as_of) if forward else (as_of, taken_at)), forward)
+    if not changes:
+        return base
+    prices: Dict[Tuple[Type[models.Base], str], float] = {}
+    for change in changes:
+        model = _MODEL_BY_ENTITY_TYPE.get(change.entity_type)
+        if model is not None:
+            prices[(model, change.entity_id)] = change.new_price if forward else change.old_price
+    key = (nearest.id, forward, len(changes), changes[-1].id)
+    return snapshot_cache.get(key, lambda: base.with_prices(key, prices))
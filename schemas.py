@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field, validator
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Union
 from datetime import datetime
 from enum import Enum
 
@@ -140,10 +140,12 @@ class MaterialSearch(BaseSchema):
     state_code: Optional[str] = None
     min_price: Optional[float] = None
     max_price: Optional[float] = None
+    skip: int = Field(0, ge=0)
+    limit: int = Field(100, ge=1, le=1000)
 
 # Equipment schemas
 class EquipmentBase(BaseSchema):
-    task_id: Optional[int] = None
+    task_id: Optional[str] = None
     sales_part_no: str = Field(..., max_length=50)
     equipment_name: str
     category: str = Field(..., max_length=100)
@@ -156,7 +158,7 @@ class EquipmentCreate(EquipmentBase):
     pass
 
 class EquipmentUpdate(BaseSchema):
-    task_id: Optional[int] = None
+    task_id: Optional[str] = None
     sales_part_no: Optional[str] = Field(None, max_length=50)
     equipment_name: Optional[str] = None
     category: Optional[str] = Field(None, max_length=100)
@@ -176,6 +178,8 @@ class EquipmentSearch(BaseSchema):
     state_code: Optional[str] = None
     min_price: Optional[float] = None
     max_price: Optional[float] = None
+    skip: int = Field(0, ge=0)
+    limit: int = Field(100, ge=1, le=1000)
 
 # Labour Rate schemas
 class LabourRateBase(BaseSchema):
@@ -249,12 +253,12 @@ class ProjectMaterialBase(BaseSchema):
 
 class ProjectMaterialCreate(ProjectMaterialBase):
     project_id: str
-    material_id: str
+    material_id: int
 
 class ProjectMaterialResponse(ProjectMaterialBase):
     id: str
     project_id: str
-    material_id: str
+    material_id: int
     created_at: datetime
     material: Optional[MaterialResponse] = None
 
@@ -265,12 +269,12 @@ class ProjectEquipmentBase(BaseSchema):
 
 class ProjectEquipmentCreate(ProjectEquipmentBase):
     project_id: str
-    equipment_id: str
+    equipment_id: int
 
 class ProjectEquipmentResponse(ProjectEquipmentBase):
     id: str
     project_id: str
-    equipment_id: str
+    equipment_id: int
     created_at: datetime
     equipment: Optional[EquipmentResponse] = None
 
@@ -283,14 +287,14 @@ class ProjectLaborBase(BaseSchema):
 
 class ProjectLaborCreate(ProjectLaborBase):
     project_id: str
-    labour_role_id: str
+    labour_rate_id: int
 
 class ProjectLaborResponse(ProjectLaborBase):
     id: str
     project_id: str
-    labour_role_id: str
+    labour_rate_id: int
     created_at: datetime
-    labour_role: Optional[LabourRoleResponse] = None
+    labour_rate: Optional[LabourRateResponse] = None
 
 class ProjectTaskBase(BaseSchema):
     name: str = Field(..., max_length=200)
@@ -431,6 +435,14 @@ class ProjectSummaryResponse(BaseSchema):
     total_external: float = 0.0
     grand_total: float = 0.0
 
+class ProjectTotalsResponse(BaseSchema):
+    project_id: str
+    total_materials: float = 0.0
+    total_equipment: float = 0.0
+    total_labor: float = 0.0
+    total_external: float = 0.0
+    grand_total: float = 0.0
+
 # Dashboard schemas
 class DashboardStats(BaseSchema):
     total_projects: int
@@ -471,7 +483,7 @@ class PaginationParams(BaseSchema):
     page: int = Field(1, ge=1)
     size: int = Field(20, ge=1, le=100)
     sort_by: Optional[str] = None
-    sort_order: Optional[str] = Field("asc", regex="^(asc|desc)$")
+    sort_order: Optional[str] = Field("asc", pattern="^(asc|desc)$")
 
 # API Response schemas
 class APIResponse(BaseSchema):
@@ -486,6 +498,12 @@ class PaginatedResponse(BaseSchema):
     size: int
     pages: int
 
+class CursorPaginatedResponse(BaseSchema):
+    items: List[Any]
+    size: int
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+
 # Quote schemas
 class QuoteItemBase(BaseSchema):
     item_type: QuoteItemType
@@ -574,6 +592,22 @@ class QuoteSummaryResponse(BaseSchema):
     created_by_user: Optional[UserResponse] = None
 
 # Calculator schemas
+class CalculatorLine(BaseSchema):
+    item_type: QuoteItemType
+    reference: Optional[str] = Field(None, max_length=200)  # sales_part_no, or labour_type for labor lines
+    item_id: Optional[int] = None
+    name: Optional[str] = Field(None, max_length=200)
+    quantity: float = Field(1.0, ge=0)
+    hours: Optional[float] = Field(None, ge=0)  # labor only; defaults to the rate's hours
+    unit_price: Optional[float] = Field(None, ge=0)  # overrides the catalog price
+
+class CalculatorExternalCost(BaseSchema):
+    cost_type: str = Field(..., max_length=50)  # 'crane_fee', 'risk_rate', etc.
+    description: Optional[str] = Field(None, max_length=200)
+    amount: float = Field(0.0, ge=0)
+    percentage: Optional[float] = Field(None, ge=0, le=100)  # of the base + support amount
+    is_enabled: bool = True
+
 class CalculatorRequest(BaseSchema):
     client_name: str = Field(..., max_length=200)
     region: str = Field(..., max_length=50)
@@ -581,7 +615,11 @@ class CalculatorRequest(BaseSchema):
     sor_code: Optional[str] = Field(None, max_length=100)
     sor_description: Optional[str] = None
     risk_uplift: float = Field(0.0, ge=0, le=100)
-    additional_support: List[str] = []
+    tax_rate: float = Field(10.0, ge=0, le=100)
+    lines: List[CalculatorLine] = []
+    additional_support: List[Union[str, CalculatorLine]] = []
+    external_costs: List[CalculatorExternalCost] = []
+    as_of: Optional[datetime] = None  # price at the rates in force at this time
 
 class CalculatorResponse(BaseSchema):
     base_amount: float
@@ -590,9 +628,23 @@ class CalculatorResponse(BaseSchema):
     total_amount: float
     breakdown: Dict[str, Any] = {}
 
+# Rate card snapshot schemas
+class RateCardSnapshotCreate(BaseSchema):
+    reason: Optional[str] = Field(None, max_length=200)
+
+class RateCardSnapshotResponse(BaseSchema):
+    id: int
+    created_at: datetime
+    reason: Optional[str] = None
+    material_count: int
+    equipment_count: int
+    labour_rate_count: int
+    payload_bytes: int
+
 # Bulk Operations schemas
 class BulkImportRequest(BaseSchema):
-    file_type: str = Field(..., regex="^(csv|json)$")
+    entity_type: str = Field("materials", pattern="^(materials|equipment|labour_rates)$")
+    file_type: str = Field(..., pattern="^(csv|json)$")
     data: List[Dict[str, Any]] = Field(..., min_items=1)
 
 class BulkImportResponse(BaseSchema):
@@ -602,10 +654,29 @@ class BulkImportResponse(BaseSchema):
     failed_count: int
     errors: List[str] = []
 
+class BulkImportBatchResult(BaseSchema):
+    batch: int
+    rows: int
+    inserted: int
+    updated: int
+    price_changes: int = 0
+    failed: int
+    errors: List[str] = []
+
+class StreamingBulkImportResponse(BulkImportResponse):
+    inserted_count: int
+    updated_count: int
+    price_change_count: int = 0
+    snapshot_id: Optional[int] = None
+    batches: List[BulkImportBatchResult] = []
+    elapsed_seconds: float
+    rows_per_second: int
+
 class BulkExportRequest(BaseSchema):
-    entity_type: str = Field(..., regex="^(projects|materials|equipment|labour_roles|quotes)$")
+    entity_type: str = Field(..., pattern="^(projects|materials|equipment|labour_roles|quotes)$")
     filters: Optional[SearchFilters] = None
-    format: str = Field("json", regex="^(json|csv)$")
+    format: str = Field("json", pattern="^(json|ndjson|csv)$")  # json is streamed as NDJSON
+    gzip: bool = False
 
 class BulkExportResponse(BaseSchema):
     success: bool
@@ -691,4 +762,46 @@ class ActivityItem(BaseSchema):
 class ActivityFeedResponse(BaseSchema):
     activities: List[ActivityItem] = []
     unread_count: int
-    total_count: int
\ No newline at end of file
+    total_count: int
+
+# Slow query log schemas
+class SlowQueryEntry(BaseSchema):
+    recorded_at: datetime
+    duration_ms: float
+    endpoint: Optional[str] = None
+    statement: str
+    parameters: Any = None
+    plan: Optional[str] = None
+
+class SlowQueryLogResponse(BaseSchema):
+    enabled: bool
+    threshold_ms: float
+    explain_rate: float
+    recorded: int
+    explains_dropped: int = 0
+    entries: List[SlowQueryEntry] = []
+
+# Cursor-paginated envelopes
+class MaterialPage(CursorPaginatedResponse):
+    items: List[MaterialResponse]
+
+class EquipmentPage(CursorPaginatedResponse):
+    items: List[EquipmentResponse]
+
+class LabourRatePage(CursorPaginatedResponse):
+    items: List[LabourRateResponse]
+
+class NotificationPage(CursorPaginatedResponse):
+    items: List[NotificationResponse]
+
+class ProjectPage(CursorPaginatedResponse):
+    items: List[ProjectResponse]
+
+class QuotePage(CursorPaginatedResponse):
+    items: List[QuoteResponse]
+
+class AuditLogPage(CursorPaginatedResponse):
+    items: List[AuditLogResponse]
+
+class PriceChangeLogPage(CursorPaginatedResponse):
+    items: List[PriceChangeLogResponse]
@@ -0,0 +1,166 @@
+"""
+Ranked catalog search for materials and equipment.
+
+On Postgres the search runs in SQL against pg_trgm GIN indexes (created by
+alembic revision 0003). On other backends (SQLite in dev) an in-process
+trigram inverted index is built from the catalog cache and rebuilt whenever
+the cached table changes.
+"""
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple, Type
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Query, Session
+
+from . import models
+from .catalog_cache import catalog_cache
+
+# Text columns searched for each model, most significant first
+SEARCH_FIELDS: Dict[Type[models.Base], Tuple[str, ...]] = {
+    models.Material: ("sales_part_no", "description", "name"),
+    models.Equipment: ("sales_part_no", "equipment_name", "category"),
+}
+
+# Fuzzy (non-substring) matches are only looked for when substring hits do not
+# fill the requested page, and must share this fraction of the query trigrams
+FUZZY_THRESHOLD = 0.6
+# Trigrams present in more than this fraction of rows are ignored by fuzzy matching
+STOP_GRAM_RATIO = 0.2
+
+def _trigrams(value: str) -> Set[str]:
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+class TrigramIndex:
+    """Inverted trigram index over the text fields of one catalog table."""
+
+    def __init__(self, rows: Sequence[Tuple], fields: Sequence[str]):
+        self.rows = list(rows)
+        self.doc_by_id = {str(row.id): doc for doc, row in enumerate(self.rows)}
+        self.texts: List[Tuple[str, ...]] = []
+        self.postings: Dict[str, Set[int]] = {}
+        for doc, row in enumerate(self.rows):
+            texts = tuple((getattr(row, f) or "").lower() for f in fields)
+            self.texts.append(texts)
+            for value in texts:
+                for gram in _trigrams(value):
+                    self.postings.setdefault(gram, set()).add(doc)
+
+    def _score(self, doc: int, term: str) -> float:
+        row = self.rows[doc]
+        if str(row.id) == term:
+            return 4.0
+        best = 0.0
+        for position, value in enumerate(self.texts[doc]):
+            # earlier fields (part numbers) outrank description hits
+            weight = 1.0 - position * 0.1
+            if value == term:
+                best = max(best, 3.0 * weight)
+            elif value.startswith(term):
+                best = max(best, 2.0 * weight)
+            elif term in value:
+                best = max(best, 1.0 * weight)
+        return best
+
+    def search(self, term: str, predicate: Optional[Callable[[Tuple], bool]] = None, wanted: Optional[int] = None) -> List[Tuple]:
+        term = term.strip().lower()
+        grams = _trigrams(term)
+        scored: Dict[int, float] = {}
+
+        if grams:
+            lists = sorted((self.postings.get(g, set()) for g in grams), key=len)
+            candidates = set(lists[0]).intersection(*lists[1:]) if lists[0] else set()
+        else:
+            # terms under three characters cannot use the index
+            candidates = range(len(self.rows))
+        for doc in candidates:
+            score = self._score(doc, term)
+            if score:
+                scored[doc] = score
+
+        if len(grams) > 1 and (wanted is None or len(scored) < wanted):
+            shared = Counter()
+            stop_size = max(1, int(len(self.rows) * STOP_GRAM_RATIO))
+            for gram in grams:
+                posting = self.postings.get(gram, ())
+                if len(posting) <= stop_size:
+                    shared.update(posting)
+            for doc, count in shared.items():
+                similarity = count / len(grams)
+                if doc not in scored and similarity >= FUZZY_THRESHOLD:
+                    scored[doc] = similarity * 0.9
+
+        if term in self.doc_by_id:
+            scored[self.doc_by_id[term]] = 4.0
+
+        hits = [(score, doc) for doc, score in scored.items() if predicate is None or predicate(self.rows[doc])]
+        # ties go to the shorter (more specific) description
+        hits.sort(key=lambda hit: (-hit[0], len(self.texts[hit[1]][1]), hit[1]))
+        return [self.rows[doc] for _, doc in hits]
+
+
+_indexes: Dict[Type[models.Base], Tuple[int, TrigramIndex]] = {}
+_indexes_lock = threading.Lock()
+
+
+def _local_index(db: Session, model: Type[models.Base]) -> Optional[TrigramIndex]:
+    version = catalog_cache.version(db, model)
+    if version is None:
+        return None
+    current = _indexes.get(model)
+    if current is not None and current[0] == version:
+        return current[1]
+    snapshot = catalog_cache.snapshot(db, model)
+    if snapshot is None:
+        return None
+    version, rows = snapshot
+    with _indexes_lock:
+        current = _indexes.get(model)
+        if current is None or current[0] != version:
+            current = (version, TrigramIndex(rows, SEARCH_FIELDS[model]))
+            _indexes[model] = current
+    return current[1]
+
+
+def _sql_search(db: Session, query: Query, model: Type[models.Base], term: str) -> Query:
+    columns = [getattr(model, f) for f in SEARCH_FIELDS[model]]
+    pattern = f"%{term}%"
+    conditions = [column.ilike(pattern) for column in columns]
+    if term.isdigit():
+        conditions.append(model.id == int(term))
+    query = query.filter(or_(*conditions))
+    if db.bind.dialect.name == "postgresql":
+        rank = func.greatest(*(func.similarity(func.coalesce(c, ""), term) for c in columns))
+        query = query.order_by(rank.desc(), model.id)
+    else:
+        query = query.order_by(model.id)
+    return query
+
+
+def search_catalog(
+    db: Session,
+    model: Type[models.Base],
+    term: Optional[str],
+    filters: List[Any],
+    predicate: Callable[[Tuple], bool],
+    skip: int = 0,
+    limit: int = 100,
+) -> List[Any]:
+    """Ranked, paginated search.
+
+    ``filters`` are SQLAlchemy criteria used by the SQL path and ``predicate``
+    is the equivalent row check used by the in-process index.
+    """
+    term = (term or "").strip()
+    if term and db.bind.dialect.name != "postgresql":
+        index = _local_index(db, model)
+        if index is not None:
+            return index.search(term, predicate, wanted=skip + limit)[skip:skip + limit]
+
+    query = db.query(model).filter(*filters)
+    if term:
+        query = _sql_search(db, query, model, term)
+    else:
+        query = query.order_by(model.id)
+    return query.offset(skip).limit(limit).all()
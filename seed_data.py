@@ -1,17 +1,19 @@
 from sqlalchemy.orm import Session
-from .database import SessionLocal, engine
-from .models import Base, User, Material, Equipment, LabourRole, SystemConfig, UserRole, StateCode, Quote, QuoteItem, Notification, QuoteStatus, QuoteItemType, NotificationType, NotificationSeverity
-from passlib.context import CryptContext
+from .database import SessionLocal
+from .models import User, Material, Equipment, LabourRole, SystemConfig, UserRole, StateCode, Quote, QuoteItem, Notification, QuoteStatus, QuoteItemType, NotificationType, NotificationSeverity
 import uuid
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Tables are created by the Alembic migrations: run `alembic upgrade head` first
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing (passlib and bcrypt are imported on first use)
+_pwd_context = None
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context.hash(password)
 
 def seed_database():
     db = SessionLocal()
@@ -0,0 +1,173 @@
+"""
+Opt-in slow-query recorder.
+
+When ``SLOW_QUERY_LOG`` is enabled, every statement slower than
+``SLOW_QUERY_MS`` is kept in a fixed-size ring buffer. Each entry records the
+statement, its parameters with their values redacted, the endpoint that issued
+it and how long it took. On Postgres a sampled share
+(``SLOW_QUERY_EXPLAIN_RATE``) of slow SELECTs is queued to be re-run under
+``EXPLAIN (ANALYZE, BUFFERS)``. One background thread runs them on its own
+connection, in a read-only transaction that is rolled back, so the request
+neither waits for the re-run nor shares its connection or transaction with
+it. The entry's plan reads ``pending`` until then. When the queue is full,
+further samples are skipped and counted in ``explains_dropped``.
+"""
+import queue
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import settings
+from .instrumentation import current_stats
+
+SLOW_QUERY_LOG = settings.slow_query_log
+SLOW_QUERY_MS = settings.slow_query_ms
+SLOW_QUERY_EXPLAIN_RATE = settings.slow_query_explain_rate
+SLOW_QUERY_BUFFER_SIZE = settings.slow_query_buffer_size
+# EXPLAIN ANALYZE re-runs waiting for the background thread
+_EXPLAIN_QUEUE_SIZE = 16
+
+
+def _redact(value: Any) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, (str, bytes)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters: Any) -> Any:
+    """Parameter shapes without their values."""
+    if isinstance(parameters, dict):
+        return {key: _redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            # executemany: show the first row and how many there were
+            return {"rows": len(parameters), "first": redact_parameters(parameters[0])}
+        return [_redact(value) for value in parameters]
+    return _redact(parameters)
+
+
+class SlowQueryLog:
+    """Ring buffer of slow statements, attached to an engine with ``attach``."""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, explain_rate: float = SLOW_QUERY_EXPLAIN_RATE,
+                 size: int = SLOW_QUERY_BUFFER_SIZE):
+        self.threshold_ms = threshold_ms
+        self.explain_rate = explain_rate
+        self.recorded = 0
+        self.explains_dropped = 0
+        self._entries: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._explains: "queue.Queue[Tuple[Engine, Dict[str, Any], str, Any]]" = queue.Queue(_EXPLAIN_QUEUE_SIZE)
+        self._explain_engines: Dict[Engine, Engine] = {}
+        self._explainer: Optional[threading.Thread] = None
+
+    def attach(self, engine: Engine) -> None:
+        event.listen(engine, "before_cursor_execute", self._before)
+        event.listen(engine, "after_cursor_execute", self._after)
+        event.listen(engine, "handle_error", self._error)
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_started", []).append(time.perf_counter())
+
+    def _error(self, context):
+        if context.connection is not None and context.connection.info.get("slow_query_started"):
+            context.connection.info["slow_query_started"].pop()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["slow_query_started"].pop()) * 1000
+        if elapsed_ms < self.threshold_ms:
+            return
+        stats = current_stats()
+        entry = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(elapsed_ms, 2),
+            "endpoint": stats.endpoint if stats is not None else None,
+            "statement": statement,
+            "parameters": redact_parameters(parameters),
+            "plan": None,
+        }
+        if (conn.dialect.name == "postgresql" and not executemany
+                and statement.lstrip()[:6].upper() == "SELECT" and random.random() < self.explain_rate):
+            self._queue_explain(conn.engine, entry, statement, parameters)
+        with self._lock:
+            self._entries.append(entry)
+            self.recorded += 1
+
+    # ----------------------------- background EXPLAIN -----------------------------
+    def _queue_explain(self, engine: Engine, entry: Dict[str, Any], statement: str, parameters: Any) -> None:
+        try:
+            self._explains.put_nowait((engine, entry, statement, parameters))
+        except queue.Full:
+            with self._lock:
+                self.explains_dropped += 1
+            return
+        entry["plan"] = "pending"
+        if self._explainer is None or not self._explainer.is_alive():
+            with self._lock:
+                if self._explainer is None or not self._explainer.is_alive():
+                    self._explainer = threading.Thread(target=self._run_explains, name="slow-query-explain",
+                                                       daemon=True)
+                    self._explainer.start()
+
+    def _run_explains(self) -> None:
+        while True:
+            engine, entry, statement, parameters = self._explains.get()
+            plan = self._explain(engine, statement, parameters)
+            with self._lock:
+                entry["plan"] = plan
+
+    def _explain_engine(self, engine: Engine) -> Engine:
+        # its own connection per re-run, outside the request pool; never instrumented, so never recorded
+        if engine not in self._explain_engines:
+            from sqlalchemy import create_engine
+            from sqlalchemy.pool import NullPool
+            from .database import _build_connect_args
+            url = engine.url.render_as_string(hide_password=False)
+            self._explain_engines[engine] = create_engine(url, poolclass=NullPool,
+                                                          connect_args=_build_connect_args(url))
+        return self._explain_engines[engine]
+
+    def _explain(self, engine: Engine, statement: str, parameters: Any) -> str:
+        try:
+            connection = self._explain_engine(engine).raw_connection()
+        except Exception as exc:
+            return f"EXPLAIN failed: {exc}"
+        try:
+            dbapi_cursor = connection.cursor()
+            # ANALYZE executes the statement: read-only, and rolled back either way
+            dbapi_cursor.execute("SET TRANSACTION READ ONLY")
+            dbapi_cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + statement, parameters)
+            return "\n".join(row[0] for row in dbapi_cursor.fetchall())
+        except Exception as exc:
+            return f"EXPLAIN failed: {exc}"
+        finally:
+            connection.rollback()
+            connection.close()
+
+    def entries(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Most recent entries first."""
+        with self._lock:
+            entries = [dict(entry) for entry in self._entries]
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def enable_slow_query_log(engine: Engine) -> None:
+    """Attach the shared recorder to ``engine`` if ``SLOW_QUERY_LOG`` is set."""
+    if SLOW_QUERY_LOG:
+        slow_query_log.attach(engine)
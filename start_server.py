@@ -2,19 +2,192 @@
 """
 FastAPI Server Startup Script
 This script starts the FastAPI server with proper configuration
+
+    python start_server.py                 # development: one process, auto-reload
+    python start_server.py --production    # production: pre-forked worker processes
+
+Production mode (also selected by ENVIRONMENT=production) runs WEB_CONCURRENCY
+worker processes (default: CPU count) under Gunicorn with Uvicorn workers. The
+app is imported once in the master and forked, in-flight requests are drained
+for GRACEFUL_TIMEOUT seconds on shutdown, and each worker's connection pool is
+sized so that all workers together stay within DB_MAX_CONNECTIONS. Where
+Gunicorn is unavailable (Windows) Uvicorn's own process manager is used, which
+imports the app in every worker instead.
+
+Apply migrations (python migrations.py) before starting the server.
 """
 
-import uvicorn
+import argparse
+import importlib
+import importlib.util
 import os
 import sys
 from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import uvicorn
+
+# The app modules use package-relative imports, so import them through the
+# package directory
+current_dir = Path(__file__).resolve().parent
+sys.path.insert(0, str(current_dir.parent))
+settings = importlib.import_module(f"{current_dir.name}.config").settings
+APP_MODULE = settings.app_module or f"{current_dir.name}.main:app"
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def event_loop() -> str:
+    """uvloop where available, else the stdlib asyncio loop (override with UVICORN_LOOP)."""
+    if settings.uvicorn_loop:
+        return settings.uvicorn_loop
+    return "uvloop" if sys.platform != "win32" and _installed("uvloop") else "asyncio"
+
+
+def http_protocol() -> str:
+    """httptools where available, else h11 (override with UVICORN_HTTP)."""
+    if settings.uvicorn_http:
+        return settings.uvicorn_http
+    return "httptools" if _installed("httptools") else "h11"
+
+
+def worker_pool_limits(workers: int) -> Tuple[int, int]:
+    """Per-worker ``(pool_size, max_overflow)``.
+
+    DB_POOL_SIZE and DB_MAX_OVERFLOW are per process; both are scaled down so
+    that ``workers * (pool_size + max_overflow)`` stays within DB_MAX_CONNECTIONS,
+    the share of the Postgres ``max_connections`` this deployment may use.
+    """
+    budget = settings.db_max_connections // max(1, workers)
+    pool_size = max(1, min(settings.db_pool_size, budget))
+    max_overflow = max(0, min(settings.db_max_overflow, budget - pool_size))
+    return pool_size, max_overflow
+
+
+def configure_worker_env(workers: int) -> Tuple[int, int]:
+    """Export the per-worker pool limits and startup-check policy before the app is imported.
+
+    Workers spawned by Uvicorn read them from the environment; preloaded
+    Gunicorn workers inherit the reloaded ``settings``.
+    """
+    pool_size, max_overflow = worker_pool_limits(workers)
+    os.environ["DB_POOL_SIZE"] = str(pool_size)
+    os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+    # a worker that cannot reach the database, or finds migrations pending, fails to boot
+    os.environ.setdefault("DB_STARTUP_CHECK", "strict")
+    os.environ.setdefault("DB_STARTUP_ATTEMPTS", "5")
+    settings.load()
+    return pool_size, max_overflow
+
+
+def _import_app() -> Any:
+    module, _, attr = APP_MODULE.partition(":")
+    return getattr(importlib.import_module(module), attr or "app")
+
+
+def _dispose_engine(close: bool) -> None:
+    database = sys.modules.get(f"{current_dir.name}.database")
+    if database is not None:
+        database.dispose_engine(close=close)
+
+
+def run_gunicorn(options: Dict[str, Any]) -> None:
+    from gunicorn.app.base import BaseApplication
+    from uvicorn.workers import UvicornWorker
+
+    class Worker(UvicornWorker):
+        CONFIG_KWARGS = {"loop": options.pop("loop"), "http": options.pop("http")}
+
+    def post_fork(server: Any, worker: Any) -> None:
+        # connections opened in the master must not be shared with the children
+        _dispose_engine(close=False)
+
+    def worker_exit(server: Any, worker: Any) -> None:
+        _dispose_engine(close=True)
+
+    class ProductionServer(BaseApplication):
+        def load_config(self) -> None:
+            settings = dict(options, worker_class=Worker, preload_app=True,
+                            post_fork=post_fork, worker_exit=worker_exit)
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self) -> Any:
+            return _import_app()
+
+    ProductionServer().run()
+
+
+def run_production(host: str, port: int, workers: Optional[int]) -> None:
+    workers = workers or settings.web_concurrency
+    pool_size, max_overflow = configure_worker_env(workers)
+    loop, http = event_loop(), http_protocol()
+    graceful_timeout = settings.graceful_timeout
+    access_log = settings.access_log
+    preload = _installed("gunicorn") and sys.platform != "win32"
+
+    print(f"🌐 Server will run on: http://{host}:{port}")
+    print(f"⚙️  {workers} workers ({loop}/{http}), app {'preloaded' if preload else 'imported per worker'}")
+    print(f"🗄️  DB pool per worker: {pool_size}+{max_overflow}, "
+          f"{workers * (pool_size + max_overflow)} connections at most")
+    print(f"🛑 Graceful shutdown drains requests for up to {graceful_timeout}s")
+    print()
+
+    if preload:
+        run_gunicorn({
+            "bind": f"{host}:{port}",
+            "workers": workers,
+            "loop": loop,
+            "http": http,
+            "graceful_timeout": graceful_timeout,
+            "timeout": settings.worker_timeout,
+            "keepalive": settings.keepalive_timeout,
+            "accesslog": "-" if access_log else None,
+            "errorlog": "-",
+            "loglevel": settings.log_level,
+        })
+    else:
+        uvicorn.run(
+            APP_MODULE,
+            host=host,
+            port=port,
+            workers=workers,
+            loop=loop,
+            http=http,
+            timeout_graceful_shutdown=graceful_timeout,
+            timeout_keep_alive=settings.keepalive_timeout,
+            log_level=settings.log_level,
+            access_log=access_log,
+        )
+
+
+def run_development(host: str, port: int) -> None:
+    reload = settings.reload
+
+    print(f"🌐 Server will run on: http://{host}:{port}")
+    print(f"🔄 Auto-reload: {'Enabled' if reload else 'Disabled'}")
+    print()
+
+    uvicorn.run(
+        APP_MODULE,
+        host=host,
+        port=port,
+        reload=reload,
+        log_level="info",
+        access_log=True
+    )
 
-# Add the current directory to Python path
-current_dir = Path(__file__).parent
-sys.path.insert(0, str(current_dir))
 
 def main():
     """Start the FastAPI server"""
+    parser = argparse.ArgumentParser(description="Start the SLC Project Management API server")
+    parser.add_argument("--production", action="store_true", help="run pre-forked worker processes")
+    parser.add_argument("--workers", type=int, help="worker processes in production mode (default: WEB_CONCURRENCY or CPU count)")
+    args = parser.parse_args()
+    production = args.production or settings.environment.lower() == "production"
+
     print("🚀 Starting SLC Project Management API Server...")
     print("📋 Available endpoints:")
     print("   • API Documentation: http://localhost:8000/docs")
@@ -28,26 +201,16 @@ def main():
     print("   • Dashboard API: http://localhost:8000/dashboard/stats")
     print("   • Calculator API: http://localhost:8000/calculator/rate-card")
     print()
-    
+
     # Configuration
-    host = os.getenv("HOST", "0.0.0.0")
-    port = int(os.getenv("PORT", 8000))
-    reload = os.getenv("RELOAD", "true").lower() == "true"
-    
-    print(f"🌐 Server will run on: http://{host}:{port}")
-    print(f"🔄 Auto-reload: {'Enabled' if reload else 'Disabled'}")
-    print()
-    
+    host = settings.host
+    port = settings.port
+
     try:
-        # Start the server
-        uvicorn.run(
-            "main:app",
-            host=host,
-            port=port,
-            reload=reload,
-            log_level="info",
-            access_log=True
-        )
+        if production:
+            run_production(host, port, args.workers)
+        else:
+            run_development(host, port)
     except KeyboardInterrupt:
         print("\n👋 Server stopped by user")
     except Exception as e:
@@ -55,4 +218,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
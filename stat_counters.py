@@ -0,0 +1,423 @@
+"""
+Incrementally maintained dashboard counters.
+
+The ``stat_counters`` table holds one ``(count, total)`` pair per scope and key:
+
+===================== ================ ==========================================
+scope                 key              count / total
+===================== ================ ==========================================
+project_status        status value     projects / -
+project_amounts       budget,          - / sum of the column
+                      actual_cost
+quote_status          status value     quotes / -
+material_state        state_code       materials / sum of unit_cost
+equipment_category    category         equipment / sum of price
+labour_rates          ""               labour rates / -
+notifications_unread  user id, ""      unread notifications of the user; "" is
+                                       the total over all users / -
+===================== ================ ==========================================
+
+Session hooks keep the table current in the transaction that writes the
+rows. ``before_flush`` takes the old values of changed and deleted rows, and
+``after_flush`` takes the values of new rows once their defaults are
+applied. The net deltas are applied with one upsert per flush. Bulk DML
+through the session (``query.update()``, ``session.execute(update(...))``)
+has no per-row values, so the scopes it touches are recounted from scratch
+before commit, unless it carries the ``UNREAD_USERS`` option and its caller
+adjusts the unread counters itself. Writes on a raw connection call
+``recount_on_commit`` for the same effect, except the streaming bulk import:
+it reads its deltas from the staging table before each merge
+(``staged_deltas``) and applies them like a flush. On Postgres the recount locks
+``stat_counters`` in EXCLUSIVE mode first, as ``reconcile --fix`` does: writers
+that already applied deltas finish before the recount reads the base tables,
+and later ones queue behind the rewrite, so no concurrent delta is lost.
+
+The counter rows are also locks. A transaction holds the row of every counter
+it moved until it commits, so writers touching the same counter serialize.
+Most keys spread writers out (status, state, category, user), but
+``("project_amounts", ...)`` is moved by every project write that changes a
+budget or cost, and ``("notifications_unread", "")`` by every notification
+write. Those transactions queue on one row each for the rest of their
+transaction. The global rows are kept anyway, so the dashboard stays a
+read of a few dozen rows. Keep transactions that write projects or
+notifications short; the alert run and ``mark_all_notifications_read`` batch
+their writes to one counter update per batch for this reason.
+
+Reading the dashboard figures is a single query over a table of a few dozen
+rows. ``reconcile`` recomputes every counter from the base tables and
+reports drift; with ``fix`` it rewrites the table
+(``python -m <package>.stat_counters --fix``).
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from sqlalchemy import Table, and_, delete, event, exists, func, insert, inspect, or_, select, text, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.dml import UpdateBase
+
+from . import models
+
+Counters = Dict[Tuple[str, str], List[float]]
+
+_TABLE = models.StatCounter.__table__
+_DELTAS = "stat_counter_deltas"
+_RECOUNT = "stat_counter_recount"
+ALL_USERS = ""
+# Execution option naming the users whose notifications a bulk INSERT/UPDATE
+# writes; the caller applies the counter changes with ``adjust_unread`` instead of a recount
+UNREAD_USERS = "unread_user_ids"
+
+
+def _key(value: Any) -> str:
+    value = getattr(value, "value", value)
+    return "" if value is None else str(value)
+
+
+def _unread(user_id: Any, is_read: Any) -> List[Tuple[Tuple[str, str], int, float]]:
+    if is_read is True:
+        return []
+    return [(("notifications_unread", _key(user_id)), 1, 0.0), (("notifications_unread", ALL_USERS), 1, 0.0)]
+
+
+# model -> (scopes it feeds, columns read, contributions of one row given a column getter)
+_TRACKED: Dict[Any, Tuple[Tuple[str, ...], Tuple[str, ...], Callable[[Callable[[str], Any]], List]]] = {
+    models.Project: (
+        ("project_status", "project_amounts"),
+        ("status", "budget", "actual_cost"),
+        lambda get: [
+            (("project_status", _key(get("status"))), 1, 0.0),
+            (("project_amounts", "budget"), 0, get("budget") or 0.0),
+            (("project_amounts", "actual_cost"), 0, get("actual_cost") or 0.0),
+        ],
+    ),
+    models.Quote: (
+        ("quote_status",),
+        ("status",),
+        lambda get: [(("quote_status", _key(get("status"))), 1, 0.0)],
+    ),
+    models.Material: (
+        ("material_state",),
+        ("state_code", "unit_cost"),
+        lambda get: [(("material_state", _key(get("state_code"))), 1, get("unit_cost") or 0.0)],
+    ),
+    models.Equipment: (
+        ("equipment_category",),
+        ("category", "price"),
+        lambda get: [(("equipment_category", _key(get("category"))), 1, get("price") or 0.0)],
+    ),
+    models.LabourRate: (
+        ("labour_rates",),
+        (),
+        lambda get: [(("labour_rates", ""), 1, 0.0)],
+    ),
+    models.Notification: (
+        ("notifications_unread",),
+        ("user_id", "is_read"),
+        lambda get: _unread(get("user_id"), get("is_read")),
+    ),
+}
+_SCOPES_BY_TABLE = {model.__tablename__: scopes for model, (scopes, _, _) in _TRACKED.items()}
+
+
+# ----------------------------- from scratch -----------------------------
+def _grouped(bind: Any, scope: str, key_column: Any, total_column: Any = None, *criteria: Any) -> Counters:
+    total = func.coalesce(func.sum(total_column), 0.0) if total_column is not None else func.sum(0.0)
+    stmt = select(key_column, func.count(), total).where(*criteria).group_by(key_column)
+    return {(scope, _key(key)): [count, total or 0.0] for key, count, total in bind.execute(stmt)}
+
+
+def _project_amounts(bind: Any) -> Counters:
+    budget, actual_cost = bind.execute(
+        select(func.coalesce(func.sum(models.Project.budget), 0.0), func.coalesce(func.sum(models.Project.actual_cost), 0.0))
+    ).one()
+    return {("project_amounts", "budget"): [0, budget], ("project_amounts", "actual_cost"): [0, actual_cost]}
+
+
+def _labour_rates(bind: Any) -> Counters:
+    return {("labour_rates", ""): [bind.execute(select(func.count()).select_from(models.LabourRate)).scalar(), 0.0]}
+
+
+def _notifications_unread(bind: Any) -> Counters:
+    unread = models.Notification.is_read.isnot(True)
+    counters = _grouped(bind, "notifications_unread", models.Notification.user_id, None, unread)
+    counters[("notifications_unread", ALL_USERS)] = [sum(c for c, _ in counters.values()), 0.0]
+    return counters
+
+
+_SCOPE_QUERIES: Dict[str, Callable[[Any], Counters]] = {
+    "project_status": lambda bind: _grouped(bind, "project_status", models.Project.status),
+    "project_amounts": _project_amounts,
+    "quote_status": lambda bind: _grouped(bind, "quote_status", models.Quote.status),
+    "material_state": lambda bind: _grouped(bind, "material_state", models.Material.state_code, models.Material.unit_cost),
+    "equipment_category": lambda bind: _grouped(bind, "equipment_category", models.Equipment.category, models.Equipment.price),
+    "labour_rates": _labour_rates,
+    "notifications_unread": _notifications_unread,
+}
+SCOPES = tuple(_SCOPE_QUERIES)
+
+
+def compute_counters(bind: Any, scopes: Iterable[str] = SCOPES) -> Counters:
+    """Counters of ``scopes`` recomputed from the base tables."""
+    counters: Counters = {}
+    for scope in scopes:
+        counters.update(_SCOPE_QUERIES[scope](bind))
+    return counters
+
+
+def stored_counters(bind: Any, scopes: Iterable[str] = SCOPES) -> Counters:
+    rows = bind.execute(select(_TABLE.c.scope, _TABLE.c.key, _TABLE.c.count, _TABLE.c.total)
+                        .where(_TABLE.c.scope.in_(list(scopes))))
+    return {(scope, key): [count, total] for scope, key, count, total in rows}
+
+
+def write_counters(bind: Any, counters: Counters, scopes: Iterable[str]) -> None:
+    """Replace the stored rows of ``scopes`` with ``counters``; the caller owns the transaction."""
+    bind.execute(delete(_TABLE).where(_TABLE.c.scope.in_(list(scopes))))
+    rows = [{"scope": scope, "key": key, "count": count, "total": total}
+            for (scope, key), (count, total) in sorted(counters.items()) if count or total]
+    if rows:
+        bind.execute(insert(_TABLE), rows)
+
+
+def _differs(stored: List[float], actual: List[float]) -> bool:
+    return stored[0] != actual[0] or abs(stored[1] - actual[1]) > 1e-6 * max(1.0, abs(actual[1]))
+
+
+def reconcile(db: Session, fix: bool = False) -> Dict[str, Any]:
+    """Recompute every counter and report the ones that drifted; ``fix`` rewrites them and commits."""
+    if fix and db.get_bind().dialect.name == "postgresql":
+        # writers queue behind the rewrite, so no delta lands between the recount and the rewrite
+        db.execute(text("LOCK TABLE stat_counters IN EXCLUSIVE MODE"))
+    actual = compute_counters(db)
+    stored = stored_counters(db)
+    zero = [0, 0.0]
+    drift = [
+        {"scope": scope, "key": key, "stored_count": stored.get((scope, key), zero)[0],
+         "actual_count": actual.get((scope, key), zero)[0], "stored_total": stored.get((scope, key), zero)[1],
+         "actual_total": actual.get((scope, key), zero)[1]}
+        for scope, key in sorted(set(actual) | set(stored))
+        if _differs(stored.get((scope, key), zero), actual.get((scope, key), zero))
+    ]
+    if fix:
+        if drift:
+            write_counters(db, actual, SCOPES)
+        db.commit()
+    return {"counters": len(actual), "drifted": len(drift), "fixed": fix and bool(drift), "drift": drift}
+
+
+# ----------------------------- incremental -----------------------------
+def _old_value(obj: Any, column: str) -> Any:
+    history = inspect(obj).attrs[column].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    # not loaded and not changed: the stored value is the current one
+    return getattr(obj, column)
+
+
+def _add(deltas: Counters, obj: Any, sign: int, get: Callable[[str], Any]) -> None:
+    for key, count, total in _TRACKED[type(obj)][2](get):
+        entry = deltas.setdefault(key, [0, 0.0])
+        entry[0] += sign * count
+        entry[1] += sign * total
+
+
+def _pending(session: Session) -> Counters:
+    return session.info.setdefault(_DELTAS, {})
+
+
+@event.listens_for(Session, "before_flush")
+def _count_changes(session: Session, flush_context: Any, instances: Any) -> None:
+    # old values must be read before the flush overwrites or deletes the rows
+    deltas = None
+    for obj in session.deleted:
+        if type(obj) in _TRACKED:
+            deltas = deltas if deltas is not None else _pending(session)
+            _add(deltas, obj, -1, lambda column, obj=obj: _old_value(obj, column))
+    for obj in session.dirty:
+        columns = _TRACKED.get(type(obj), (None, ()))[1]
+        state = inspect(obj)
+        if columns and any(state.attrs[c].history.has_changes() for c in columns):
+            deltas = deltas if deltas is not None else _pending(session)
+            _add(deltas, obj, -1, lambda column, obj=obj: _old_value(obj, column))
+            _add(deltas, obj, 1, lambda column, obj=obj: getattr(obj, column))
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_changes(session: Session, flush_context: Any) -> None:
+    # new rows are counted here, once column defaults have been applied
+    deltas = session.info.pop(_DELTAS, None) or {}
+    for obj in session.new:
+        if type(obj) in _TRACKED:
+            _add(deltas, obj, 1, lambda column, obj=obj: getattr(obj, column))
+    deltas = {key: value for key, value in deltas.items() if value[0] or value[1]}
+    if deltas:
+        apply_deltas(session.connection(), deltas)
+
+
+def staged_deltas(bind: Any, model: Any, stage: Table, key: Iterable[str]) -> Counters:
+    """Counter deltas of merging ``stage`` into ``model``'s table on ``key``; read before the merge.
+
+    ``stage`` must carry every tracked column of ``model``: matched rows move
+    from their stored values to the staged ones, unmatched rows are new.
+    """
+    columns, contributions = _TRACKED[model][1], _TRACKED[model][2]
+    target = model.__table__
+    matches = and_(*(target.c[k] == stage.c[k] for k in key))
+    deltas: Counters = {}
+
+    def add(sign: int, row: Any, table: Table) -> None:
+        for counter, count, total in contributions(lambda column: row[f"{table.name}_{column}"]):
+            entry = deltas.setdefault(counter, [0, 0.0])
+            entry[0] += sign * count
+            entry[1] += sign * total
+
+    if columns:
+        moved = (
+            select(*(target.c[c].label(f"{target.name}_{c}") for c in columns),
+                   *(stage.c[c].label(f"{stage.name}_{c}") for c in columns))
+            .join_from(target, stage, matches)
+            .where(or_(*(target.c[c].is_distinct_from(stage.c[c]) for c in columns)))
+        )
+        for row in bind.execute(moved).mappings():
+            add(-1, row, target)
+            add(1, row, stage)
+    new = select(*(stage.c[c].label(f"{stage.name}_{c}") for c in columns or key)).where(~exists().where(matches))
+    for row in bind.execute(new).mappings():
+        add(1, row, stage)
+    return {counter: value for counter, value in deltas.items() if value[0] or value[1]}
+
+
+def apply_deltas(bind: Any, deltas: Counters) -> None:
+    """Add ``deltas`` to the stored counters, creating missing rows, in one statement."""
+    rows = [{"scope": scope, "key": key, "count": count, "total": total}
+            for (scope, key), (count, total) in sorted(deltas.items())]
+    dialect = bind.dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        stmt = upsert(_TABLE)
+        bind.execute(stmt.on_conflict_do_update(
+            index_elements=[_TABLE.c.scope, _TABLE.c.key],
+            set_={"count": _TABLE.c.count + stmt.excluded.count, "total": _TABLE.c.total + stmt.excluded.total,
+                  "updated_at": func.now()},
+        ), rows)
+        return
+    for row in rows:
+        changed = bind.execute(
+            update(_TABLE).where(_TABLE.c.scope == row["scope"], _TABLE.c.key == row["key"])
+            .values(count=_TABLE.c.count + row["count"], total=_TABLE.c.total + row["total"], updated_at=func.now())
+        ).rowcount
+        if not changed:
+            bind.execute(insert(_TABLE), row)
+
+
+def adjust_unread(bind: Any, deltas: Dict[str, int]) -> None:
+    """Add ``{user_id: delta}`` to the users' unread counters and their sum to the total."""
+    counters: Counters = {("notifications_unread", _key(user_id)): [delta, 0.0]
+                          for user_id, delta in deltas.items() if delta}
+    if counters:
+        counters[("notifications_unread", ALL_USERS)] = [sum(deltas.values()), 0.0]
+        apply_deltas(bind, counters)
+
+
+def recount_on_commit(session: Session, model: Any) -> None:
+    """Recount the scopes fed by ``model`` before ``session`` commits (for writes that bypass the ORM)."""
+    session.info.setdefault(_RECOUNT, set()).update(_TRACKED[model][0])
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_writes(orm_execute_state: Any) -> None:
+    statement = orm_execute_state.statement
+    if isinstance(statement, UpdateBase) and UNREAD_USERS not in orm_execute_state.execution_options:
+        scopes = _SCOPES_BY_TABLE.get(getattr(statement.table, "name", None))
+        if scopes:
+            orm_execute_state.session.info.setdefault(_RECOUNT, set()).update(scopes)
+
+
+@event.listens_for(Session, "before_commit")
+def _recount_bulk_writes(session: Session) -> None:
+    scopes = session.info.pop(_RECOUNT, None)
+    if scopes:
+        connection = session.connection()
+        if connection.dialect.name == "postgresql":
+            # same lock as reconcile: no writer's delta can land between the recount and the rewrite
+            connection.execute(text("LOCK TABLE stat_counters IN EXCLUSIVE MODE"))
+        write_counters(connection, compute_counters(connection, sorted(scopes)), scopes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session: Session) -> None:
+    session.info.pop(_DELTAS, None)
+    session.info.pop(_RECOUNT, None)
+
+
+# ----------------------------- reads -----------------------------
+def dashboard_figures(db: Session) -> Dict[str, Any]:
+    """Every numeric dashboard figure from the counters, in one query."""
+    table = _TABLE
+    rows = db.execute(
+        select(table.c.scope, table.c.key, table.c.count, table.c.total)
+        .where((table.c.scope != "notifications_unread") | (table.c.key == ALL_USERS))
+    ).all()
+    scopes: Dict[str, Dict[str, Tuple[int, float]]] = defaultdict(dict)
+    for scope, key, count, total in rows:
+        scopes[scope][key] = (count, total)
+    status = scopes["project_status"]
+    amounts = scopes["project_amounts"]
+    materials = scopes["material_state"]
+    equipment = scopes["equipment_category"]
+    return {
+        "total_projects": sum(c for c, _ in status.values()),
+        "active_projects": status.get(models.ProjectStatus.IN_PROGRESS.value, (0, 0.0))[0],
+        "completed_projects": status.get(models.ProjectStatus.COMPLETED.value, (0, 0.0))[0],
+        "pending_projects": status.get(models.ProjectStatus.PLANNING.value, (0, 0.0))[0],
+        "cancelled_projects": status.get(models.ProjectStatus.CANCELLED.value, (0, 0.0))[0],
+        "total_budget": amounts.get("budget", (0, 0.0))[1],
+        "total_spent": amounts.get("actual_cost", (0, 0.0))[1],
+        "total_materials": sum(c for c, _ in materials.values()),
+        "total_material_value": sum(t for _, t in materials.values()),
+        "material_sites": sum(1 for key, (c, _) in materials.items() if key and c),
+        "total_equipment": sum(c for c, _ in equipment.values()),
+        "total_equipment_value": sum(t for _, t in equipment.values()),
+        "equipment_categories": sum(1 for key, (c, _) in equipment.items() if key and c),
+        "total_labor_roles": scopes["labour_rates"].get("", (0, 0.0))[0],
+        "total_quotes": sum(c for c, _ in scopes["quote_status"].values()),
+        "unread_notifications": scopes["notifications_unread"].get(ALL_USERS, (0, 0.0))[0],
+    }
+
+
+def unread_counts(db: Session, user_ids: Iterable[str]) -> Dict[str, int]:
+    """Unread notifications of each of ``user_ids``, read from their counters."""
+    keys = [_key(user_id) for user_id in user_ids]
+    rows = db.execute(
+        select(_TABLE.c.key, _TABLE.c.count).where(_TABLE.c.scope == "notifications_unread", _TABLE.c.key.in_(keys))
+    )
+    counts = dict.fromkeys(keys, 0)
+    counts.update({key: count for key, count in rows})
+    return counts
+
+
+def unread_count(db: Session, user_id: str) -> int:
+    """Unread notifications of ``user_id``, read from its counter."""
+    return unread_counts(db, [user_id])[_key(user_id)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute the dashboard counters and report drift")
+    parser.add_argument("--fix", action="store_true", help="rewrite the counters that drifted")
+    args = parser.parse_args()
+    from .database import SessionLocal
+    session = SessionLocal()
+    try:
+        report = reconcile(session, fix=args.fix)
+    finally:
+        session.close()
+    print(json.dumps(report, indent=2, default=str))
+    sys.exit(1 if report["drifted"] and not args.fix else 0)
@@ -0,0 +1,23 @@
+"""
+Cold-start regression test: ``pytest test_import_budget.py``.
+
+Fails when importing the API exceeds ``IMPORT_BUDGET_MS``, creates the
+database engine or imports one of ``import_budget.DEFERRED_MODULES``.
+"""
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+# The app modules use package-relative imports, so import them through the
+# package directory
+current_dir = Path(__file__).resolve().parent
+sys.path.insert(0, str(current_dir.parent))
+import_budget = importlib.import_module(f"{current_dir.name}.import_budget")
+
+
+@pytest.mark.parametrize("module", ["main", "app"])
+def test_import_within_budget(module):
+    problems = import_budget.check(f"{import_budget.PACKAGE}.{module}", import_budget.IMPORT_BUDGET_MS)
+    assert problems == []
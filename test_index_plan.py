@@ -0,0 +1,46 @@
+"""
+Query-plan regression test: ``INDEX_PLAN_DATABASE_URL=postgresql://... pytest test_index_plan.py``.
+
+Seeds realistic volumes into the empty Postgres database the URL names, runs
+the crud call behind each list and detail endpoint and fails when a statement
+it executed fully scans a large table. The tables are dropped afterwards.
+Skipped unless ``INDEX_PLAN_DATABASE_URL`` names a Postgres database.
+"""
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine, inspect
+
+# The app modules use package-relative imports, so import them through the
+# package directory
+current_dir = Path(__file__).resolve().parent
+sys.path.insert(0, str(current_dir.parent))
+config = importlib.import_module(f"{current_dir.name}.config")
+index_plan = importlib.import_module(f"{current_dir.name}.index_plan")
+models = importlib.import_module(f"{current_dir.name}.models")
+
+DATABASE_URL = config.settings.index_plan_database_url or ""
+
+pytestmark = pytest.mark.skipif(
+    not DATABASE_URL.startswith("postgresql"), reason="INDEX_PLAN_DATABASE_URL does not name a Postgres database"
+)
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    engine = create_engine(DATABASE_URL)
+    if set(inspect(engine).get_table_names()) & set(index_plan.SEED_TABLES):
+        pytest.fail(f"{DATABASE_URL} already has tables; point the check at an empty scratch database")
+    try:
+        yield engine, index_plan.seed(engine)
+    finally:
+        models.Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+@pytest.mark.parametrize("endpoint", list(index_plan.PLAN_CALLS))
+def test_endpoint_uses_indexes(seeded, endpoint):
+    engine, sample = seeded
+    assert index_plan.check_endpoint(engine, endpoint, sample) == []
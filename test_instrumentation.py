@@ -0,0 +1,45 @@
+"""
+Request instrumentation tests: ``pytest test_instrumentation.py``.
+
+A streamed response body must run inside the request's stats and keep its
+admission slot until the last chunk is sent.
+"""
+import importlib
+import sys
+from pathlib import Path
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+# The app modules use package-relative imports, so import them through the
+# package directory
+current_dir = Path(__file__).resolve().parent
+sys.path.insert(0, str(current_dir.parent))
+instrumentation = importlib.import_module(f"{current_dir.name}.instrumentation")
+
+
+def test_streamed_body_runs_inside_the_request(monkeypatch):
+    admission = instrumentation.admission
+    monkeypatch.setattr(admission, "enabled", True)
+    seen = []
+
+    def chunks():
+        for n in range(3):
+            seen.append((instrumentation.current_stats() is not None, admission.in_flight))
+            yield f"{n}\n"
+
+    app = FastAPI()
+    instrumentation.install_instrumentation(app)
+
+    @app.get("/export")
+    def export():
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    in_flight = admission.in_flight
+    response = TestClient(app).get("/export")
+
+    assert response.text == "0\n1\n2\n"
+    assert "Server-Timing" in response.headers
+    assert seen == [(True, in_flight + 1)] * 3
+    assert admission.in_flight == in_flight
@@ -0,0 +1,33 @@
+"""
+Query budget regression test: ``pytest test_query_budget.py``.
+
+Seeds a few pages of rows into in-memory SQLite and fails when one page of a
+list endpoint executes more statements than ``query_budget.QUERY_BUDGETS``
+allows, listing the statements it ran.
+"""
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+# The app modules use package-relative imports, so import them through the
+# package directory
+current_dir = Path(__file__).resolve().parent
+sys.path.insert(0, str(current_dir.parent))
+query_budget = importlib.import_module(f"{current_dir.name}.query_budget")
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    yield engine, query_budget.seed(engine)
+    engine.dispose()
+
+
+@pytest.mark.parametrize("endpoint", list(query_budget.QUERY_BUDGETS))
+def test_page_within_query_budget(seeded, endpoint):
+    engine, sample = seeded
+    query_budget.check_endpoint(engine, endpoint, sample)
@@ -1,5 +1,6 @@
 import { useState, useEffect, useCallback } from 'react';
 import apiService from '../services/api';
+import { API_CONFIG, API_ENDPOINTS } from '../config/api';
 
 // Custom hook for API calls with loading states and error handling
 export const useApi = () => {
@@ -320,6 +321,7 @@ export const useSearch = () => {
 export const useNotifications = () => {
   const { execute, loading, error } = useApi();
   const [notifications, setNotifications] = useState([]);
+  const [unreadCount, setUnreadCount] = useState(0);
 
   const fetchNotifications = useCallback(async (userId, limit = 50) => {
     const result = await execute(() => apiService.getNotifications(userId, limit));
@@ -349,8 +351,28 @@ export const useNotifications = () => {
     setNotifications(prev => prev.map(n => ({ ...n, is_read: true })));
   }, [execute]);
 
+  // Live updates over Server-Sent Events instead of polling; returns the cleanup function
+  const subscribeNotifications = useCallback((userId) => {
+    const url = `${API_CONFIG.BASE_URL}${API_ENDPOINTS.NOTIFICATION_STREAM}?user_id=${encodeURIComponent(userId)}`;
+    const source = new EventSource(url);
+    source.addEventListener('notification', (event) => {
+      const notification = JSON.parse(event.data);
+      setNotifications(prev => [notification, ...prev.filter(n => n.id !== notification.id)]);
+    });
+    source.addEventListener('unread', (event) => {
+      setUnreadCount(JSON.parse(event.data).unread);
+    });
+    source.addEventListener('resync', () => {
+      // events were dropped; refetch the list
+      fetchNotifications(userId).catch(() => {});
+    });
+    return () => source.close();
+  }, [fetchNotifications]);
+
   return {
     notifications,
+    unreadCount,
+    subscribeNotifications,
     fetchNotifications,
     fetchUnreadNotifications,
     createNotification,